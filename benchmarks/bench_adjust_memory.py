@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   bench_adjust_memory.py
+@Create  :   2025-04-23 16:40:02
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import time
+import logging
+import argparse
+import tracemalloc
+import numpy as np
+import xarray as xr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.adjust_params import adjust_value, select_nc
+
+
+def legacy_adjust_value(info, ds):
+    """
+    The former adjust_value: deep copy of the whole dataset and separate max/min passes.
+    """
+    ds = ds.copy(deep=True)
+    name, value = info['name'], info['value']
+    o_max = ds[name].max().item()
+    o_min = ds[name].min().item()
+    if info['adjust'] == 'replace':
+        ds[name].values[:] = value
+    else:
+        ds[name] = ds[name] * value
+    a_max = ds[name].max().item()
+    a_min = ds[name].min().item()
+    return ds, 1
+
+
+def legacy_select_nc(paraminfo, dsdict):
+    dsdict = dsdict.copy()
+    for name, file in zip(paraminfo['name'], paraminfo['file']):
+        dsdict[file], exit_code = legacy_adjust_value(
+            {'name': name, 'value': paraminfo['value'], 'adjust': paraminfo['adjust']}, dsdict[file])
+    return dsdict, exit_code
+
+
+def make_dsdict(ny, nx, nvars):
+    rng = np.random.default_rng(0)
+    soil = xr.Dataset({f'var{i}': (('Time', 'soil_layers_stag', 'south_north', 'west_east'),
+                                   rng.random((1, 4, ny, nx), dtype='float32')) for i in range(nvars)})
+    soil['smcmax'] = (('Time', 'soil_layers_stag', 'south_north', 'west_east'), rng.random((1, 4, ny, nx), dtype='float32'))
+    soil['slope'] = (('Time', 'south_north', 'west_east'), rng.random((1, ny, nx), dtype='float32'))
+    hydro = xr.Dataset({f'var{i}': (('south_north', 'west_east'), rng.random((ny, nx), dtype='float32')) for i in range(nvars)})
+    hydro['SMCMAX1'] = (('south_north', 'west_east'), rng.random((ny, nx), dtype='float32'))
+    return {'soil_properties.nc': soil, 'hydro2dtbl.nc': hydro}
+
+
+def measure(func, params, dsdict):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for param in params:
+        dsdict, exit_code = func(param, dsdict)
+        assert exit_code == 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Peak-memory benchmark of the parameter adjustment engine.')
+    parser.add_argument('--ny', type=int, default=1000)
+    parser.add_argument('--nx', type=int, default=1000)
+    parser.add_argument('--nvars', type=int, default=10, help='Number of untouched variables per file.')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    params = [
+        {'name': ['smcmax', 'SMCMAX1'], 'file': ['soil_properties.nc', 'hydro2dtbl.nc'], 'value': 1.1, 'adjust': 'scale'},
+        {'name': ['slope'], 'file': ['soil_properties.nc'], 'value': 0.3, 'adjust': 'replace'},
+    ]
+    dsdict = make_dsdict(args.ny, args.nx, args.nvars)
+    total = sum(ds.nbytes for ds in dsdict.values())
+    print(f"Base datasets: {total / 1024**2:.1f} MiB")
+    for label, func in [('legacy deep copy', legacy_select_nc), ('copy-free', select_nc)]:
+        peak, elapsed = measure(func, params, dict(dsdict))
+        print(f"{label:>16s} | peak: {peak / 1024**2:8.1f} MiB | time: {elapsed:6.3f} s")
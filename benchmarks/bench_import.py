@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   bench_import.py
+@Create  :   2025-05-12 14:47:05
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be loaded by the query paths
+HEAVY = ['numpy', 'pandas', 'xarray', 'netCDF4', 'scipy']
+
+# statement, must stay below --max-seconds
+CASES = {
+    'import core': ('import core', True),
+    'state store': ('from core import StateStore', True),
+    'cli': ('from core.cli import main', True),
+    'scheduler': ('from core import SimulationInfo, ModelRunner, JobScheduler', True),
+    'everything': ('from core import *', False),
+}
+
+PROBE = '''
+import sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{'seconds': elapsed, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def probe(statement):
+    """
+    Time a statement in a fresh interpreter, returns its import time and the heavy modules it loaded.
+    """
+    code = PROBE.format(repo=REPO_DIR, statement=statement, heavy=HEAVY)
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def status_command(tmp):
+    """
+    A campaign with a small state store, and the 'status --list' command line querying it.
+    """
+    code = (f"import sys; sys.path.insert(0, {REPO_DIR!r}); import logging; logging.disable(logging.CRITICAL)\n"
+            f"from core.state_store import StateStore\n"
+            f"from types import SimpleNamespace as job\n"
+            f"store = StateStore({os.path.join(tmp, 'configs', 'state.db')!r})\n"
+            f"store.record_many([job(job_id=f'bench_{{i:05d}}', event_no='Bench_20190804', basin='Bench', set_params={{}},"
+            f" pbs_id=None, job_status=None, job_dir=None, timings={{}}, config_dict=dict) for i in range(1000)],"
+            f" phase='created', status='waiting')\n")
+    subprocess.run([sys.executable, '-c', code], check=True)
+    campaign = os.path.join(tmp, 'campaign.yaml')
+    with open(campaign, 'w') as f:
+        f.write(f"sim_info:\n  obj: bench\n  ROOT_DIR: {tmp}\n")
+    return [sys.executable, os.path.join(REPO_DIR, 'wrfhydro-runner'), campaign, '--log-level', 'WARNING',
+            'status', '--list']
+
+
+def time_command(command):
+    """
+    Wall time of a whole command line, interpreter start-up included.
+    """
+    code = ('import subprocess, sys, time, json\n'
+            'start = time.perf_counter()\n'
+            f'subprocess.run({command!r}, stdout=subprocess.DEVNULL, check=True)\n'
+            'print(json.dumps({"seconds": time.perf_counter() - start}))\n')
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(result.stdout)['seconds']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time of the core package and start-up time of '
+                                                 'the wrfhydro-runner status command, each in fresh interpreters.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per case, the median is reported.')
+    parser.add_argument('--max-seconds', type=float, default=0.5,
+                        help='Fail if a query path takes longer or loads a heavy module.')
+    parser.add_argument('--output', help='Append one JSON record per case to this file.')
+    args = parser.parse_args()
+
+    failed = []
+    results = []
+    for name, (statement, query_path) in CASES.items():
+        runs = [probe(statement) for _ in range(args.repeat)]
+        seconds = float(np.median([run['seconds'] for run in runs]))
+        heavy = runs[0]['heavy']
+        results.append({'case': name, 'statement': statement, 'seconds': seconds, 'heavy': heavy})
+        print(f"{name:<12s} | {seconds * 1000:8.1f} ms | heavy modules: {', '.join(heavy) or '-'}")
+        if query_path and (seconds > args.max_seconds or heavy):
+            failed.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        command = status_command(tmp)
+        seconds = float(np.median([time_command(command) for _ in range(args.repeat)]))
+    results.append({'case': 'status command', 'statement': ' '.join(command[1:]), 'seconds': seconds, 'heavy': None})
+    print(f"{'status cmd':<12s} | {seconds * 1000:8.1f} ms | wrfhydro-runner status --list, 1000 jobs, with start-up")
+    if seconds > args.max_seconds:
+        failed.append('status command')
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+    if failed:
+        print(f"Slower than {args.max_seconds} s or loading {HEAVY}: {failed}")
+        sys.exit(1)
@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   bench_qstat_poll.py
+@Create  :   2025-04-20 10:12:31
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import SimulationInfo, ModelRunner
+from core.WRFHydroJob import query_pbs_status
+
+# Fake qstat: answers every requested ID as running, after a fixed server round trip.
+FAKE_QSTAT = '''#!/usr/bin/env python3
+import sys, time
+time.sleep(float({latency!r}))
+print("Job ID                    Name             User            Time Use S Queue")
+print("------------------------- ---------------- --------------- -------- - -----")
+for pbs_id in sys.argv[1:]:
+    print(f"{{pbs_id:<25s}} Hydrojob         bench           00:00:01 R batch")
+'''
+
+
+def make_runners(root_dir, num):
+    os.makedirs(os.path.join(root_dir, 'params'))
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(repo_dir, 'params', 'run_params.yaml'), os.path.join(root_dir, 'params'))
+    sim_info = SimulationInfo({'obj': 'bench_qstat', 'ROOT_DIR': root_dir})
+
+    set_jobs = {}
+    for i in range(num):
+        job_info = {
+            'job_id': f'bench_{i:05d}',
+            'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+            'event_no': 'Fuping_20190804',
+            'set_params': {},
+        }
+        runner = ModelRunner(sim_info, job_info=job_info)
+        runner.pbs_id = f'{100000 + i}.bench-server'
+        set_jobs[runner.job_id] = runner
+    return set_jobs
+
+
+def bench(num, latency):
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, 'bin')
+        os.makedirs(bin_dir)
+        qstat = os.path.join(bin_dir, 'qstat')
+        with open(qstat, 'w') as f:
+            f.write(FAKE_QSTAT.format(latency=latency))
+        os.chmod(qstat, 0o755)
+        os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+
+        set_jobs = make_runners(os.path.join(tmp, 'root'), num)
+
+        start = time.perf_counter()
+        for runner in set_jobs.values():
+            runner.check_pbs_job_status()
+        per_job = time.perf_counter() - start
+
+        start = time.perf_counter()
+        status_map = query_pbs_status([runner.pbs_id for runner in set_jobs.values()])
+        for runner in set_jobs.values():
+            runner.update_pbs_job_status(status_map)
+        batched = time.perf_counter() - start
+        assert all(runner.job_status == 'R' for runner in set_jobs.values())
+
+    print(f"{num:6d} jobs | per-job qstat: {per_job:8.3f} s ({num / per_job:9.1f} jobs/s)"
+          f" | batched qstat: {batched:8.3f} s ({num / batched:9.1f} jobs/s)"
+          f" | speedup: {per_job / batched:6.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Jobs-per-poll benchmark of PBS status polling against a fake qstat.')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated qstat server round trip in seconds.')
+    args = parser.parse_args()
+    for num in args.jobs:
+        bench(num, args.latency)
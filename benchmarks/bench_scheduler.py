@@ -0,0 +1,176 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   bench_scheduler.py
+@Create  :   2025-05-10 11:03:57
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import SimulationInfo, ModelRunner, JobScheduler
+import fake_pbs
+
+PBS_SCRIPT = '''#!/bin/bash
+#PBS -N Hydrojob
+#PBS -l nodes=1:ppn=4
+#PBS -q batch
+cd $PBS_O_WORKDIR
+mpirun ./wrf_hydro.exe
+'''
+
+
+def make_root(root_dir, input_mb):
+    """
+    A synthetic campaign: one event with input_mb MiB of forcing and placeholder parameter files.
+    Members run with the default parameters, so staging copies files without any netCDF processing.
+    """
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(os.path.join(root_dir, 'params'))
+    shutil.copy(os.path.join(repo_dir, 'params', 'run_params.yaml'), os.path.join(root_dir, 'params'))
+    params_dir = os.path.join(root_dir, 'run_source', 'Bench_params')
+    os.makedirs(params_dir)
+    for name in ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0', 'CHANPARM.TBL.temp']:
+        with open(os.path.join(params_dir, name), 'wb') as f:
+            f.write(os.urandom(4096))
+    event_dir = os.path.join(root_dir, 'run_source', 'Bench_20190804')
+    os.makedirs(os.path.join(event_dir, 'DOMAIN'))
+    os.makedirs(os.path.join(event_dir, 'FORCING'))
+    for i in range(8):
+        with open(os.path.join(event_dir, 'FORCING', f'2019072500{i:02d}.LDASIN_DOMAIN1'), 'wb') as f:
+            f.write(os.urandom(int(input_mb * 2**20 / 8)))
+    for name in ['namelist.hrldas', 'hydro.namelist', 'GENPARM.TBL', 'MPTABLE.TBL', 'wrf_hydro.exe']:
+        with open(os.path.join(event_dir, name), 'w') as f:
+            f.write(name + '\n')
+    with open(os.path.join(event_dir, 'Hydrojob.pbs'), 'w') as f:
+        f.write(PBS_SCRIPT)
+
+
+class TimedScheduler(JobScheduler):
+    """
+    JobScheduler recording when each job was submitted and collected.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted_at = {}
+        self.collected_at = {}
+
+    def fill_slots(self):
+        submitted = super().fill_slots()
+        now = time.time()
+        for job_id in submitted:
+            self.submitted_at[job_id] = now
+        return submitted
+
+    def poll(self):
+        finished = super().poll()
+        now = time.time()
+        for job_id in finished:
+            self.collected_at[job_id] = now
+        return finished
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+def bench(num, max_num, runtime, options, input_mb, state_dir):
+    with tempfile.TemporaryDirectory() as tmp:
+        root_dir = os.path.join(tmp, 'root')
+        make_root(root_dir, input_mb)
+        os.environ['FAKE_PBS_DIR'] = os.path.join(tmp, 'pbs')
+        sim_info = SimulationInfo({'obj': 'bench_scheduler', 'ROOT_DIR': root_dir, 'yaml_configs': False,
+                                   **({'state_db': 'configs/state.db'} if state_dir else {})})
+        sim_info.creat_work_dirs()
+        set_jobs = {}
+        for i in range(num):
+            job_info = {'job_id': f'bench_{i:05d}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                        'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+            set_jobs[job_info['job_id']] = ModelRunner(sim_info, job_info=job_info)
+
+        scheduler = TimedScheduler(set_jobs, max_num=max_num, **options)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = time.process_time()
+        start = time.time()
+        errors = scheduler.run()
+        wall = time.time() - start
+        cpu = time.process_time() - cpu
+        children_now = resource.getrusage(resource.RUSAGE_CHILDREN)
+        child_cpu = (children_now.ru_utime + children_now.ru_stime) - (children.ru_utime + children.ru_stime)
+
+        # slot occupancy from submission to collection, against max_num slots over the whole campaign
+        busy = sum(scheduler.collected_at[job_id] - scheduler.submitted_at[job_id]
+                   for job_id in scheduler.collected_at if job_id in scheduler.submitted_at)
+        # a finished member frees its slot at its simulated end, the slot is refilled by the next submission
+        members = []
+        for name in os.listdir(os.environ['FAKE_PBS_DIR']):
+            if name.endswith('.json'):
+                with open(os.path.join(os.environ['FAKE_PBS_DIR'], name)) as f:
+                    members += json.load(f)['members']
+        ends = sorted(member['end'] for member in members)
+        running = sum(member['end'] - member['start'] for member in members)
+        submits = sorted(scheduler.submitted_at.values())
+        refill = [submits[k + max_num] - end for k, end in enumerate(ends) if k + max_num < len(submits)]
+        stage = [runner.timings['stage']['duration'] for runner in set_jobs.values() if 'stage' in runner.timings]
+        failed = sum(runner.job_status == 'E' for runner in set_jobs.values())
+
+    return {
+        'members': num, 'max_num': max_num, 'runtime': runtime, 'options': options,
+        'wall_s': wall, 'jobs_per_hour': num / wall * 3600, 'errors': len(errors), 'failed': failed,
+        'slot_utilization': busy / (max_num * wall), 'model_utilization': running / (max_num * wall),
+        'driver_cpu_s': cpu, 'child_cpu_s': child_cpu,
+        'stage_mean_s': float(np.mean(stage)) if stage else float('nan'), 'stage_p95_s': percentile(stage, 95),
+        'refill_mean_s': float(np.mean(refill)) if refill else float('nan'), 'refill_p95_s': percentile(refill, 95),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput benchmark of JobScheduler against a fake PBS server, '
+                                                 'see fake_pbs.py.')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--max-num', type=int, default=20, help='Jobs running at the same time.')
+    parser.add_argument('--runtime', type=float, default=2.0, help='Mean simulated model runtime in seconds.')
+    parser.add_argument('--runtime-sd', type=float, default=0.5)
+    parser.add_argument('--queue-wait', type=float, default=0.5, help='Mean simulated queue wait in seconds.')
+    parser.add_argument('--fail', type=float, default=0.0, help='Probability that a member fails.')
+    parser.add_argument('--latency', type=float, default=0.01, help='Simulated server round trip of qsub/qstat in seconds.')
+    parser.add_argument('--input-mb', type=float, default=1.0, help='Size of the event directory staged per member.')
+    parser.add_argument('--options', type=json.loads, default={},
+                        help='JobScheduler options as JSON, e.g. \'{"stage_ahead": 4, "poll_max": 5}\'.')
+    parser.add_argument('--state-db', action='store_true', help='Record the campaign in a state store.')
+    parser.add_argument('--output', help='Append one JSON record per campaign to this file.')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    bin_dir = fake_pbs.install(tempfile.mkdtemp(prefix='fake_pbs_'))
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+    os.environ.update({'FAKE_PBS_RUNTIME': str(args.runtime), 'FAKE_PBS_RUNTIME_SD': str(args.runtime_sd),
+                       'FAKE_PBS_QUEUE_WAIT': str(args.queue_wait), 'FAKE_PBS_FAIL': str(args.fail),
+                       'FAKE_PBS_LATENCY': str(args.latency), 'FAKE_PBS_SEED': '0'})
+    options = dict({'poll_min': 0.5, 'poll_max': 5}, **args.options)
+    try:
+        for num in args.jobs:
+            result = bench(num, args.max_num, args.runtime, options, args.input_mb, args.state_db)
+            print(f"{num:6d} jobs | {result['wall_s']:8.1f} s | {result['jobs_per_hour']:9.0f} jobs/h"
+                  f" | slots {result['slot_utilization']:6.1%} (model running {result['model_utilization']:6.1%})"
+                  f" | driver CPU {result['driver_cpu_s']:6.2f} s, children {result['child_cpu_s']:6.2f} s"
+                  f" | stage {result['stage_mean_s'] * 1000:7.1f} ms (p95 {result['stage_p95_s'] * 1000:7.1f})"
+                  f" | refill {result['refill_mean_s']:5.2f} s (p95 {result['refill_p95_s']:5.2f})"
+                  f" | errors {result['errors']}, failed {result['failed']}")
+            if args.output:
+                with open(args.output, 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
@@ -0,0 +1,163 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   bench_submit_stress.py
+@Create  :   2025-05-13 09:38:12
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import SimulationInfo, ModelRunner, JobScheduler
+from bench_scheduler import make_root
+import fake_pbs
+
+
+def make_jobs(sim_info, num, duplicates, prefix):
+    """
+    num members, the first duplicates job IDs are used twice so that their job directories are claimed concurrently.
+    """
+    runners = []
+    for i in range(num):
+        job_info = {'job_id': f'{prefix}_{i:05d}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        runners.append(ModelRunner(sim_info, job_info=job_info))
+        if i < duplicates:
+            runners.append(ModelRunner(sim_info, job_info=job_info))
+    return runners
+
+
+def submitted_dirs(state_dir):
+    """
+    Submission directory of every fake PBS job. Format --> {pbs_id : job_dir}
+    """
+    dirs = {}
+    for name in os.listdir(state_dir):
+        if name.endswith('.json'):
+            with open(os.path.join(state_dir, name)) as f:
+                job = json.load(f)
+            dirs[f"{job['number']}.{fake_pbs.SERVER}"] = job['members'][0]['job_dir']
+    return dirs
+
+
+def check_submissions(runners, errors, state_dir, cwd):
+    """
+    Problems of a concurrent submission: failed runs, a changed working directory, shared job directories
+    or PBS IDs, and jobs submitted from another directory than their own.
+    """
+    problems = [f"{runner.job_id}: {error}" for runner, error in zip(runners, errors) if error is not None]
+    if os.getcwd() != cwd:
+        problems.append(f"working directory changed to {os.getcwd()}")
+    job_dirs = [runner.job_dir for runner in runners]
+    if len(set(job_dirs)) != len(job_dirs):
+        problems.append(f"{len(job_dirs) - len(set(job_dirs))} job directories shared")
+    pbs_ids = [runner.pbs_id for runner in runners]
+    if len(set(pbs_ids)) != len(pbs_ids):
+        problems.append(f"{len(pbs_ids) - len(set(pbs_ids))} PBS IDs shared")
+    dirs = submitted_dirs(state_dir)
+    wrong = [runner.job_id for runner in runners
+             if os.path.realpath(dirs.get(runner.pbs_id, '')) != os.path.realpath(runner.job_dir or '')]
+    if wrong:
+        problems.append(f"{len(wrong)} jobs submitted from another directory, e.g. {wrong[:3]}")
+    return problems
+
+
+def run_concurrently(runners, workers):
+    def run(runner):
+        try:
+            runner.run()
+        except Exception as e:
+            return e
+        return None
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        errors = list(executor.map(run, runners))
+    return errors, time.time() - start
+
+
+def stress(num, workers, duplicates, max_num, runtime):
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root_dir = os.path.join(tmp, 'root')
+        make_root(root_dir, input_mb=0.1)
+
+        # stage and submit all members at once from a thread pool, serially for reference
+        for label, threads in (('serial', 1), ('threads', workers)):
+            state_dir = os.path.join(tmp, f'pbs_{label}')
+            os.environ['FAKE_PBS_DIR'] = state_dir
+            os.environ['FAKE_PBS_RUNTIME'] = '3600'
+            sim_info = SimulationInfo({'obj': 'bench_submit_stress', 'ROOT_DIR': root_dir, 'run_dir': f'run_{label}',
+                                       'yaml_configs': False})
+            sim_info.creat_work_dirs()
+            runners = make_jobs(sim_info, num, duplicates, label)
+            errors, wall = run_concurrently(runners, threads)
+            problems = check_submissions(runners, errors, state_dir, cwd)
+            results.append({'case': f'stage+submit {label}', 'jobs': len(runners), 'workers': threads,
+                            'wall_s': wall, 'jobs_per_s': len(runners) / wall, 'problems': problems})
+
+        # the scheduler filling all slots with submit_workers and tracking the jobs to the end
+        state_dir = os.path.join(tmp, 'pbs_scheduler')
+        os.environ['FAKE_PBS_DIR'] = state_dir
+        os.environ['FAKE_PBS_RUNTIME'] = str(runtime)
+        sim_info = SimulationInfo({'obj': 'bench_submit_stress', 'ROOT_DIR': root_dir, 'run_dir': 'run_scheduler',
+                                   'yaml_configs': False})
+        sim_info.creat_work_dirs()
+        set_jobs = {runner.job_id: runner for runner in make_jobs(sim_info, num, 0, 'scheduler')}
+        scheduler = JobScheduler(set_jobs, max_num=max_num, poll_min=0.5, poll_max=2, submit_workers=workers)
+        start = time.time()
+        error_id = scheduler.run()
+        wall = time.time() - start
+        problems = check_submissions(list(set_jobs.values()), [None] * len(set_jobs), state_dir, cwd)
+        problems += [f"{job_id}: not submitted" for job_id in error_id]
+        collected = [name for name in os.listdir(sim_info.result_dir) if name.startswith('scheduler_')]
+        if len(collected) != num:
+            problems.append(f"{len(collected)} of {num} results collected")
+        results.append({'case': 'scheduler', 'jobs': num, 'workers': workers, 'wall_s': wall,
+                        'jobs_per_s': num / wall, 'problems': problems})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stress test of concurrent staging and submission against '
+                                                 'a fake PBS server, see fake_pbs.py.')
+    parser.add_argument('--jobs', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=32, help='Threads staging and submitting at the same time.')
+    parser.add_argument('--duplicates', type=int, default=20,
+                        help='Job IDs submitted twice, their job directories are claimed concurrently.')
+    parser.add_argument('--max-num', type=int, default=300, help='Slots of the scheduler run.')
+    parser.add_argument('--runtime', type=float, default=1.0, help='Mean simulated model runtime in seconds.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated server round trip of qsub/qstat in seconds.')
+    parser.add_argument('--output', help='Append one JSON record per case to this file.')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    bin_dir = fake_pbs.install(tempfile.mkdtemp(prefix='fake_pbs_'))
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+    os.environ.update({'FAKE_PBS_LATENCY': str(args.latency), 'FAKE_PBS_SEED': '0'})
+    try:
+        results = stress(args.jobs, args.workers, args.duplicates, args.max_num, args.runtime)
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    failed = False
+    for result in results:
+        print(f"{result['case']:<22s} | {result['jobs']:5d} jobs | {result['workers']:3d} threads"
+              f" | {result['wall_s']:7.2f} s | {result['jobs_per_s']:7.1f} jobs/s"
+              f" | {'; '.join(result['problems']) or 'ok'}")
+        failed |= bool(result['problems'])
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+    sys.exit(1 if failed else 0)
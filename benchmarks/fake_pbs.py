@@ -0,0 +1,263 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   fake_pbs.py
+@Create  :   2025-05-10 09:12:44
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import re
+import sys
+import json
+import time
+import random
+
+# A local stand-in for qsub, qstat and qdel simulating a PBS server without running the model.
+#
+#   python fake_pbs.py install <bin_dir>   writes qsub/qstat/qdel wrappers into bin_dir
+#   qsub <script> / qstat [-t] [-x] [-f] <ids> / qdel <ids>
+#
+# Every job is a JSON file in $FAKE_PBS_DIR. Its queue wait, runtime and outcome are drawn at submission
+# and its state follows from the clock, so no daemon is needed. When qstat first sees a job finished,
+# it writes a synthetic frxst_pts_out.txt into the job directory of every member, cut short for failed members,
+# and for members of job arrays and bundles their .pbs_exit_status, exactly like a real run would.
+# qstat -x lists finished jobs like the job history of PBS Pro, with -f in full format with their Exit_status.
+#
+# Settings, environment variables:
+#   FAKE_PBS_DIR         state directory, required
+#   FAKE_PBS_QUEUE_WAIT  mean queue wait in seconds, exponential, default 0
+#   FAKE_PBS_RUNTIME     mean runtime in seconds, default 1
+#   FAKE_PBS_RUNTIME_SD  standard deviation of the runtime in seconds, default 0
+#   FAKE_PBS_FAIL        probability that a member fails, default 0
+#   FAKE_PBS_LATENCY     server round trip of every command in seconds, default 0
+#   FAKE_PBS_KEEP        seconds a finished job stays visible in qstat, default forever
+#   FAKE_PBS_SEED        random seed, combined with the job number
+#   FAKE_PBS_GAUGES      gauges in the synthetic frxst_pts_out.txt, default 3
+#   FAKE_PBS_STEPS       time steps in the synthetic frxst_pts_out.txt, default 24
+
+SERVER = 'fake-server'
+
+EXIT_FILE = '.pbs_exit_status'
+
+def _env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+def _state_dir():
+    state_dir = os.environ.get('FAKE_PBS_DIR')
+    if not state_dir:
+        sys.exit('FAKE_PBS_DIR is not set')
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+def _new_number(state_dir):
+    """
+    Reserve the next job number by creating its state file exclusively.
+    """
+    number = 1000 + len(os.listdir(state_dir))
+    while True:
+        try:
+            fd = os.open(os.path.join(state_dir, f"{number}.json"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return number
+        except FileExistsError:
+            number += 1
+
+def _members(script, cwd):
+    """
+    Job directories run by a script: one per sub-job of a job array (its .map file), the members of a bundle,
+    or the submission directory of a single job.
+    """
+    with open(script, 'r', encoding='utf-8') as f:
+        text = f.read()
+    match = re.search(r'^#PBS -[Jt] (\d+)-(\d+)', text, re.M)
+    map_file = re.search(r'sed -n "[^"]+" "([^"]+\.map)"', text)
+    if match is not None and map_file is not None:
+        with open(map_file.group(1), 'r', encoding='utf-8') as f:
+            return 'array', [line.strip() for line in f if line.strip()]
+    bundle = re.findall(r'^\(cd "([^"]+)" &&', text, re.M)
+    if bundle:
+        return 'bundle', bundle
+    return 'single', [cwd]
+
+def _draw(rng):
+    """
+    Queue wait, runtime and failure of one member.
+    """
+    wait = rng.expovariate(1 / _env('FAKE_PBS_QUEUE_WAIT', 0.0)) if _env('FAKE_PBS_QUEUE_WAIT', 0.0) > 0 else 0.0
+    runtime = max(0.0, rng.gauss(_env('FAKE_PBS_RUNTIME', 1.0), _env('FAKE_PBS_RUNTIME_SD', 0.0)))
+    return wait, runtime, rng.random() < _env('FAKE_PBS_FAIL', 0.0)
+
+def qsub(args):
+    script = os.path.abspath(args[-1])
+    cwd = os.getcwd()
+    state_dir = _state_dir()
+    number = _new_number(state_dir)
+    rng = random.Random(f"{os.environ.get('FAKE_PBS_SEED', '')}-{number}")
+    kind, job_dirs = _members(script, cwd)
+    now = time.time()
+    members = []
+    for job_dir in job_dirs:
+        wait, runtime, failed = _draw(rng)
+        members.append({'job_dir': job_dir, 'start': now + wait, 'end': now + wait + runtime, 'failed': failed})
+    if kind == 'bundle':
+        # members of a bundle share one allocation, they all start with it
+        start = members[0]['start']
+        for member in members:
+            member['end'] = start + (member['end'] - member['start'])
+            member['start'] = start
+    job = {'number': number, 'kind': kind, 'script': script, 'submit': now, 'members': members, 'deleted': None}
+    with open(os.path.join(state_dir, f"{number}.json"), 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    print(f"{number}[].{SERVER}" if kind == 'array' else f"{number}.{SERVER}")
+
+def write_frxst(job_dir, failed):
+    """
+    Write a synthetic frxst_pts_out.txt, only its first half for a failed member,
+    the model writes it progressively and a crash leaves the time steps written so far.
+    """
+    gauges = _env('FAKE_PBS_GAUGES', 3)
+    steps = _env('FAKE_PBS_STEPS', 24)
+    lines = []
+    for step in range(1, (steps // 2 if failed else steps) + 1):
+        stamp = time.strftime('%Y-%m-%d_%H:%M:%S', time.gmtime(1564012800 + 3600 * step))
+        for gauge in range(1, gauges + 1):
+            q = 10.0 * gauge + step % 7
+            lines.append(f"{3600 * step:10d},{stamp},{gauge:10d}, 114.0, 38.0,{q:12.3f},{q * 35.3147:12.3f},   0.0\n")
+    path = os.path.join(job_dir, 'frxst_pts_out.txt')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(path + '.tmp', path)
+
+def _finish(job, index, member):
+    """
+    Write the outputs of a finished member once.
+    """
+    if member.get('written') or not os.path.isdir(member['job_dir']):
+        return False
+    write_frxst(member['job_dir'], member['failed'])
+    if job['kind'] != 'single':
+        exit_path = os.path.join(member['job_dir'], EXIT_FILE)
+        with open(exit_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write('1\n' if member['failed'] else '0\n')
+        os.replace(exit_path + '.tmp', exit_path)
+    member['written'] = True
+    return True
+
+def _state(member, now, deleted):
+    if deleted is not None and deleted < member['end']:
+        return 'E', deleted
+    if now < member['start']:
+        return 'Q', None
+    if now < member['end']:
+        return 'R', None
+    return ('E' if member['failed'] else 'C'), member['end']
+
+def _exit_status(member, deleted):
+    """
+    Exit status of a finished member, 271 like PBS Pro for a deleted one.
+    """
+    if deleted is not None and deleted < member['end']:
+        return 271
+    return 1 if member['failed'] else 0
+
+def _load(state_dir, number):
+    try:
+        with open(os.path.join(state_dir, f"{number}.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _save(state_dir, job):
+    path = os.path.join(state_dir, f"{job['number']}.json")
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(path + '.tmp', path)
+
+def qstat(args):
+    state_dir = _state_dir()
+    expand = '-t' in args
+    full = '-f' in args
+    keep = float('inf') if '-x' in args else _env('FAKE_PBS_KEEP', float('inf'))
+    now = time.time()
+    rows, missing = [], []
+    for pbs_id in [arg for arg in args if not arg.startswith('-')]:
+        match = re.match(r"^(\d+)(\[(\d*)\])?", pbs_id)
+        job = _load(state_dir, match.group(1)) if match else None
+        if job is None:
+            missing.append(pbs_id)
+            continue
+        changed = False
+        states = []
+        for index, member in enumerate(job['members']):
+            state, end = _state(member, now, job['deleted'])
+            if state in ('C', 'E') and end is not None:
+                changed |= _finish(job, index, member)
+            states.append((state, end))
+        if changed:
+            _save(state_dir, job)
+        if job['kind'] == 'array':
+            indices = range(len(states)) if expand or match.group(3) in (None, '') else [int(match.group(3))]
+            for index in indices:
+                state, end = states[index]
+                if end is None or now - end < keep:
+                    rows.append((f"{job['number']}[{index}].{SERVER}", state, end,
+                                 _exit_status(job['members'][index], job['deleted'])))
+        else:
+            running = [state for state, _ in states if state in ('Q', 'R')]
+            end = max((end for _, end in states if end is not None), default=None)
+            state = 'R' if 'R' in running else ('Q' if running else ('E' if job['kind'] == 'single' and states[0][0] == 'E' else 'C'))
+            exit_status = _exit_status(job['members'][0], job['deleted']) if job['kind'] == 'single' else 0
+            if running or end is None or now - end < keep:
+                rows.append((f"{job['number']}.{SERVER}", state, None if running else end, exit_status))
+            else:
+                missing.append(pbs_id)
+    if full:
+        for pbs_id, state, end, exit_status in rows:
+            print(f"Job Id: {pbs_id}\n    Job_Name = Hydrojob\n    job_state = {'F' if end is not None else state}")
+            if end is not None:
+                print(f"    Exit_status = {exit_status}")
+            print()
+    else:
+        print("Job ID                    Name             User            Time Use S Queue")
+        print("------------------------- ---------------- --------------- -------- - -----")
+        for pbs_id, state, _, _ in rows:
+            print(f"{pbs_id:<25s} Hydrojob         fake            00:00:01 {state} batch")
+    for pbs_id in missing:
+        print(f"qstat: Unknown Job Id {pbs_id}", file=sys.stderr)
+    return 153 if missing else 0
+
+def qdel(args):
+    state_dir = _state_dir()
+    for pbs_id in args:
+        match = re.match(r"^(\d+)", pbs_id)
+        job = _load(state_dir, match.group(1)) if match else None
+        if job is not None and job['deleted'] is None:
+            job['deleted'] = time.time()
+            _save(state_dir, job)
+    return 0
+
+def install(bin_dir):
+    """
+    Write qsub, qstat and qdel wrappers calling this file into bin_dir.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    for command in ('qsub', 'qstat', 'qdel'):
+        path = os.path.join(bin_dir, command)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" -S -E "{os.path.abspath(__file__)}" {command} "$@"\n')
+        os.chmod(path, 0o755)
+    return bin_dir
+
+COMMANDS = {'qsub': qsub, 'qstat': qstat, 'qdel': qdel}
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'install':
+        print(install(sys.argv[2]))
+        sys.exit(0)
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        sys.exit(f"usage: {sys.argv[0]} qsub|qstat|qdel ... or install <bin_dir>")
+    time.sleep(_env('FAKE_PBS_LATENCY', 0.0))
+    sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]) or 0)
@@ -8,13 +8,23 @@
 '''
 
 # here put the import lib
+import os
 import time
+import shutil
 import logging
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
 from .WRFHydroJob import SimulationInfo, ModelRunner
+from .staging import StagingPool
+from .cleanup import CleanupPool
+from .pbs_groups import submit_array, submit_bundle
+from .metrics import format_summary
+from .backends import parse_walltime
 
 logger = logging.getLogger(__name__)
 
-def batch_instantiate(sim_info:SimulationInfo, jobs:dict=None, configs:dict=None):
+def batch_instantiate(sim_info:SimulationInfo, jobs:dict=None, configs:dict=None, stage:bool=False, processes:int=None):
     """
     Instantiate multiple ModelRunner objects based on provided job information or configurations.
 
@@ -27,6 +37,10 @@ def batch_instantiate(sim_info:SimulationInfo, jobs:dict=None, configs:dict=None
     configs : dict, optional
         Dictionary of configurations to instantiate ModelRunner objects.
         Format --> {'job_id' : config}
+    stage : bool, optional, default=False
+        Stage all jobs right away with batch_stage, jobs failing to stage are left unstaged.
+    processes : int, optional
+        Number of processes used by nc_params_batch when staging.
     """
     set_jobs = {}
     if jobs is not None:
@@ -38,59 +52,668 @@ def batch_instantiate(sim_info:SimulationInfo, jobs:dict=None, configs:dict=None
     if jobs is None and configs is None:
         logger.error("No jobs or configs provided.")
         raise ValueError("No jobs or configs provided.")
-    
+
+    if stage:
+        batch_stage(set_jobs, processes=processes)
     return set_jobs
 
-def schedule_and_track_jobs(set_jobs:dict, max_num:int=5):
+def _discard_job_dir(runner:ModelRunner):
+    """
+    Remove the job directory of a job that failed staging, so that a retry starts from a fresh copy.
+    """
+    if runner.job_dir is not None and os.path.isdir(runner.job_dir):
+        shutil.rmtree(runner.job_dir, ignore_errors=True)
+        logger.info(f"Removed job directory {runner.job_dir} of job {runner.job_id}.")
+    runner.job_dir = None
+
+def batch_stage(set_jobs:dict, job_ids:list=None, processes:int=None):
     """
-    Get the maximum job number from the jobs dictionary.
+    Stage many jobs with one nc_params_batch call per parameter source directory,
+    instead of one read-modify-write cycle of the base files per job.
+    The job directory of a job failing to stage is removed again.
 
     Parameters
     ----------
     set_jobs : dict
-        Dictionary of jobs to be scheduled and tracked.
+        Dictionary of jobs to be staged.
         Format --> {'job_id' : ModelRunner object}
-    max_num : int, optional, default=5
-    """
+    job_ids : list, optional
+        The jobs to stage, defaults to all jobs in set_jobs.
+    processes : int, optional
+        Number of processes used by nc_params_batch.
 
-    job_ids = list(set_jobs.keys())
-    waiting_id = list(set_jobs.keys())
-    running_id = []
-    finished_id = []
+    Returns
+    ----------
+    error_id : list
+        List of job IDs that failed to stage, they are left with staged=False.
+    """
+    from .adjust_params import nc_params_batch
+    job_ids = list(set_jobs.keys()) if job_ids is None else job_ids
     error_id = []
+    groups = {}
+    starts = {}
     for job_id in job_ids:
+        runner = set_jobs[job_id]
+        if runner.result_cache is not None and runner.result_cache.get(runner.get_memo_key()) is not None:
+            # collected from the result cache by the scheduler
+            continue
+        starts[job_id] = time.time()
         try:
-            set_jobs[job_id].run()
-            logger.info(f"Job {job_id} started.")
-            waiting_id.remove(job_id)
-            running_id.append(job_id)
-            logger.info('waiting for 10 seconds...')
-            time.sleep(10)
+            runner.copy_folder()
+            set_nc_param, _ = runner.parse_params()
         except Exception as e:
-            logger.error(f"Error running job {job_id}: {e}")
-            waiting_id.remove(job_id)
-            finished_id.append(job_id)
+            logger.error(f"Error staging job {job_id}: {e}")
+            _discard_job_dir(runner)
             error_id.append(job_id)
             continue
-            
-        while ((len(waiting_id) == 0 or len(running_id) >= max_num)) and len(running_id) > 0:
-            logger.info(f"Current Running Job: {len(running_id)}")
-            logger.info(f"Current Waiting Job: {len(waiting_id)}")
-            logger.info(f"Current Finished Job: {len(finished_id)}")
-            logger.info(f"Current Error Job: {len(error_id)}")
-            logger.info('Waiting for running jobs to finish...')
-            running_id , temp_finished = check_and_collect(running_id, set_jobs)
-            finished_id.extend(temp_finished)
-            logger.info("Waiting for running jobs to finish...")
-            time.sleep(10)
+        groups.setdefault((runner.src_params_dir, runner.stage_mode), []).append((job_id, set_nc_param))
+
+    for (src_params_dir, stage_mode), members in groups.items():
+        logger.info(f"Writing parameter files of {len(members)} jobs from {src_params_dir} ...")
+        outdirs = [os.path.join(set_jobs[job_id].job_dir, 'DOMAIN') for job_id, _ in members]
+        exit_codes = nc_params_batch([set_nc_param for _, set_nc_param in members], src_params_dir, outdirs,
+                                     link_mode=stage_mode, processes=processes)
+        for (job_id, _), exit_code in zip(members, exit_codes):
+            try:
+                if exit_code != 1:
+                    set_jobs[job_id].save_config(namemark='inital_params')
+                    raise RuntimeError(f"nc_params_batch failed with exit code {exit_code}.")
+                set_jobs[job_id].inital_params(nc_done=True)
+                set_jobs[job_id].staged = True
+                set_jobs[job_id].record_timing('stage', starts[job_id])
+                set_jobs[job_id].record_state(phase='inital_params', status='staged')
+            except Exception as e:
+                logger.error(f"Error staging job {job_id}: {e}")
+                _discard_job_dir(set_jobs[job_id])
+                error_id.append(job_id)
+
+    logger.info(f"Staged {len(job_ids) - len(error_id)} jobs, errors: {error_id}")
+    return error_id
+
+class JobScheduler:
+    """
+    An event-driven scheduler that keeps up to max_num jobs running.
+
+    Free slots are filled immediately, the running jobs are polled with an adaptive interval,
+    fast right after submissions or finished jobs and slower while everything is long-running,
+    and the wait between two polls ends early when wake() is called. Backends running the jobs themselves
+    call wake() as soon as a job finishes, e.g. backends.LocalBackend. For queues that are only polled, the wait
+    never runs past the expected end of the next running job, from the median run time of the completed jobs,
+    or before the first one completes, from the walltime requested by its job script.
+
+    Parameters
+    ----------
+    set_jobs : dict
+        Dictionary of jobs to be scheduled and tracked.
+        Format --> {'job_id' : ModelRunner object}
+    max_num : int, optional, default=5
+        Maximum number of jobs running at the same time.
+    poll_min : float, optional, default=2
+        Polling interval in seconds right after a submission or a finished job.
+    poll_max : float, optional, default=60
+        Upper bound of the polling interval in seconds.
+    poll_backoff : float, optional, default=1.5
+        Factor applied to the polling interval after each round without any change.
+    stage_ahead : int, optional, default=0
+        Number of jobs staged ahead by a StagingPool while others are queued or running,
+        0 stages every job on the scheduler thread right before its submission.
+    max_stage_bytes : int, optional
+        Disk budget of the jobs staged ahead, see StagingPool.
+    min_free_bytes : int, optional, default=1 GiB
+        Free space of the run directory below which jobs are staged ahead one at a time, see StagingPool.
+    group_mode : str, optional
+        None submits one PBS job per member. The members filling free slots are submitted together
+        as one PBS job array with 'array', see pbs_groups.submit_array,
+        or as one PBS job running them inside a single allocation with 'bundle', see pbs_groups.submit_bundle.
+        Groups are only submitted to backends supporting them, see check_group_mode.
+    group_size : int, optional, default=50
+        Maximum number of members per job array or bundle.
+    array_flag : str, optional, default='-J'
+        qsub option of job arrays, '-J' for PBS Pro or '-t' for Torque.
+    bundle_parallel : int, optional
+        Number of members of a bundle running at the same time, defaults to all, 1 runs them back-to-back.
+    bundle_resources : list, optional
+        PBS resource requests of a bundle, e.g. ['-l nodes=1:ppn=24'], defaults to the member's requests.
+    state_store : StateStore, optional
+        Store recording the queue and the job states, defaults to the state store of the jobs, see SimulationInfo.
+    metrics : Metrics, optional
+        Per-phase timings and Prometheus textfile of the scheduler, defaults to the metrics of the jobs.
+        Both default to those of the first job added with add_job when set_jobs is empty.
+    running_id : list, optional
+        Jobs of set_jobs already submitted and tracked from the start, e.g. re-adopted by resume_jobs.
+    on_finished : callable, optional
+        Called with the job ID and the ModelRunner object of every finished or failed job,
+        it may add new jobs with add_job, e.g. calibration.Calibration.
+    cleanup_workers : int, optional, default=2
+        Number of threads removing the outputs of finished jobs in the background, see cleanup.CleanupPool,
+        0 removes them on the scheduler thread.
+    keep_restarts : int, optional, default=0
+        Number of the latest HYDRO_RST and RESTART files kept in the job directory of completed jobs.
+    keep_times : list, optional
+        Timestamps whose outputs are kept in the job directory of completed jobs, e.g. ['2019-08-01 00:00'].
+    keep_failed : bool, optional, default=True
+        Keep all outputs of failed jobs.
+    archive : dict, optional
+        Keyword arguments of an ArchivePool compressing the LDASOUT/CHRTOUT outputs of completed jobs into
+        <result_dir>/archive/<job_id>.nc before their cleanup, e.g. {'processes': 2, 'kinds': ['LDASOUT'], 'pack': True}.
+    submit_workers : int, optional, default=0
+        Number of threads staging and submitting the jobs filling free slots concurrently, e.g. when every qsub
+        call takes a second, 0 runs them one after another on the scheduler thread. The job lists of the scheduler
+        are only changed on the scheduler thread.
+    """
+    def __init__(self, set_jobs:dict, max_num:int=5, poll_min:float=2, poll_max:float=60, poll_backoff:float=1.5,
+                 stage_ahead:int=0, max_stage_bytes:int=None, min_free_bytes:int=1024**3, group_mode:str=None,
+                 group_size:int=50, array_flag:str='-J', bundle_parallel:int=None, bundle_resources:list=None, state_store=None, metrics=None,
+                 running_id:list=None, on_finished=None, cleanup_workers:int=2, keep_restarts:int=0, keep_times:list=None,
+                 keep_failed:bool=True, archive:dict=None, submit_workers:int=0):
+        """
+        Initialize the scheduler with all jobs waiting.
+        """
+        self.set_jobs = set_jobs
+        self.max_num = max_num
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.poll_backoff = poll_backoff
+        self.poll_interval = poll_min
+
+        self.running_id = list(running_id or [])
+        self.waiting_id = [job_id for job_id in set_jobs if job_id not in self.running_id]
+        self.finished_id = []
+        self.error_id = []
+        self.wake_event = threading.Event()
+        self.on_finished = on_finished
+        self.memo_checked = set()
+        self.walltimes = {}
+        self.backends = {}
+        self._backend_done = lambda pbs_id: self.wake()
+        self.watch(set_jobs.values())
+        self.submitter = None
+        if submit_workers > 0:
+            self.submitter = ThreadPoolExecutor(max_workers=submit_workers, thread_name_prefix='submit')
+        if group_mode not in (None, 'array', 'bundle'):
+            raise ValueError(f"Invalid group mode '{group_mode}'. Use None, 'array' or 'bundle'.")
+        self.group_mode = group_mode
+        self.group_size = group_size
+        self.array_flag = array_flag
+        self.bundle_parallel = bundle_parallel
+        self.bundle_resources = bundle_resources
+        for backend in {id(runner.backend): runner.backend for runner in set_jobs.values()}.values():
+            self.check_group_mode(backend)
+        self.staging = None
+        if stage_ahead > 0:
+            self.staging = StagingPool(set_jobs, depth=stage_ahead, max_stage_bytes=max_stage_bytes,
+                                       min_free_bytes=min_free_bytes, on_staged=lambda job_id: self.wake())
+        archive_pool = None
+        if archive is not None:
+            from .archive import ArchivePool
+            archive_pool = ArchivePool(**archive)
+        self.cleanup = CleanupPool(workers=cleanup_workers, keep_restarts=keep_restarts, keep_times=keep_times,
+                                   keep_failed=keep_failed, archive=archive_pool)
+        if state_store is None:
+            state_store = next((runner.state_store for runner in set_jobs.values() if runner.state_store is not None), None)
+        self.state_store = state_store
+        if metrics is None:
+            metrics = next((runner.metrics for runner in set_jobs.values() if runner.metrics is not None), None)
+        self.metrics = metrics
+        self.record([set_jobs[job_id] for job_id in self.waiting_id if not set_jobs[job_id].staged], phase='created', status='waiting')
+
+    def record(self, runners:list, phase:str=None, status:str=None):
+        """
+        Record the state of several jobs in the state store with one transaction.
+        """
+        if self.state_store is None or not runners:
+            return
+        for runner in runners:
+            if phase is not None:
+                runner.phase = phase
+        try:
+            self.state_store.record_many(runners, phase=phase, status=status)
+        except Exception as e:
+            logger.error(f"Error recording {len(runners)} jobs in the state store: {e}")
+
+    def add_job(self, job_id, runner:ModelRunner):
+        """
+        Add a new job to the end of the waiting queue and wake up the scheduler.
+        """
+        self.set_jobs[job_id] = runner
+        self.waiting_id.append(job_id)
+        self.watch([runner])
+        if self.state_store is None:
+            self.state_store = runner.state_store
+        if self.metrics is None:
+            self.metrics = runner.metrics
+        self.record([runner], phase='created', status='waiting')
+        self.wake()
+
+    def wake(self):
+        """
+        End the current wait early, e.g. when a job is known to have finished.
+        """
+        self.wake_event.set()
+
+    def watch(self, runners):
+        """
+        Have the backends of runners call wake() when one of their jobs finishes, see LocalBackend.add_done_callback.
+        """
+        for runner in runners:
+            backend = runner.backend
+            if backend is not None and id(backend) not in self.backends:
+                self.backends[id(backend)] = backend
+                backend.add_done_callback(self._backend_done)
+
+    def expected_wait(self):
+        """
+        Seconds until the next running job is expected to finish, None if no job is expected to finish later.
+        A job starts when it is first seen running, else when it was submitted, and is expected to run as long as
+        the median completed job or, before the first one has completed, its requested walltime.
+        """
+        runs = [self.set_jobs[job_id].timings['run']['duration'] for job_id in self.finished_id
+                if self.set_jobs[job_id].job_status == 'C' and 'run' in self.set_jobs[job_id].timings]
+        typical = statistics.median(runs) if runs else None
+        now = time.time()
+        waits = []
+        for job_id in self.running_id:
+            runner = self.set_jobs[job_id]
+            start = runner.timings.get('queue', runner.timings.get('submit', {})).get('end')
+            duration = typical
+            if duration is None:
+                if job_id not in self.walltimes:
+                    self.walltimes[job_id] = parse_walltime(os.path.join(runner.job_dir or '', runner.pbs_script))
+                duration = self.walltimes[job_id]
+            if start is not None and duration is not None and start + duration > now:
+                waits.append(start + duration - now)
+        return min(waits) if waits else None
+
+    def _fail(self, job_id, e):
+        """
+        Record a job that failed before or during submission.
+        """
+        logger.error(f"Error running job {job_id}: {e}")
+        self.finished_id.append(job_id)
+        self.error_id.append(job_id)
+        self.notify([job_id])
+
+    def notify(self, finished:list):
+        """
+        Call on_finished for each finished job.
+        """
+        if self.on_finished is None:
+            return
+        for job_id in finished:
+            try:
+                self.on_finished(job_id, self.set_jobs[job_id])
+            except Exception as e:
+                logger.error(f"Error in on_finished of job {job_id}: {e}")
+
+    def fill_slots(self):
+        """
+        Submit waiting jobs until all slots are busy or nothing is waiting.
+
+        Returns
+        ----------
+        submitted : list
+            List of job IDs that have been submitted.
+        """
+        submitted = []
+        group = []
+        self.collect_memoized()
+        if self.staging is not None:
+            self.staging.prefetch(self.waiting_id)
+        while self.waiting_id and len(self.running_id) + len(group) < self.max_num:
+            job_ids = self.take(self.max_num - len(self.running_id) - len(group))
+            if not job_ids:
+                break
+            # single jobs are staged and submitted, members of groups are staged
+            action = _run_job if self.group_mode is None else _stage_job
+            for job_id, error in zip(job_ids, self.run_all(job_ids, action)):
+                if error is not None:
+                    self._fail(job_id, error)
+                    continue
+                if self.group_mode is None:
+                    logger.info(f"Job {job_id} started.")
+                    self.running_id.append(job_id)
+                    submitted.append(job_id)
+                    continue
+                group.append(job_id)
+                if len(group) >= self.group_size:
+                    submitted.extend(self.submit_group(group))
+                    group = []
+        if group:
+            submitted.extend(self.submit_group(group))
+        if self.staging is not None:
+            self.staging.prefetch(self.waiting_id)
+        return submitted
+
+    def take(self, num:int):
+        """
+        Remove up to num jobs ready for submission from the waiting queue, jobs that failed to stage ahead are failed.
+
+        Returns
+        ----------
+        job_ids : list
+            List of job IDs in queue order.
+        """
+        job_ids = []
+        while self.waiting_id and len(job_ids) < num:
+            if self.staging is None:
+                job_id = self.waiting_id[0]
+            else:
+                job_id = self.staging.next_ready(self.waiting_id)
+                if job_id is None:
+                    break
+            self.waiting_id.remove(job_id)
+            try:
+                if self.staging is not None:
+                    self.staging.pop(job_id)
+                job_ids.append(job_id)
+            except Exception as e:
+                self._fail(job_id, e)
+        return job_ids
+
+    def run_all(self, job_ids:list, action):
+        """
+        Call action on the ModelRunner objects of job_ids, concurrently with submit_workers.
+
+        Returns
+        ----------
+        errors : list
+            The exception raised for each job, None if it succeeded, in the order of job_ids.
+        """
+        runners = [self.set_jobs[job_id] for job_id in job_ids]
+        if self.submitter is None or len(runners) == 1:
+            return [_call(action, runner) for runner in runners]
+        return list(self.submitter.map(_call, [action] * len(runners), runners))
+
+    def collect_memoized(self):
+        """
+        Collect the waiting jobs found in the result cache, each waiting job is looked up once.
+
+        Returns
+        ----------
+        collected : list
+            List of job IDs collected from the result cache.
+        """
+        collected = []
+        for job_id in list(self.waiting_id):
+            if job_id in self.memo_checked:
+                continue
+            self.memo_checked.add(job_id)
+            runner = self.set_jobs[job_id]
+            if runner.result_cache is None or runner.staged:
+                continue
+            try:
+                if runner.collect_memoized():
+                    self.waiting_id.remove(job_id)
+                    collected.append(job_id)
+            except Exception as e:
+                logger.error(f"Error collecting job {job_id} from the result cache: {e}")
+        if collected:
+            logger.info(f"Jobs {collected} collected from the result cache.")
+            self.finished_id.extend(collected)
+            self.notify(collected)
+        return collected
+
+    def check_group_mode(self, backend):
+        """
+        Raise a ValueError if the backend cannot run the job arrays or bundles of group_mode.
+        """
+        if self.group_mode == 'array' and not backend.supports_arrays:
+            raise ValueError(f"The {backend.name} backend does not support job arrays, use group_mode='bundle'.")
+        if self.group_mode == 'bundle' and not backend.supports_bundles:
+            raise ValueError(f"The {backend.name} backend does not support bundles, use group_mode=None.")
+
+    def submit_group(self, group:list):
+        """
+        Submit staged jobs together as one PBS job array or bundle, a single job is submitted on its own.
+
+        Returns
+        ----------
+        submitted : list
+            List of job IDs that have been submitted.
+        """
+        runners = [self.set_jobs[job_id] for job_id in group]
+        try:
+            start = time.time()
+            group_dir = os.path.join(runners[0].run_dir, 'pbs_groups')
+            if len(runners) > 1:
+                # jobs added later may come with another backend than the ones checked at the start
+                if any(runner.backend is not runners[0].backend for runner in runners):
+                    raise ValueError("The members of a group must share one execution backend.")
+                self.check_group_mode(runners[0].backend)
+            if len(runners) == 1:
+                runners[0].run()
+            elif self.group_mode == 'array':
+                submit_array(runners, group_dir, array_flag=self.array_flag, backend=runners[0].backend)
+            else:
+                submit_bundle(runners, group_dir, parallel=self.bundle_parallel, resources=self.bundle_resources,
+                              backend=runners[0].backend)
+        except Exception as e:
+            for job_id in group:
+                self.set_jobs[job_id].save_config(namemark='submit_pbs_job')
+                self._fail(job_id, e)
+            return []
+        if len(runners) > 1:
+            end = time.time()
+            for runner in runners:
+                runner.record_timing('submit', start, end)
+            self.record(runners, phase='submit_pbs_job', status='submitted')
+        logger.info(f"Jobs {group} started.")
+        self.running_id.extend(group)
+        return group
+
+    def poll(self):
+        """
+        Check the running jobs once and collect the finished ones.
+
+        Returns
+        ----------
+        finished : list
+            List of job IDs that have finished since the last poll.
+        """
+        start = time.time()
+        self.running_id, finished = check_and_collect(self.running_id, self.set_jobs, cleanup=self.cleanup)
+        self.finished_id.extend(finished)
+        self.notify(finished)
+        logger.info(f"Running: {len(self.running_id)}, Waiting: {len(self.waiting_id)}, "
+                    f"Finished: {len(self.finished_id)}, Error: {len(self.error_id)}")
+        if self.metrics is not None:
+            self.metrics.observe('poll', start, time.time() - start, jobs=len(self.running_id) + len(finished))
+            self.write_metrics()
+        return finished
+
+    def write_metrics(self):
+        """
+        Update the Prometheus textfile of the metrics with the phase summaries and the number of jobs per state.
+        """
+        try:
+            self.metrics.write_prometheus(queue={'running': len(self.running_id), 'waiting': len(self.waiting_id),
+                                                 'finished': len(self.finished_id), 'error': len(self.error_id)})
+        except Exception as e:
+            logger.error(f"Error writing the metrics textfile: {e}")
+
+    def cancel(self):
+        """
+        Cancel all queued or running jobs with their execution backend and stop tracking them.
+
+        Returns
+        ----------
+        cancelled : list
+            List of job IDs that have been cancelled.
+        """
+        cancelled = list(self.running_id)
+        for runners in _by_backend([self.set_jobs[job_id] for job_id in cancelled]).values():
+            try:
+                runners[0].backend.cancel([runner.pbs_id for runner in runners])
+            except Exception as e:
+                logger.error(f"Error cancelling jobs: {e}")
+        for job_id in cancelled:
+            self.set_jobs[job_id].record_state(phase='cancel', status='failed')
+        self.running_id = []
+        self.error_id.extend(cancelled)
+        logger.info(f"Jobs {cancelled} cancelled.")
+        return cancelled
+
+    def wait(self):
+        """
+        Sleep for the current polling interval or until wake() is called.
+        """
+        timeout = self.poll_interval
+        expected = self.expected_wait()
+        if expected is not None:
+            timeout = min(timeout, max(self.poll_min, expected))
+        logger.debug(f"Waiting up to {timeout:.1f} seconds...")
+        self.wake_event.wait(timeout)
+        self.wake_event.clear()
+
+    def step(self):
+        """
+        Run one scheduling round: fill free slots, wait, poll and adapt the polling interval.
+        """
+        submitted = self.fill_slots()
+        if not self.running_id:
+            if self.waiting_id:
+                # nothing to poll, wait for the staging threads
+                self.wait()
+            return
+        if submitted:
+            self.poll_interval = self.poll_min
+        self.wait()
+        finished = self.poll()
+        if finished:
+            self.poll_interval = self.poll_min
+        elif not submitted:
+            self.poll_interval = min(self.poll_interval * self.poll_backoff, self.poll_max)
+
+    def run(self):
+        """
+        Schedule and track all jobs until every job has finished.
+
+        Returns
+        ----------
+        error_id : list
+            List of job IDs that failed before or during submission.
+        """
+        try:
+            while self.waiting_id or self.running_id:
+                self.step()
+        finally:
+            if self.staging is not None:
+                self.staging.shutdown()
+            if self.submitter is not None:
+                self.submitter.shutdown(wait=True)
+            self.cleanup.shutdown()
+            for backend in self.backends.values():
+                backend.remove_done_callback(self._backend_done)
+            if self.metrics is not None:
+                self.write_metrics()
+
+        logger.info("All jobs have been finished.")
+        if self.metrics is not None:
+            logger.info(f"Phase timings of the jobs:\n{format_summary(self.metrics.summary())}")
+        logger.info(f"Error jobs: {self.error_id}")
+        return self.error_id
+
+def _run_job(runner:ModelRunner):
+    runner.run()
+
+def _stage_job(runner:ModelRunner):
+    if not runner.staged:
+        runner.stage()
+
+def _call(action, runner:ModelRunner):
+    """
+    Call action on a runner and return the exception it raised, None if it succeeded.
+    """
+    try:
+        action(runner)
+    except Exception as e:
+        return e
+    return None
+
+def schedule_and_track_jobs(set_jobs:dict, max_num:int=5, **options):
+    """
+    Schedule the jobs with at most max_num running at the same time and track them until finished.
+
+    Parameters
+    ----------
+    set_jobs : dict
+        Dictionary of jobs to be scheduled and tracked.
+        Format --> {'job_id' : ModelRunner object}
+    max_num : int, optional, default=5
+    options : dict, optional
+        Further keyword arguments of JobScheduler, e.g. the adaptive polling settings poll_min/poll_max,
+        stage_ahead for staging jobs in background threads or group_mode='array'/'bundle'.
+
+    Returns
+    ----------
+    error_id : list
+        List of job IDs that failed before or during submission.
+    """
+    scheduler = JobScheduler(set_jobs, max_num=max_num, **options)
+    return scheduler.run()
+
+
+def collect_job(runner:ModelRunner, cleanup:CleanupPool=None):
+    """
+    Collect the results of a job according to its job_status,
+    'C' : copy frxst_pts_out.txt, save the config and clean up,
+    'E' : copy frxst_pts_out.txt with the suffix '_error', save the config and keep the outputs.
+    With a CleanupPool the outputs are removed in the background according to its retention policy.
 
-    logger.info("All jobs have been finished.")
-    logger.info(f"Error jobs: {error_id}")
+    Returns
+    ----------
+    finished : bool
+        True if the job has finished, False if it is still queued or running.
+    """
+    if runner.job_status == "C":
+        logger.info(f"Job {runner.job_id} completed successfully.")
+        runner.collect_frxst(runner.result_dir)
+        runner.save_config()
+        if cleanup is None:
+            runner.cleanup()
+        else:
+            cleanup.submit(runner)
+        return True
+    elif runner.job_status == "E":
+        logger.error(f"Job {runner.job_id} encountered an error.")
+        runner.collect_frxst(runner.result_dir, '_error')
+        runner.save_config()
+        if cleanup is not None:
+            cleanup.submit(runner)
+        return True
+    elif runner.job_status == "R":
+        logger.info(f"Job {runner.job_id} is still running.")
+    else:
+        logger.info(f"Job {runner.job_id} is in an unknown state.")
+    return False
 
+def _by_backend(runners:list):
+    """
+    Group ModelRunner objects by their execution backend. Format --> {id(backend) : [runner, ...]}
+    """
+    groups = {}
+    for runner in runners:
+        groups.setdefault(id(runner.backend), []).append(runner)
+    return groups
 
-def check_and_collect(running_id:list, set_jobs:dict):
+def query_status(runners:list):
+    """
+    Query the status of many jobs with one batched call per execution backend.
+
+    Returns
+    ----------
+    status_map : dict
+        Format --> {pbs_id : state}, jobs unknown to their backend are missing from the map.
+    """
+    status_map = {}
+    for group in _by_backend(runners).values():
+        status_map.update(group[0].backend.status([runner.pbs_id for runner in group]))
+    return status_map
+
+def check_and_collect(running_id:list, set_jobs:dict, cleanup:CleanupPool=None):
     """
     Check the status of running jobs and collect results if finished. Current used in the schedule_and_track_jobs function.
+    The status of all running jobs is fetched with one batched query per backend and round, e.g. one qstat call.
     
     Parameters
     ----------
@@ -99,6 +722,8 @@ def check_and_collect(running_id:list, set_jobs:dict):
     set_jobs : dict
         Dictionary of jobs to be checked.
         Format --> {'job_id' : ModelRunner object}
+    cleanup : CleanupPool, optional
+        Pool removing the outputs of finished jobs in the background, see collect_job.
 
     Returns
     ----------
@@ -108,30 +733,101 @@ def check_and_collect(running_id:list, set_jobs:dict):
         List of job IDs that have finished running.
     """
     to_remove = []
+    try:
+        status_map = query_status([set_jobs[job_id] for job_id in running_id])
+    except Exception as e:
+        # a missing job would be resolved as finished, keep all jobs and retry on the next poll
+        logger.error(f"Error querying job status, retrying on the next poll: {e}")
+        return running_id, to_remove
+
     for job_id in running_id:
         try:
-            set_jobs[job_id].check_pbs_job_status()
-            if set_jobs[job_id].job_status == "C":
-                logger.info(f"Job {set_jobs[job_id].job_id} completed successfully.")
-                set_jobs[job_id].collect_frxst(set_jobs[job_id].result_dir)
-                set_jobs[job_id].cleanup()
-                set_jobs[job_id].save_config()
-                to_remove.append(job_id)
-
-            elif set_jobs[job_id].job_status == "E":
-                logger.error(f"Job {set_jobs[job_id].job_id} encountered an error.")
-                set_jobs[job_id].collect_frxst(set_jobs[job_id].result_dir, '_error')
-                set_jobs[job_id].save_config()
+            set_jobs[job_id].update_pbs_job_status(status_map)
+            if collect_job(set_jobs[job_id], cleanup=cleanup):
                 to_remove.append(job_id)
-
-            elif set_jobs[job_id].job_status == "R":
-                logger.info(f"Job {set_jobs[job_id].job_id} is still running.")
-            else:
-                logger.info(f"Job {set_jobs[job_id].job_id} is in an unknown state.")
-
         except Exception as e:
             logger.error(f"Error checking job {job_id}: {e}")
             continue
     for job_id in to_remove:
         running_id.remove(job_id)
-    return running_id, to_remove
\ No newline at end of file
+    return running_id, to_remove
+
+def resume_jobs(sim_info:SimulationInfo, state_store=None):
+    """
+    Restore the jobs of an interrupted campaign from its state store.
+
+    Submitted jobs are re-queried with one batched query, e.g. one qstat call. The ones still queued or running are re-adopted,
+    the ones that finished while the driver was down are collected right away. A single PBS job that has already
+    left qstat is resolved by its exit status in the job history, members of job arrays and bundles
+    by their recorded exit status, jobs without any exit status count as failed. Completed and failed jobs
+    are left as they are, all other jobs are queued again, keeping their job directory if they were fully staged.
+
+    Parameters
+    ----------
+    sim_info : SimulationInfo
+        The simulation information of the campaign, with the option 'state_db'.
+    state_store : StateStore, optional
+        Defaults to the state store of sim_info.
+
+    Returns
+    ----------
+    set_jobs : dict
+        Dictionary of the jobs still to be tracked or submitted, in queue order.
+        Format --> {'job_id' : ModelRunner object}
+    running_id : list
+        List of job IDs re-adopted as queued or running.
+    """
+    state_store = sim_info.state_store if state_store is None else state_store
+    if state_store is None:
+        logger.error("No state store to resume from, set the 'state_db' option of SimulationInfo.")
+        raise ValueError("No state store to resume from.")
+
+    set_jobs = {}
+    submitted = []
+    for job in state_store.query():
+        if job['status'] in ('completed', 'failed') or job['config'] is None:
+            continue
+        runner = ModelRunner(sim_info, job_info=None, config=job['config'])
+        runner.restore_state(job)
+        set_jobs[runner.job_id] = runner
+        if job['status'] == 'submitted' and runner.pbs_id is not None:
+            submitted.append(runner.job_id)
+
+    status_map = query_status([set_jobs[job_id] for job_id in submitted]) if submitted else {}
+    running_id = []
+    for job_id in submitted:
+        runner = set_jobs[job_id]
+        try:
+            runner.update_pbs_job_status(status_map)
+            if collect_job(runner):
+                del set_jobs[job_id]
+            else:
+                running_id.append(job_id)
+        except Exception as e:
+            logger.error(f"Error resuming job {job_id}: {e}")
+            del set_jobs[job_id]
+
+    logger.info(f"Resumed {len(set_jobs)} jobs: {len(running_id)} re-adopted, {len(set_jobs) - len(running_id)} to submit, "
+                f"{len(submitted) - len(running_id)} collected.")
+    return set_jobs, running_id
+
+def resume_and_track_jobs(sim_info:SimulationInfo, max_num:int=5, **options):
+    """
+    Resume an interrupted campaign from its state store, see resume_jobs, and track it until finished.
+
+    Parameters
+    ----------
+    sim_info : SimulationInfo
+        The simulation information of the campaign, with the option 'state_db'.
+    max_num : int, optional, default=5
+    options : dict, optional
+        Further keyword arguments of JobScheduler.
+
+    Returns
+    ----------
+    error_id : list
+        List of job IDs that failed before or during submission.
+    """
+    set_jobs, running_id = resume_jobs(sim_info)
+    scheduler = JobScheduler(set_jobs, max_num=max_num, running_id=running_id, **options)
+    return scheduler.run()
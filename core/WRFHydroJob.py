@@ -9,13 +9,17 @@
 
 # here put the import libraries
 import os
-import re
 import shutil
 import yaml
 import logging
-import subprocess
+import time
 from datetime import datetime
-from .adjust_params import chan_param, nc_params
+from .staging import stage_tree, place_file
+from .state_store import StateStore
+from .memo import ResultCache
+from .cleanup import prune_outputs
+from .backends import make_backend, query_pbs_status
+from .metrics import Metrics
 
 logger = logging.getLogger(__name__)
 
@@ -30,18 +34,56 @@ class SimulationInfo:
         
         'obj': str
         'ROOT_DIR': str
+        'stage_mode': str, optional, 'copy' (default), 'hardlink' or 'symlink', see staging.stage_tree
+        'stage_policy': list, optional, per-file staging policy, see staging.STAGE_POLICY
+        'nc_method': str, optional, 'xarray' (default) or 'patch', see adjust_params.nc_params
+        'nc_verify': bool, optional, verify the 'patch' results against the 'xarray' path
+        'state_db': str, optional, SQLite campaign state store relative to ROOT_DIR, e.g. 'configs/state.db',
+            see state_store.StateStore
+        'yaml_configs': bool, optional, still write the per-job YAML configs, defaults to True without state_db
+        'result_format': str, optional, 'txt' (default) copies frxst_pts_out.txt of every member into result_dir,
+            'cube' appends it to the result cube <result_dir>/<event_no>_frxst.nc, see results.append_cube, 'both' does both
+        'memo': bool, optional, reuse the result of an identical member instead of running it again,
+            see memo.ResultCache, the cache is kept in <config_dir>/memo.db and <result_dir>/.memo
+        'backend': str, optional, 'pbs' (default), 'slurm' or 'local' (run on the current node), see backends.make_backend
+        'backend_options': dict, optional, keyword arguments of the backend, e.g. {'max_workers': 4} for 'local'
+        'job_script': str, optional, the launch script of the event directories, defaults to 'Hydrojob.pbs'
+        'metrics': str, optional, JSON-lines file of the per-phase timings of every job relative to ROOT_DIR,
+            e.g. 'result/metrics.jsonl', see metrics.Metrics
+        'metrics_textfile': str, optional, Prometheus textfile relative to ROOT_DIR updated by the scheduler
     """
     def __init__(self, sim_info:dict):
         """
         Initialize the SimulationInfo object with simulation information.
         """
         self.obj = sim_info['obj']
-        self.ROOT_DIR = sim_info['ROOT_DIR']
+        # absolute, so that jobs can be staged from worker threads independent of the working directory
+        self.ROOT_DIR = os.path.abspath(sim_info['ROOT_DIR'])
         self.run_source_dir = os.path.join(self.ROOT_DIR, sim_info.get('run_source_dir','run_source'))
         self.run_dir = os.path.join(self.ROOT_DIR, sim_info.get('run_dir','run'))
         self.result_dir = os.path.join(self.ROOT_DIR, sim_info.get('result_dir','result'))
         self.config_dir = os.path.join(self.ROOT_DIR, sim_info.get('config_dir','configs'))
         self.params_yaml = os.path.join(self.ROOT_DIR, sim_info.get('params_yaml',''), 'params', 'run_params.yaml')
+        self.stage_mode = sim_info.get('stage_mode', 'copy')
+        self.stage_policy = sim_info.get('stage_policy', None)
+        self.nc_method = sim_info.get('nc_method', 'xarray')
+        self.nc_verify = sim_info.get('nc_verify', False)
+        self.state_store = None
+        if sim_info.get('state_db') is not None:
+            self.state_store = StateStore(os.path.join(self.ROOT_DIR, sim_info['state_db']))
+        self.yaml_configs = sim_info.get('yaml_configs', self.state_store is None)
+        self.result_format = sim_info.get('result_format', 'txt')
+        self.result_cache = None
+        if sim_info.get('memo', False):
+            self.result_cache = ResultCache(os.path.join(self.config_dir, 'memo.db'), os.path.join(self.result_dir, '.memo'))
+        self.backend = make_backend(sim_info.get('backend', 'pbs'), **sim_info.get('backend_options', {}))
+        self.job_script = sim_info.get('job_script', 'Hydrojob.pbs')
+        self.metrics = None
+        if sim_info.get('metrics') is not None or sim_info.get('metrics_textfile') is not None:
+            self.metrics = Metrics(
+                os.path.join(self.ROOT_DIR, sim_info['metrics']) if sim_info.get('metrics') else None,
+                os.path.join(self.ROOT_DIR, sim_info['metrics_textfile']) if sim_info.get('metrics_textfile') else None,
+                labels={'campaign': self.obj})
 
         with open(self.params_yaml, 'r', encoding='utf-8') as file:
             self.params_info = yaml.safe_load(file)
@@ -57,7 +99,7 @@ class SimulationInfo:
             if not os.path.exists(directory):
                 logger.info(f"Directory {directory} does not exist. Creating...")
                 try:
-                    os.makedirs(directory)
+                    os.makedirs(directory, exist_ok=True)
                     logger.info(f"Created directory: {directory}")
                 except Exception as e:
                     logger.error(f"Failed to create directory {directory}: {e}")
@@ -75,11 +117,11 @@ class ModelRunner:
         An instance of the SimulationInfo class containing simulation information.
     job_info: dict
         Contains information about the simulation run, including job ID, period, event number, basin,  and parameters.
-    config: str
-        Path to a configuration file in YAML format.
+    config: str or dict
+        Path to a configuration file in YAML format, or its content, e.g. the config stored in a StateStore.
     """
 
-    def __init__(self, sim_info:SimulationInfo, job_info:dict=None, config:str=None):
+    def __init__(self, sim_info:SimulationInfo, job_info:dict=None, config=None):
         """
         """
         # Determine initialization source (sim_info dictionary or config file)
@@ -101,15 +143,23 @@ class ModelRunner:
             
             self.params_info = sim_info.params_info
             self.set_params = job_info['set_params']
+            self.stage_mode = sim_info.stage_mode
+            self.stage_policy = sim_info.stage_policy
+            self.nc_method = sim_info.nc_method
+            self.nc_verify = sim_info.nc_verify
+            self.result_format = sim_info.result_format
 
         elif config is not None:
             # Initialize from config file
-            with open(config, 'r', encoding='utf-8') as file:
-                config_self = yaml.safe_load(file)
+            if isinstance(config, dict):
+                config_self = config
+            else:
+                with open(config, 'r', encoding='utf-8') as file:
+                    config_self = yaml.safe_load(file)
             
             self.job_id = config_self['job_id']
             self.period = config_self['period']
-            self.event_no = config_self['event_no']
+            self.event_no = str(config_self['event_no'])
             self.basin = config_self.get('basin', 'params_files')
             
             self.ROOT_DIR = config_self['ROOT_DIR']
@@ -119,98 +169,178 @@ class ModelRunner:
             self.result_dir = config_self['result_dir']
             self.config_dir = config_self['config_dir']
             self.src_run_dir = config_self['src_run_dir']
+            self.params_info = sim_info.params_info
             self.set_params = config_self['set_params']
+            self.stage_mode = config_self.get('stage_mode', 'copy')
+            self.stage_policy = config_self.get('stage_policy', None)
+            self.nc_method = config_self.get('nc_method', 'xarray')
+            self.nc_verify = config_self.get('nc_verify', False)
+            self.result_format = config_self.get('result_format', 'txt')
 
         else:
             raise ValueError("Either sim_info or config must be provided")
             
         # Common initialization
+        self.state_store = getattr(sim_info, 'state_store', None)
+        self.result_cache = getattr(sim_info, 'result_cache', None)
+        self.memo_key = None
+        self.yaml_configs = getattr(sim_info, 'yaml_configs', True)
+        self.phase = 'created'
+        self.timings = {}
+        self.result_path = None
         self.pbs_id = None
         self.job_dir = None
         self.job_status = None
-        self.pbs_script = 'Hydrojob.pbs'
+        self.staged = False
+        self.group_id = None
+        self.exit_file = '.pbs_exit_status'
+        self.pbs_script = getattr(sim_info, 'job_script', 'Hydrojob.pbs')
+        self.backend = getattr(sim_info, 'backend', None) or make_backend('pbs')
+        self.metrics = getattr(sim_info, 'metrics', None)
         self.wrfhydrofrxst = 'frxst_pts_out.txt'
+    def config_dict(self):
+        """
+        Return the configuration of the job, the content of its YAML config.
+        """
+        return {
+            'job_id': self.job_id,
+            'period': self.period,
+            'event_no': self.event_no,
+            'basin': self.basin,
+
+            'ROOT_DIR': self.ROOT_DIR,
+            'run_source_dir': self.run_source_dir,
+            'src_params_dir': self.src_params_dir,
+            'run_dir': self.run_dir,
+            'result_dir': self.result_dir,
+            'config_dir': self.config_dir,
+            'src_run_dir': self.src_run_dir,
+            'set_params': self.set_params,
+            'stage_mode': self.stage_mode,
+            'stage_policy': self.stage_policy,
+            'nc_method': self.nc_method,
+            'nc_verify': self.nc_verify,
+            'result_format': self.result_format,
+
+            'pbs_id': self.pbs_id,
+            'pbs_exit_code': self.job_status,
+        }
+
+    def record_state(self, phase:str=None, status:str=None, **fields):
+        """
+        Record the phase and status of the job in the state store, if one is configured.
+        """
+        if phase is not None:
+            self.phase = phase
+        if self.state_store is None:
+            return
+        try:
+            self.state_store.record(self, phase=self.phase, status=status, **fields)
+        except Exception as e:
+            logger.error(f"Error recording job {self.job_id} in the state store: {e}")
+
+    def record_timing(self, phase:str, start:float, end:float=None, **counters):
+        """
+        Record the wall-clock start, end and duration of a phase in timings and in the metrics, if configured.
+        counters are e.g. the bytes copied or the files written by the phase.
+        """
+        end = time.time() if end is None else end
+        self.timings[phase] = dict(start=start, end=end, duration=end - start, **counters)
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.observe(phase, start, end - start, job_id=self.job_id, event_no=self.event_no, **counters)
+        except Exception as e:
+            logger.error(f"Error recording the metrics of job {self.job_id}: {e}")
+
+    def restore_state(self, job:dict):
+        """
+        Restore the runtime state of the job from its row in a StateStore, see StateStore.get.
+        A job counts as staged only if it was recorded as staged and its job directory still exists.
+        """
+        self.pbs_id = job['pbs_id']
+        self.group_id = job['group_id']
+        self.job_dir = job['job_dir']
+        self.job_status = job['job_status']
+        self.result_path = job['result_path']
+        self.phase = job['phase'] or 'created'
+        self.timings = job['timings'] or {}
+        self.staged = job['status'] == 'staged' and self.job_dir is not None and os.path.isdir(self.job_dir)
+
     def save_config(self, namemark=''):
         """
+        Save the job state, namemark is the phase a job failed in, e.g. 'copy_folder' or 'inital_params'.
+        The state is recorded in the state store and, with yaml_configs, written to
+        <config_dir>/<job_id>_<event_no><namemark>_config.yaml
         """
+        self.record_state(phase=namemark or None, status='failed' if namemark else None)
+        if not self.yaml_configs:
+            return
+
         if not os.path.exists(self.config_dir):
-            os.makedirs(self.config_dir)
+            os.makedirs(self.config_dir, exist_ok=True)
 
         config_name = self.job_id  + '_' + self.event_no + namemark + '_config.yaml'
         config_file = os.path.join(self.config_dir, config_name)
 
         with open(config_file, 'w', encoding='utf-8') as file:
-            # Create a dictionary with all relevant model parameters
-            config_data = {
-                
-                'job_id': self.job_id,
-                'period': self.period,
-                'event_no': self.event_no,
-                'basin': self.basin,
-                
-                'ROOT_DIR': self.ROOT_DIR,
-                'run_source_dir': self.run_source_dir,
-                'src_params_dir': self.src_params_dir,
-                'run_dir': self.run_dir,
-                'result_dir': self.result_dir,
-                'config_dir': self.config_dir,
-                'src_run_dir': self.src_run_dir,
-                'set_params': self.set_params,
-
-                'pbs_id': self.pbs_id,
-                'pbs_exit_code': self.job_status,
-                'config_yaml': config_file
-            }
-            
+            config_data = self.config_dict()
+            config_data['config_yaml'] = config_file
+
             # Dump the config data to YAML file
             yaml.dump(config_data, file, default_flow_style=False)
             logger.info(f"Job {self.job_id} configuration saved to {config_file}")
             
     def copy_folder(self):
         """
+        Stage src_run_dir into a new job directory according to stage_mode.
+        With 'hardlink' or 'symlink' the parameter files are not staged, inital_params writes them.
         """
         if not os.path.exists(self.src_run_dir):
             logger.error(f"src_run_dir {self.src_run_dir} does not exist.")
             self.save_config(namemark='copy_folder')
             raise FileNotFoundError(f"src_run_dir {self.src_run_dir} does not exist.")
         
+        start = time.time()
+        # the job directory is claimed by creating it, so that jobs staged concurrently never share one
         i = 0
         job_dir = os.path.join(self.run_dir, self.job_id)
-        while os.path.exists(job_dir):
-            logger.warning(f"desrin_dir {job_dir} already exists. Choose a new directory.")
+        while True:
+            try:
+                os.makedirs(job_dir)
+                break
+            except FileExistsError:
+                logger.warning(f"desrin_dir {job_dir} already exists. Choose a new directory.")
             i += 1
             job_dir = os.path.join(self.run_dir, self.job_id) + f"_{i}"
             if i > 5:
                 logger.error(f"Failed to create a new job directory after 5 attempts.")
                 self.save_config(namemark='copy_folder')
                 raise RuntimeError(f"Failed to create a new job directory after 5 attempts.")
-            
-        os.makedirs(job_dir)
+
         self.job_dir = job_dir
-        logger.info(f"Copying {self.src_run_dir} to {self.job_dir} ...")
+        logger.info(f"Copying {self.src_run_dir} to {self.job_dir} with stage mode {self.stage_mode} ...")
 
         try:
-            shutil.copytree(self.src_run_dir, self.job_dir, dirs_exist_ok=True)
+            counts = stage_tree(self.src_run_dir, self.job_dir, mode=self.stage_mode, policy=self.stage_policy)
             logger.info(f"Copied {self.src_run_dir} to {self.job_dir}")
+            self.record_timing('copy_folder', start, bytes=counts['bytes'], files=counts['copy'] + counts['link'])
         except Exception as e:
             logger.error(f"Error copying folder: {e}")
             self.save_config(namemark='copy_folder')
             raise RuntimeError(f"Error copying folder: {e}")
 
-    def inital_params(self, new_params=None):
-        """
-        NOTE : nc_files = ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0']
+    def parse_params(self):
         """
-        if new_params is not None:
-            self.set_params.update(new_params)
-            logger.info(f"Model parameters updated: {self.set_params}")
+        Split set_params into the netCDF parameters for nc_params and the CHANPARM.TBL parameters for chan_param.
 
-        if self.job_dir is None:
-            logger.error("Job directory not set. Please run copy_folder() first.")
-            self.save_config(namemark='inital_params')
-            raise RuntimeError("Job directory not set. Please run copy_folder() first.")
-        
-         # set params
+        Returns
+        ----------
+        set_nc_param : list
+            Format --> [{'name': [str], 'file': [str], 'value': float, 'adjust': str}]
+        set_chan_param : dict
+            Format --> {'MannN': float}
+        """
         set_nc_param = []
         set_chan_param = {}
         for key, value in self.set_params.items():
@@ -243,7 +373,25 @@ class ModelRunner:
                     self.save_config(namemark='inital_params')
                     raise TypeError(f"Parameter {key} has inconsistent types for name and file.")
                 set_nc_param.append(pam)
+        return set_nc_param, set_chan_param
+
+    def inital_params(self, new_params=None, nc_done=False):
+        """
+        NOTE : nc_files = ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0']
+        With nc_done=True the netCDF files are expected to be written already, e.g. by nc_params_batch.
+        """
+        start = time.time()
+        if new_params is not None:
+            self.set_params.update(new_params)
+            logger.info(f"Model parameters updated: {self.set_params}")
+
+        if self.job_dir is None:
+            logger.error("Job directory not set. Please run copy_folder() first.")
+            self.save_config(namemark='inital_params')
+            raise RuntimeError("Job directory not set. Please run copy_folder() first.")
         
+        set_nc_param, set_chan_param = self.parse_params()
+
         # adjust the params
         # src_params_files = os.path.join(self.run_source_dir, 'params_files')
         if not os.path.exists(self.src_params_dir):
@@ -251,7 +399,10 @@ class ModelRunner:
             self.save_config(namemark='inital_params')
             raise FileNotFoundError(f"Source parameters directory {self.src_params_dir} does not exist.")
         
-        if len(set_nc_param) == 0:
+        if nc_done:
+            ec_nc = 1
+            logger.info(f'nc_params already written, exit code : {ec_nc}')
+        elif len(set_nc_param) == 0:
             logger.warning("No nc parameters to set. Run as default param.")
             # Copy the default parameter files
             nc_files = ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0']
@@ -259,7 +410,7 @@ class ModelRunner:
                 nc_src_file = os.path.join(self.src_params_dir, nc_file)
                 nc_dest_file = os.path.join(self.job_dir, 'DOMAIN', nc_file[:-1])
                 if os.path.exists(nc_src_file):
-                    shutil.copy(nc_src_file, nc_dest_file)
+                    place_file(nc_src_file, nc_dest_file, mode=self.stage_mode)
                     logger.info(f"Copied {nc_src_file} to {nc_dest_file} as default param.")
                     ec_nc = 1
                     logger.info(f'inital nc_params with exit code : {ec_nc}')
@@ -268,7 +419,10 @@ class ModelRunner:
                     self.save_config(namemark='inital_params')
                     raise FileNotFoundError(f"Source file {nc_src_file} does not exist.")
         else:
-            ec_nc = nc_params(set_nc_param, self.src_params_dir, os.path.join(self.job_dir, 'DOMAIN'))
+            # the netCDF stack is only loaded when parameter files are generated
+            from .adjust_params import nc_params
+            ec_nc = nc_params(set_nc_param, self.src_params_dir, os.path.join(self.job_dir, 'DOMAIN'),
+                              method=self.nc_method, verify=self.nc_verify, link_mode=self.stage_mode)
             logger.info(f'inital nc_params with exit code : {ec_nc}')
 
         # Copy the CHANPARM.TBL file
@@ -277,7 +431,7 @@ class ModelRunner:
             chan_src_file = os.path.join(self.src_params_dir, 'CHANPARM.TBL.temp')
             chan_dest_file = os.path.join(self.job_dir, 'CHANPARM.TBL')
             if os.path.exists(chan_src_file):
-                shutil.copy(chan_src_file, chan_dest_file)
+                place_file(chan_src_file, chan_dest_file, mode=self.stage_mode)
                 logger.info(f"Copied {chan_src_file} to {chan_dest_file} as default param.")
                 ec_chan = 1
                 logger.info(f'inital chan_params with exit code : {ec_chan}')
@@ -286,12 +440,14 @@ class ModelRunner:
                 self.save_config(namemark='inital_params')
                 raise FileNotFoundError(f"Source file {chan_src_file} does not exist.")
         else:
+            from .adjust_params import chan_param
             ec_chan = chan_param(set_chan_param, self.src_params_dir, self.job_dir)
             logger.info(f'inital chan_params with exit code : {ec_chan}')
         
         # Check if parameters were initialized successfully
         if ec_nc == 1 and ec_chan == 1:
             logger.info("All parameters initialized successfully.")
+            self.record_timing('inital_params', start)
         else:
             logger.error("Error initializing parameters. with  ec_nc: {ec_nc} and ec_nc: {ec_chan}")
             self.save_config(namemark='inital_params')
@@ -299,31 +455,26 @@ class ModelRunner:
         
     def submit_pbs_job(self):
         """
+        Submit the job script from the job directory with the execution backend, qsub by default, see backends.
+        pbs_id is the job ID returned by the backend.
         """
-        os.chdir(self.job_dir)
-        logger.info(f"Changed working directory to {self.job_dir}")
         pbs_script = os.path.join(self.job_dir, self.pbs_script)
-        logger.info(f"Submitting PBS job with script: {pbs_script}")
-        
+        logger.info(f"Submitting {self.backend.name} job with script: {pbs_script}")
+
         try:
-            result = subprocess.run(['qsub', pbs_script], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if result.returncode == 0:
-                self.pbs_id = result.stdout.strip()
-                logger.info(f"PBS job submitted successfully. Job ID: {self.job_id}. PBS ID: {self.pbs_id}")
-            else:
-                logger.error(f"Error submitting PBS job: {result.stderr.strip()}")
-                self.save_config(namemark='submit_pbs_job')
-                raise RuntimeError(f"Error submitting PBS job: {result.stderr.strip()}")
+            start = time.time()
+            self.pbs_id = self.backend.submit(pbs_script, cwd=self.job_dir)
+            self.record_timing('submit', start)
+            logger.info(f"Job submitted successfully. Job ID: {self.job_id}. {self.backend.name} ID: {self.pbs_id}")
+            self.record_state(phase='submit_pbs_job', status='submitted')
         except Exception as e:
-            logger.error(f"Exception occurred while submitting PBS job: {e}")
+            logger.error(f"Exception occurred while submitting job: {e}")
             self.save_config(namemark='submit_pbs_job')
-            raise RuntimeError(f"Exception occurred while submitting PBS job: {e}")
-        finally:
-            os.chdir(self.ROOT_DIR)
-            logger.info(f"Changed back to ROOT_DIR: {self.ROOT_DIR}")
+            raise RuntimeError(f"Exception occurred while submitting job: {e}")
 
     def check_pbs_job_status(self):
         """
+        Query the status of this job alone with the execution backend, see update_pbs_job_status for batched queries.
         """
         if self.pbs_id is None:
             logger.error("PBS job ID is not set. Please submit a job first.")
@@ -331,24 +482,100 @@ class ModelRunner:
             return
 
         try:
-            result = subprocess.run(['qstat', self.pbs_id], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if result.returncode == 0:
-                output_lines = result.stdout.strip().split('\n')
-                job_info = output_lines[2]
-                status = job_info.split()[4]
-                self.job_status = status
-                logger.info(f"PBS job {self.pbs_id} status: {self.job_status}")
-            else:
-                self.job_status = "ERROR"
-                logger.error(f"Error checking PBS job status: {result.stderr.strip()}")
+            status_map = self.backend.status([self.pbs_id])
         except Exception as e:
             self.job_status = "ERROR"
             logger.error(f"Exception occurred while checking PBS job status: {e}")
             self.save_config(namemark='check_pbs_job_status')
             raise RuntimeError(f"Exception occurred while checking PBS job status: {e}")
+        self.update_pbs_job_status(status_map)
+        logger.info(f"PBS job {self.pbs_id} status: {self.job_status}")
+
+    def cancel_job(self):
+        """
+        Cancel the queued or running job with the execution backend.
+        """
+        if self.pbs_id is None:
+            logger.warning(f"Job {self.job_id} has not been submitted. Nothing to cancel.")
+            return
+        self.backend.cancel([self.pbs_id])
+        logger.info(f"Job {self.job_id} ({self.pbs_id}) cancelled.")
+
+    def update_pbs_job_status(self, status_map:dict):
+        """
+        Update job_status from a status map produced by query_pbs_status or the status of a backend.
+        A single job missing from the map has left the queue and its backend has no exit status of it,
+        it is resolved by resolve_missing. Only pass the map of a successful query.
+        """
+        if self.pbs_id is None:
+            logger.error("PBS job ID is not set. Please submit a job first.")
+            self.job_status = "NOT_SUBMITTED"
+            return
+        if self.pbs_id in status_map and status_map[self.pbs_id] is None:
+            logger.warning(f"PBS job {self.pbs_id} reported in an unknown state, status {self.job_status} kept.")
+            return
+        state = status_map.get(self.pbs_id)
+        if self.group_id is not None:
+            # member of a job array or bundle, the wrapper script records the member's exit status,
+            # so a member is finished as soon as it is written, even while the rest of a bundle runs
+            exit_status = self.read_exit_status()
+            if exit_status is not None:
+                state = "C" if exit_status == 0 else "E"
+            elif state is None or state in ('C', 'F', 'X'):
+                logger.error(f"Job {self.job_id} left PBS group {self.group_id} without exit status.")
+                state = "E"
+            elif state == 'E':
+                # Torque: the group is exiting, wait for the exit status
+                state = "R"
+        if state is None:
+            state = self.resolve_missing()
+        self.job_status = state
+        self.observe_run(state)
+        if state in ('C', 'E'):
+            self.phase = 'run'
+        logger.debug(f"PBS job {self.pbs_id} status: {self.job_status}")
+
+    def resolve_missing(self):
+        """
+        Return the state of a job no longer reported by its backend from its recorded exit status, 'E' without one.
+        frxst_pts_out.txt is written while the model runs, so its presence says nothing about success.
+        """
+        exit_status = self.read_exit_status()
+        if exit_status is not None:
+            return "C" if exit_status == 0 else "E"
+        logger.error(f"PBS job {self.pbs_id} of job {self.job_id} left the queue without exit status, marked as failed.")
+        return "E"
 
-    def collect_frxst(self, result_dir=None, namemark=''):
+    def observe_run(self, state:str):
         """
+        Record the queue wait when the job is first seen running and the run time when it is first seen finished,
+        at the resolution of the polling interval. A job never seen running counts its queue wait as run time.
+        """
+        submitted = self.timings.get('submit', {}).get('end')
+        if submitted is None:
+            return
+        if state == 'R' and 'queue' not in self.timings:
+            self.record_timing('queue', submitted)
+        elif state in ('C', 'E') and 'run' not in self.timings:
+            self.record_timing('run', self.timings.get('queue', {}).get('end', submitted))
+
+    def read_exit_status(self):
+        """
+        Return the exit status written by a job array or bundle wrapper script, None if not written yet.
+        """
+        if self.job_dir is None:
+            return None
+        exit_path = os.path.join(self.job_dir, self.exit_file)
+        try:
+            with open(exit_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def collect_frxst(self, result_dir=None, namemark='', result_file=None):
+        """
+        Collect frxst_pts_out.txt according to result_format, outputs of failed jobs (namemark) are always copied.
+        result_file defaults to the frxst_pts_out.txt of the job directory, completed results are added to the result cache.
         """
         if self.job_id is None:
             logger.error("Job ID is not set. Please submit a job first.")
@@ -360,55 +587,111 @@ class ModelRunner:
             self.result_dir = result_dir
         if not os.path.exists(self.result_dir):
             os.makedirs(self.result_dir)
-        logger.info(f"Collecting results from {self.job_dir} to {self.result_dir} ...")
-        result_file = os.path.join(self.job_dir, self.wrfhydrofrxst)
+        memoized = result_file is not None
+        if result_file is None:
+            result_file = os.path.join(self.job_dir, self.wrfhydrofrxst)
+        logger.info(f"Collecting results from {result_file} to {self.result_dir} ...")
+        start = time.time()
         if not os.path.exists(result_file):
             logger.error(f"Result file {result_file} does not exist.")
             return
         try:
-            shutil.copy(result_file, os.path.join(self.result_dir, self.job_id + '_' +self.event_no + namemark + '.txt'))
-            logger.info(f"Result file {result_file} copied to {self.result_dir}")
+            if namemark == '' and self.result_format in ('cube', 'both'):
+                from .results import read_frxst, append_cube
+                result_path = os.path.join(self.result_dir, self.event_no + '_frxst.nc')
+                times, gauges, q = read_frxst(result_file)
+                append_cube(result_path, self.job_id, times, gauges, q, set_params=self.set_params,
+                            attrs={'event_no': self.event_no, 'basin': self.basin})
+                self.result_path = result_path
+            if namemark != '' or self.result_format in ('txt', 'both'):
+                result_path = os.path.join(self.result_dir, self.job_id + '_' +self.event_no + namemark + '.txt')
+                shutil.copy(result_file, result_path)
+                self.result_path = result_path
+                logger.info(f"Result file {result_file} copied to {self.result_dir}")
+            if namemark == '' and self.job_status == 'C' and not memoized and self.result_cache is not None:
+                self.result_cache.put(self.get_memo_key(), result_file, self.job_id)
+            self.record_timing('memo' if memoized else 'collect_frxst', start, bytes=os.path.getsize(result_file), files=1)
         except Exception as e:
             logger.error(f"Error copying result file: {e}")
             self.save_config(namemark='collect_frxst')
             raise RuntimeError(f"Error copying result file: {e}")
 
-    def run(self):
+    def get_memo_key(self):
         """
+        Return the content key of the job in the result cache, computed once, None without a result cache.
         """
+        if self.result_cache is not None and self.memo_key is None:
+            self.memo_key = self.result_cache.key(self)
+        return self.memo_key
+
+    def collect_memoized(self):
+        """
+        Collect the cached result of an identical member instead of running the job.
+
+        Returns
+        ----------
+        hit : bool
+            True if a cached result was found and collected.
+        """
+        if self.result_cache is None:
+            return False
+        cached = self.result_cache.get(self.get_memo_key())
+        if cached is None:
+            return False
+        logger.info(f"Job {self.job_id} found in the result cache, skipping the run.")
+        self.job_status = 'C'
+        self.phase = 'memo'
+        self.collect_frxst(self.result_dir, result_file=cached)
+        self.save_config()
+        return True
+
+    def stage(self):
+        """
+        Prepare the job directory and the parameter files, everything before the submission.
+        """
+        start = time.time()
         self.copy_folder()
         self.inital_params()
+        self.staged = True
+        self.record_timing('stage', start)
+        self.record_state(phase='inital_params', status='staged')
+
+    def run(self):
+        """
+        """
+        if not self.staged:
+            self.stage()
         self.submit_pbs_job()
 
-    def cleanup(self):
-            """
-            """
-            if self.job_dir is not None:
-                try:
-                    pattern_LDASOUT = r"\d{4}\d{2}\d{2}\d{4}\.LDASOUT_DOMAIN3"  # 匹配 'YYYYMMDDHHMM.LDASOUT_DOMAIN3'
-                    pattern_diag_hydro = r"diag_hydro\.\d{5}"  # 'diag_hydro.00001'
-                    pattern_HYDRO_RST = r"HYDRO_RST\.\d{4}-\d{2}-\d{2}_\d{2}:\d{2}_DOMAIN3"  #'HYDRO_RST.2012-07-11_00:00_DOMAIN3'
-                    pattern_RESTART = r"RESTART\.\d{8}\d{2}_DOMAIN3"  # 'RESTART.2012071700_DOMAIN3'
-
-                    file_pattern = re.compile(
-                        f"^({pattern_LDASOUT}|{pattern_diag_hydro}|{pattern_HYDRO_RST}|{pattern_RESTART})$"
-                    )
-                    for filename in os.listdir(self.job_dir):
-                        file_path = os.path.join(self.job_dir, filename)
-                        
-                        if os.path.isfile(file_path) and file_pattern.match(filename):
-                            os.remove(file_path)
-                            logger.info(f"Removed file: {filename}")
-                    if not os.listdir(self.job_dir):
-                        shutil.rmtree(self.job_dir)
-                        logger.info(f"Removed job directory: {self.job_dir}")
+    def cleanup(self, keep_restarts:int=0, keep_times:list=None, archived:list=None):
+        """
+        Remove the LDASOUT, diag_hydro, HYDRO_RST and RESTART outputs from the job directory,
+        and the job directory itself if nothing is left, see cleanup.prune_outputs.
 
-                except Exception as e:
-                    logger.error(f"Error during cleaning: {e}")
-                    self.save_config(namemark='clean')
-                    raise RuntimeError(f"Error during cleaning: {e}")
-            else:
-                logger.warning("Job directory is not set. Nothing to clean.")
+        Parameters
+        ----------
+        keep_restarts : int, optional, default=0
+            Number of the latest HYDRO_RST and RESTART files kept.
+        keep_times : list, optional
+            Timestamps whose outputs are kept, e.g. ['2019-08-01 00:00'].
+        archived : list, optional
+            Outputs archived by archive.archive_outputs, removed as well.
+        """
+        if self.job_dir is None:
+            logger.warning("Job directory is not set. Nothing to clean.")
+            return
+        if not os.path.isdir(self.job_dir):
+            logger.warning(f"Job directory {self.job_dir} does not exist. Nothing to clean.")
+            return
+        try:
+            start = time.time()
+            removed = prune_outputs(self.job_dir, keep_restarts=keep_restarts, keep_times=keep_times, archived=archived)
+            self.record_timing('cleanup', start, files=removed)
+            self.record_state()
+        except Exception as e:
+            logger.error(f"Error during cleaning: {e}")
+            self.save_config(namemark='clean')
+            raise RuntimeError(f"Error during cleaning: {e}")
 
 if __name__ == "__main__":
     sim_info = {
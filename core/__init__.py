@@ -7,16 +7,82 @@
 @Contact :   shihx2003@outlook.com
 '''
 
-from .adjust_params import chan_param, nc_params
-from .read_params import read_params
-from .WRFHydroJob import SimulationInfo, ModelRunner
-from .RunningJobs import batch_instantiate, schedule_and_track_jobs
+import importlib
+
+# Exported names per submodule, imported on first access (PEP 562) so that e.g. reading the state store
+# does not load numpy, xarray and netCDF4.
+_EXPORTS = {
+    'adjust_params': ['chan_param', 'nc_params', 'nc_params_batch'],
+    'read_params': ['read_params'],
+    'WRFHydroJob': ['SimulationInfo', 'ModelRunner'],
+    'staging': ['StagingPool'],
+    'state_store': ['StateStore'],
+    'memo': ['ResultCache'],
+    'cleanup': ['CleanupPool', 'prune_outputs'],
+    'archive': ['ArchivePool', 'archive_outputs'],
+    'backends': ['PBSBackend', 'SlurmBackend', 'LocalBackend', 'make_backend'],
+    'metrics': ['Metrics', 'summarize', 'format_summary', 'load_metrics'],
+    'results': ['read_frxst', 'append_cube', 'load_cube'],
+    'scoring': ['score', 'rank'],
+    'calibration': ['Calibration', 'DDS', 'SCEUA', 'make_objective'],
+    'design': ['latin_hypercube', 'saltelli', 'morris', 'to_jobs', 'sobol_indices', 'morris_indices'],
+    'RunningJobs': ['batch_instantiate', 'batch_stage', 'schedule_and_track_jobs', 'JobScheduler',
+                    'resume_jobs', 'resume_and_track_jobs'],
+}
+
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 __all__ = ['chan_param', 
            'nc_params', 
+           'nc_params_batch',
            'read_params', 
            'SimulationInfo', 
            'ModelRunner',
+           'StagingPool',
+           'StateStore',
+           'ResultCache',
+           'CleanupPool',
+           'prune_outputs',
+           'ArchivePool',
+           'archive_outputs',
+           'PBSBackend',
+           'SlurmBackend',
+           'LocalBackend',
+           'make_backend',
+           'Metrics',
+           'summarize',
+           'format_summary',
+           'load_metrics',
+           'read_frxst',
+           'append_cube',
+           'load_cube',
+           'score',
+           'rank',
+           'Calibration',
+           'DDS',
+           'SCEUA',
+           'make_objective',
+           'latin_hypercube',
+           'saltelli',
+           'morris',
+           'to_jobs',
+           'sobol_indices',
+           'morris_indices',
            'batch_instantiate', 
+           'batch_stage',
            'schedule_and_track_jobs',
+           'JobScheduler',
+           'resume_jobs',
+           'resume_and_track_jobs',
            ]
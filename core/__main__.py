@@ -0,0 +1,14 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   __main__.py
+@Create  :   2025-05-12 10:21:40
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import sys
+from .cli import main
+
+sys.exit(main())
@@ -9,9 +9,29 @@
 
 # here put the import lib
 import os
+import shutil
 import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import xarray as xr
+from .nc_cache import BASE_CACHE, NC_FILE_LOCK
+from .staging import place_file
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# netCDF-C and HDF5 are not thread-safe, direct netCDF4 calls share the lock xarray uses for the same libraries
+try:
+    from xarray.backends.locks import HDF5_LOCK, NETCDFC_LOCK, combine_locks
+    NC_LOCK = combine_locks([NETCDFC_LOCK, HDF5_LOCK])
+except ImportError:
+    NC_LOCK = threading.Lock()
+
+NC_FILES = ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0']
 
 
 logger = logging.getLogger(__name__)
@@ -30,9 +50,10 @@ logger = logging.getLogger(__name__)
 #################
 
 
-def is_within_precision(o_max, a_max, o_min, a_min, param_value, method="scale"):
+def is_within_precision(o_max, a_max, o_min, a_min, param_value, method="scale", dtype=None):
     '''
     Check if the adjusted parameter is within the precision of the original parameter
+    dtype is the dtype the variable is stored as, scaled integers are within half a unit, see scale_array.
     '''
     logger.info(f"Checking if the adjusted parameter is within the precision of the original parameter")
     logger.info(f"Parameter value: {param_value}, method: {method}")
@@ -41,6 +62,8 @@ def is_within_precision(o_max, a_max, o_min, a_min, param_value, method="scale")
     
     ABS_PRECISION = 1e-6
     REL_PRECISION = 1e-6
+    if method == "scale" and dtype is not None and np.issubdtype(np.dtype(dtype), np.integer):
+        ABS_PRECISION = 0.5
 
     if method == "scale":
         ref_max = o_max * param_value
@@ -61,10 +84,41 @@ def is_within_precision(o_max, a_max, o_min, a_min, param_value, method="scale")
     return cond_max and cond_min
 
 
+def nanminmax(data, block_size=1 << 20):
+    '''
+    Compute the minimum and maximum of an array ignoring NaN in one blockwise pass
+    Each block is reduced twice while it is still in the CPU cache, instead of two full passes over the array.
+    Returns (nan, nan) if all values are NaN.
+    '''
+    flat = np.ravel(data)
+    v_min = v_max = np.nan
+    for i in range(0, flat.size, block_size):
+        block = flat[i:i + block_size]
+        v_min = np.fmin(v_min, np.fmin.reduce(block))
+        v_max = np.fmax(v_max, np.fmax.reduce(block))
+    return float(v_min), float(v_max)
+
+
+def scale_array(data, value, dtype=None):
+    '''
+    Scale in float64 and round once to the dtype of the array, so that the xarray, patch and batch paths
+    write bit-identical values. value may be an array broadcasting against data.
+    dtype is the dtype the variable is stored as, e.g. int16 for a decoded float32 array, defaults to data.dtype.
+    Values stored as integers are rounded half to even, like the xarray encoder, never truncated.
+    '''
+    new = np.multiply(data, value, dtype=np.float64)
+    if np.issubdtype(np.dtype(dtype or data.dtype), np.integer):
+        new = np.rint(new)
+    if np.issubdtype(data.dtype, np.floating) or np.issubdtype(data.dtype, np.integer):
+        new = new.astype(data.dtype)
+    return new
+
+
 def adjust_value(info, ds):
     '''
     Adjust the parameter in the dataset based on the information in the dictionary
     Decide how to adjust the parameters.
+    Only the adjusted variable gets a new buffer, all other variables are shared with the input dataset.
     
     Parameters: 
     ----------
@@ -74,7 +128,7 @@ def adjust_value(info, ds):
             e.g. {'name': 'slope', 'value': 0.5, 'adjust': 'replace'}
         
     ds: xarray.Dataset
-        The dataset containing the parameter to adjust
+        The dataset containing the parameter to adjust, it is not modified
     
     Returns:
     ----------
@@ -83,67 +137,46 @@ def adjust_value(info, ds):
     '''
 
     exit_code = None
-    ds = ds.copy(deep=True)
+    ds = ds.copy(deep=False)
     param_name = info['name']
     param_value = info['value']
     param_adjust = info['adjust']
 
-    o_max = ds[param_name].max().item()
-    o_min = ds[param_name].min().item()
+    data = ds[param_name].values
+    o_min, o_max = nanminmax(data)
 
     logger.info(f"Adjusting parameter {param_name} with value {param_value} and adjust method {param_adjust}")
     logger.info(f"Parameter {param_name} has a maximum value of {o_max} and a minimum value of {o_min}")
     logger.info(f"Starting parameter adjustment")
 
     if param_adjust == 'replace':
-        ds[param_name].values[:] = param_value
-        
-        # fix bug: if the parameter is negative, the max and min values are swapped
-        if param_value >= 0:
-            a_max = ds[param_name].max().item()
-            a_min = ds[param_name].min().item()
-        else:
-            a_max = ds[param_name].min().item()
-            a_min = ds[param_name].max().item()
-
-        if is_within_precision(o_max, a_max, o_min, a_min, param_value, method=param_adjust):
-            logger.info(f"New max value is {a_max} and new min value is {a_min}")
-            logger.info(f"Parameter {param_name} adjusted successfully to {param_value}")
-            exit_code = 1
-            return ds, exit_code
-        else:
-            exit_code = 0
-            logger.error(f"Parameter {param_name} adjustment failed, current max value is {a_max} and min value is {a_min}.")
-            logger.error(f"Exiting process [adjust_value]")
-            return None, exit_code
-    
+        new = np.full(data.shape, param_value, dtype=data.dtype)
     elif param_adjust == 'scale':
-        ds[param_name] = ds[param_name] * param_value
-
-        # fix bug: if the parameter is negative, the max and min values are swapped
-        if param_value >= 0:
-            a_max = ds[param_name].max().item()
-            a_min = ds[param_name].min().item()
-        else:
-            a_max = ds[param_name].min().item()
-            a_min = ds[param_name].max().item()
-
-        if is_within_precision(o_max, a_max, o_min, a_min, param_value, method=param_adjust):
-            logger.info(f"New max value is {a_max} and new min value is {a_min}")
-            logger.info(f"Parameter {param_name} adjusted successfully to {param_value}")
-            exit_code = 1
-            return ds, exit_code
-        else:
-            exit_code = 0
-            logger.error(f"Parameter {param_name} adjustment failed, current max value is {a_max} and min value is {a_min}.")
-            logger.error(f"Exiting process [adjust_value]")
-            return None, exit_code
+        new = scale_array(data, param_value, dtype=ds[param_name].encoding.get('dtype'))
     else:
         exit_code = 0
         logger.error(f"Adjustment method {param_adjust} not recognized.")
         logger.error(f"Exiting process [adjust_value]")
         return None, exit_code
 
+    # fix bug: if the parameter is negative, the max and min values are swapped
+    a_min, a_max = nanminmax(new)
+    if param_value < 0:
+        a_min, a_max = a_max, a_min
+
+    if is_within_precision(o_max, a_max, o_min, a_min, param_value, method=param_adjust,
+                           dtype=ds[param_name].encoding.get('dtype', data.dtype)):
+        ds[param_name] = ds[param_name].copy(deep=False, data=new)
+        logger.info(f"New max value is {a_max} and new min value is {a_min}")
+        logger.info(f"Parameter {param_name} adjusted successfully to {param_value}")
+        exit_code = 1
+        return ds, exit_code
+    else:
+        exit_code = 0
+        logger.error(f"Parameter {param_name} adjustment failed, current max value is {a_max} and min value is {a_min}.")
+        logger.error(f"Exiting process [adjust_value]")
+        return None, exit_code
+
 
 def select_nc(paraminfo, dsdict):
     '''
@@ -158,12 +191,11 @@ def select_nc(paraminfo, dsdict):
             e.g. {'name': ['smcmax', 'SMCMAX1'], 'value': 0.5, 'file': ['soil_properties.nc', 'hydro2dtbl.nc'], 'adjust': 'scale'}
     
     dsdict: dict
-        A dictionary containing the xarray dataset to adjust
+        A dictionary containing the xarray dataset to adjust, the adjusted datasets are replaced in place
 
     '''
 
     exit_code = None
-    dsdict = dsdict.copy()
     names = paraminfo['name']
     files = paraminfo['file']
     value = paraminfo['value']
@@ -198,17 +230,30 @@ def select_nc(paraminfo, dsdict):
     return dsdict, exit_code
 
 
-def read_nc(dir):
+def read_nc(dir, cache=None, files=None):
     '''
     Read the netCDF file
     Read the netCDF file and return the dataset
+
+    Parameters:
+    ----------
+    dir: str
+        The directory containing the .nc0 base files
+    cache: DatasetCache, optional
+        Cache of the decoded base files, the files are opened directly if None
+    files: list, optional
+        Names of the files to read, e.g. ['soil_properties.nc'], defaults to all NC_FILES
     '''
-    nc_files = ['Fulldom_hires.nc0', 'hydro2dtbl.nc0', 'soil_properties.nc0', 'GWBUCKPARM.nc0']
-    
     dsdict = {}
-    for file in nc_files:
+    for file in NC_FILES:
+        if files is not None and file[:-1] not in files:
+            continue
         try:
-            ds = xr.open_dataset(os.path.join(dir, file))
+            if cache is not None:
+                ds = cache.get(os.path.join(dir, file))
+            else:
+                with NC_FILE_LOCK:
+                    ds = xr.open_dataset(os.path.join(dir, file))
             logger.info(f"File {file[:-1]} read successfully.")
             dsdict[file[:-1]] = ds
         except Exception as e:
@@ -224,27 +269,188 @@ def read_nc(dir):
 def save_nc(dsdict, dir):
     '''
     Save the netCDF file
-    Save the dataset to the netCDF file
+    Save the dataset to the netCDF file, only the datasets in dsdict are written
     '''
+    exit_code = 1
+    if not os.path.exists(dir):
+        os.makedirs(dir)
+        logger.info(f"Created output directory {dir}")
     for file, ds in dsdict.items():
+        file_path = os.path.join(dir, file)
         try:
-            ds.to_netcdf(os.path.join(dir, file))
-            if not os.path.exists(dir):
-                os.makedirs(dir)
-                logger.info(f"Created output directory {dir}")
-            file_path = os.path.join(dir, file)
-            if os.path.exists(file_path):
-                logger.info(f"File {file} saved successfully.")
-            exit_code = 1
-            
-        except:
+            # remove first, the file may be a hardlink to a shared file
+            if os.path.lexists(file_path):
+                os.remove(file_path)
+            with NC_FILE_LOCK:
+                ds.to_netcdf(file_path)
+            logger.info(f"File {file} saved successfully.")
+        except Exception as e:
             exit_code = 0
-            logger.error(f"Failed to save file {file}.")
+            logger.error(f"Failed to save file {file}: {e}")
             logger.error(f"Exiting process [save_nc]")
+            return exit_code
 
     return exit_code
 
-def nc_params(params, indir, outdir):
+
+def place_nc(indir, outdir, files, link_mode='copy'):
+    '''
+    Place the unmodified base files into outdir by linking or copying them from indir
+
+    Parameters:
+    ----------
+    files: list
+        Names of the files to place, e.g. ['GWBUCKPARM.nc']
+    link_mode: str, optional
+        'copy', 'hardlink' or 'symlink', see staging.place_file
+
+    Returns:
+    ----------
+    exit_code: int
+        1: successful
+        0: failed
+    '''
+    for file in files:
+        src = os.path.join(indir, file + '0')
+        dst = os.path.join(outdir, file)
+        try:
+            action = place_file(src, dst, mode=link_mode)
+            logger.info(f"File {file} unmodified, {'linked' if action == 'link' else 'copied'} from {src}.")
+        except Exception as e:
+            logger.error(f"Failed to place file {file}: {e}")
+            logger.error(f"Exiting process [place_nc]")
+            return 0
+    return 1
+
+def patch_nc(src, dst, infos):
+    '''
+    Copy a netCDF file and rewrite only the adjusted variables in place
+    Encoding, fill values and attributes of the copied file are left untouched.
+
+    Parameters:
+    ----------
+    src: str
+        The source netCDF file, e.g. soil_properties.nc0
+    dst: str
+        The adjusted netCDF file, replaced if it exists
+    infos: list
+        A list of dictionaries of the single parameters to adjust in this file,
+            e.g. [{'name': 'slope', 'value': 0.5, 'adjust': 'replace'}]
+
+    Returns:
+    ----------
+    exit_code: int
+        1: successful
+        0: failed
+    '''
+    # remove first, dst may be a hardlink to a shared file
+    if os.path.lexists(dst):
+        os.remove(dst)
+    shutil.copyfile(src, dst)
+
+    with NC_FILE_LOCK, NC_LOCK, netCDF4.Dataset(dst, 'r+') as nc:
+        for info in infos:
+            param_name = info['name']
+            param_value = info['value']
+            param_adjust = info['adjust']
+            if param_name not in nc.variables:
+                logger.error(f"Variable {param_name} not found in {dst}.")
+                return 0
+
+            var = nc.variables[param_name]
+            data = np.ma.masked_invalid(var[:])
+            o_max = float(data.max())
+            o_min = float(data.min())
+            logger.info(f"Patching parameter {param_name} with value {param_value} and adjust method {param_adjust}")
+
+            if param_adjust == 'replace':
+                new = np.full(var.shape, param_value, dtype=data.dtype)
+            elif param_adjust == 'scale':
+                new = scale_array(data, param_value)
+            else:
+                logger.error(f"Adjustment method {param_adjust} not recognized.")
+                return 0
+
+            # if the parameter is negative, the max and min values are swapped
+            if param_value >= 0:
+                a_max, a_min = float(new.max()), float(new.min())
+            else:
+                a_max, a_min = float(new.min()), float(new.max())
+
+            if not is_within_precision(o_max, a_max, o_min, a_min, param_value, method=param_adjust, dtype=var.dtype):
+                logger.error(f"Parameter {param_name} adjustment failed, current max value is {a_max} and min value is {a_min}.")
+                return 0
+            var[:] = new
+            logger.info(f"Parameter {param_name} patched successfully to {param_value}")
+    return 1
+
+
+def patch_params(params, indir, outdir, link_mode='copy'):
+    '''
+    Adjust the parameters by patching copies of the netCDF files through the netCDF4 API
+    Same parameters and exit codes as nc_params.
+    '''
+    updates = {}
+    for param in params:
+        for name, file in zip(param['name'], param['file']):
+            updates.setdefault(file, []).append({'name': name, 'value': param['value'], 'adjust': param['adjust']})
+
+    unknown = set(updates) - set(file[:-1] for file in NC_FILES)
+    if unknown:
+        logger.error(f"Files {sorted(unknown)} not found in the dataset.")
+        logger.error(f"Exiting process [patch_params]")
+        return 0
+
+    for file, infos in updates.items():
+        try:
+            exit_code = patch_nc(os.path.join(indir, file + '0'), os.path.join(outdir, file), infos)
+        except Exception as e:
+            logger.error(f"Failed to patch file {file}: {e}")
+            exit_code = 0
+        if exit_code != 1:
+            logger.error(f"Exiting process [patch_params]")
+            return 0
+        logger.info(f"File {file} saved successfully.")
+
+    unmodified = [file[:-1] for file in NC_FILES if file[:-1] not in updates]
+    return place_nc(indir, outdir, unmodified, link_mode=link_mode)
+
+
+def verify_patch(params, indir, outdir, cache=BASE_CACHE):
+    '''
+    Compare the netCDF files written by the patch path in outdir against the xarray path
+    Values (NaN aware) and attributes of every variable have to match.
+
+    Returns:
+    ----------
+    exit_code: int
+        1: identical
+        0: different or failed
+    '''
+    ref_dir = tempfile.mkdtemp(prefix='verify_patch_')
+    try:
+        if nc_params(params, indir, ref_dir, cache=cache, method='xarray') != 1:
+            logger.error(f"Reference xarray path failed.")
+            return 0
+        exit_code = 1
+        for nc_file in NC_FILES:
+            with NC_FILE_LOCK, xr.open_dataset(os.path.join(ref_dir, nc_file[:-1])) as ref, \
+                 xr.open_dataset(os.path.join(outdir, nc_file[:-1])) as new:
+                for name, var in ref.variables.items():
+                    if name not in new.variables:
+                        logger.error(f"Variable {name} missing in patched file {nc_file[:-1]}.")
+                        exit_code = 0
+                    elif not var.equals(new.variables[name]) or var.attrs != new.variables[name].attrs:
+                        logger.error(f"Variable {name} of {nc_file[:-1]} differs between patch and xarray path.")
+                        exit_code = 0
+        if exit_code == 1:
+            logger.info(f"Patched files verified against the xarray path.")
+        return exit_code
+    finally:
+        shutil.rmtree(ref_dir, ignore_errors=True)
+
+
+def nc_params(params, indir, outdir, cache=BASE_CACHE, method='xarray', verify=False, link_mode='copy'):
     '''
     Adjust the parameters in the dictionary based on the values in the xarray dataset
     Decide how to adjust multiple parameters.
@@ -262,6 +468,21 @@ def nc_params(params, indir, outdir):
     outdir: str
         The directory to save the adjusted
 
+    cache: DatasetCache, optional
+        Cache of the decoded base files shared between calls, defaults to the process wide BASE_CACHE.
+        None reads the files from indir on every call.
+
+    method: str, optional
+        'xarray' decodes and re-encodes the whole files,
+        'patch' copies the files and rewrites only the adjusted variables through netCDF4.
+
+    verify: bool, optional
+        With method 'patch', compare the result against the 'xarray' path.
+
+    link_mode: str, optional
+        How the files not touched by any parameter are placed into outdir,
+        'copy', 'hardlink' or 'symlink'. Only the modified files are written.
+
     Returns:
     ----------
     exit_code: int
@@ -270,8 +491,22 @@ def nc_params(params, indir, outdir):
         0: failed
     '''
 
-    logger.info(f"Reading netCDF files.")
-    dsdict = read_nc(indir)
+    if method == 'patch':
+        if netCDF4 is not None:
+            exit_code = patch_params(params, indir, outdir, link_mode=link_mode)
+            if exit_code == 1 and verify:
+                exit_code = verify_patch(params, indir, outdir, cache=cache)
+            return exit_code
+        logger.warning(f"netCDF4 is not installed, falling back to the xarray path.")
+    elif method != 'xarray':
+        logger.error(f"Invalid method '{method}'. Use 'xarray' or 'patch'.")
+        return 0
+
+    modified = []
+    for param in params:
+        modified.extend(file for file in param['file'] if file not in modified)
+    logger.info(f"Reading netCDF files {modified}.")
+    dsdict = read_nc(indir, cache=cache, files=modified)
     if dsdict is None:
         return None
     for param in params:
@@ -287,6 +522,9 @@ def nc_params(params, indir, outdir):
 
     logger.info(f"Saving adjusted parameters to netCDF files.")
     exit_code = save_nc(dsdict, outdir)
+    if exit_code == 1:
+        unmodified = [file[:-1] for file in NC_FILES if file[:-1] not in dsdict]
+        exit_code = place_nc(indir, outdir, unmodified, link_mode=link_mode)
     if exit_code == 1:
         logger.info(f"netCDF files saved successfully.")
         logger.info(f"Exiting process [adjust_parms]")
@@ -296,6 +534,166 @@ def nc_params(params, indir, outdir):
         logger.error(f"Exiting process [adjust_parms]")
         return exit_code
 
+def merge_member_params(params):
+    '''
+    Collapse the parameters of one member into a single operation per (file, variable)
+    A replace followed by scales is a replace with the product, consecutive scales multiply.
+
+    Returns:
+    ----------
+    ops: dict
+        Format --> {(file, name): (adjust, value)}
+    '''
+    ops = {}
+    for param in params:
+        if param['adjust'] not in ('scale', 'replace'):
+            raise ValueError(f"Invalid method '{param['adjust']}'. Use 'scale' or 'replace'.")
+        for name, file in zip(param['name'], param['file']):
+            prev = ops.get((file, name))
+            if param['adjust'] == 'scale' and prev is not None:
+                ops[(file, name)] = (prev[0], prev[1] * param['value'])
+            else:
+                ops[(file, name)] = (param['adjust'], param['value'])
+    return ops
+
+
+def adjust_members(base, adjust, values, dtype=None):
+    '''
+    Adjust one base array for several members at once by broadcasting the values across a leading member axis
+
+    Returns:
+    ----------
+    stacked: numpy.ndarray
+        The adjusted arrays, shape (len(values),) + base.shape
+    ok: list
+        Whether each member passed the precision check
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    checks = values
+    shape = (len(values),) + (1,) * base.ndim
+    if adjust == 'scale':
+        stacked = scale_array(base[np.newaxis], values.reshape(shape), dtype=dtype)
+    else:
+        stacked = np.empty((len(values),) + base.shape, dtype=base.dtype)
+        stacked[...] = values.reshape(shape)
+
+    o_min, o_max = nanminmax(base)
+    flat = stacked.reshape(len(values), -1)
+    a_min = np.fmin.reduce(flat, axis=1)
+    a_max = np.fmax.reduce(flat, axis=1)
+    ok = []
+    for value, v_min, v_max in zip(checks, a_min, a_max):
+        if value < 0:
+            v_min, v_max = v_max, v_min
+        ok.append(is_within_precision(o_max, float(v_max), o_min, float(v_min), float(value), method=adjust,
+                                      dtype=dtype or base.dtype))
+    return stacked, ok
+
+
+def nc_params_batch(list_of_param_sets, indir, outdirs, cache=BASE_CACHE, link_mode='copy', block_size=16, processes=None):
+    '''
+    Adjust the parameters of many members in one pass over the base netCDF files
+    The base files are read once, the values of a block of members are broadcast across a member axis
+    and each member's modified files are written to its own outdir, the unmodified ones are placed as in nc_params.
+
+    Parameters:
+    ----------
+    list_of_param_sets: list
+        One list of parameters per member, in the format of nc_params
+    indir: str
+        The directory containing the netCDF files to adjust
+    outdirs: list
+        One output directory per member
+    cache: DatasetCache, optional
+        Cache of the decoded base files, defaults to the process wide BASE_CACHE
+    link_mode: str, optional
+        How the unmodified files are placed, 'copy', 'hardlink' or 'symlink'
+    block_size: int, optional
+        Number of members adjusted together, bounds the memory of the stacked arrays
+    processes: int, optional
+        Split the members over a pool of processes, each loading the base files once
+
+    Returns:
+    ----------
+    exit_codes: list
+        One exit code per member, 1: successful, 0: failed
+    '''
+    if len(list_of_param_sets) != len(outdirs):
+        raise ValueError("list_of_param_sets and outdirs must have the same length.")
+
+    if processes is not None and processes > 1 and len(outdirs) > 1:
+        chunks = [list(range(len(outdirs)))[i::processes] for i in range(processes)]
+        chunks = [chunk for chunk in chunks if chunk]
+        exit_codes = [0] * len(outdirs)
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(nc_params_batch, [list_of_param_sets[i] for i in chunk], indir,
+                                       [outdirs[i] for i in chunk], link_mode=link_mode, block_size=block_size)
+                       for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                for i, exit_code in zip(chunk, future.result()):
+                    exit_codes[i] = exit_code
+        return exit_codes
+
+    exit_codes = [1] * len(outdirs)
+    member_ops = []
+    for i, params in enumerate(list_of_param_sets):
+        try:
+            member_ops.append(merge_member_params(params))
+        except Exception as e:
+            logger.error(f"Member {i}: {e}")
+            member_ops.append({})
+            exit_codes[i] = 0
+
+    files = sorted(set(file for ops in member_ops for file, _ in ops))
+    logger.info(f"Reading netCDF files {files} for {len(outdirs)} members.")
+    dsdict = read_nc(indir, cache=cache, files=files)
+    if dsdict is None:
+        return [0] * len(outdirs)
+
+    for start in range(0, len(outdirs), block_size):
+        block = [i for i in range(start, min(start + block_size, len(outdirs))) if exit_codes[i] == 1]
+
+        # adjust every (file, variable, method) of the block with one broadcast operation
+        new_vars = {i: {} for i in block}
+        groups = {}
+        for i in block:
+            for (file, name), (adjust, value) in member_ops[i].items():
+                groups.setdefault((file, name, adjust), []).append((i, value))
+        for (file, name, adjust), members in groups.items():
+            if file not in dsdict or name not in dsdict[file]:
+                logger.error(f"Variable {name} of file {file} not found in the dataset.")
+                for i, _ in members:
+                    exit_codes[i] = 0
+                continue
+            stacked, ok = adjust_members(dsdict[file][name].values, adjust, [value for _, value in members],
+                                         dtype=dsdict[file][name].encoding.get('dtype'))
+            for k, (i, value) in enumerate(members):
+                if ok[k]:
+                    new_vars[i][(file, name)] = stacked[k]
+                else:
+                    logger.error(f"Member {i}: parameter {name} adjustment to {value} failed.")
+                    exit_codes[i] = 0
+
+        # stream each member's files out
+        for i in block:
+            if exit_codes[i] != 1:
+                continue
+            modified = {}
+            for (file, name), data in new_vars[i].items():
+                if file not in modified:
+                    modified[file] = dsdict[file].copy(deep=False)
+                modified[file][name] = modified[file][name].copy(deep=False, data=data)
+            exit_code = save_nc(modified, outdirs[i])
+            if exit_code == 1:
+                unmodified = [file[:-1] for file in NC_FILES if file[:-1] not in modified]
+                exit_code = place_nc(indir, outdirs[i], unmodified, link_mode=link_mode)
+            exit_codes[i] = exit_code
+            logger.info(f"Member {i} written to {outdirs[i]} with exit code {exit_code}.")
+        del new_vars, groups
+
+    return exit_codes
+
+
 def chan_param(params, indir, outdir):
     '''
     Adjust the CHANPARM.TBL file based on the value of the parameter
@@ -321,6 +719,9 @@ def chan_param(params, indir, outdir):
     try:
         input_file = os.path.join(indir, "CHANPARM.TBL.temp")
         output_file = os.path.join(outdir, "CHANPARM.TBL")
+        # remove first, the file may be a hardlink to the template
+        if os.path.lexists(output_file):
+            os.remove(output_file)
 
         logger.info(f"Reading CHANPARM.TBL.temp file.")
         with open(input_file, 'r', encoding='utf-8') as f, open(output_file, 'w', encoding='utf-8') as w:
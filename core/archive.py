@@ -0,0 +1,241 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   archive.py
+@Create  :   2025-05-08 09:55:04
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import re
+import json
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .adjust_params import NC_LOCK, NC_FILE_LOCK
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+logger = logging.getLogger(__name__)
+
+# Gridded and channel outputs that can be archived, e.g. '201907250100.LDASOUT_DOMAIN1', '201907250100.CHRTOUT_DOMAIN1'
+ARCHIVE_KINDS = ['LDASOUT', 'CHRTOUT', 'RTOUT', 'GWOUT', 'LAKEOUT', 'CHANOBS']
+
+ARCHIVE_PATTERN = re.compile(r"^(\d{12})\.([A-Z]+)_DOMAIN\d+$")
+
+PACK_FILL = np.int16(-32768)
+
+def find_archive_outputs(job_dir:str, kinds:list=None):
+    """
+    Find the outputs of a job directory to be archived with one os.scandir pass.
+
+    Returns
+    ----------
+    outputs : list
+        Sorted by kind and time. Format --> [(kind, timestamp, path), ...]
+    """
+    kinds = ARCHIVE_KINDS if kinds is None else kinds
+    outputs = []
+    with os.scandir(job_dir) as entries:
+        for entry in entries:
+            match = ARCHIVE_PATTERN.match(entry.name)
+            if match is not None and match.group(2) in kinds and entry.is_file():
+                outputs.append((match.group(2), datetime.strptime(match.group(1), '%Y%m%d%H%M'), entry.path))
+    return sorted(outputs)
+
+def _time_dim(nc):
+    """
+    Name of the record dimension of a model output, 'Time' for LDASOUT and 'time' for CHRTOUT.
+    """
+    for name, dim in nc.dimensions.items():
+        if dim.isunlimited() or name in ('Time', 'time'):
+            return name
+    return None
+
+def _pack_ranges(paths, names):
+    """
+    Minimum and maximum of each variable over all time steps, first pass of the int16 packing.
+    """
+    ranges = {name: [np.inf, -np.inf] for name in names}
+    for path in paths:
+        with netCDF4.Dataset(path) as src:
+            for name in names:
+                values = np.ma.masked_invalid(src[name][:])
+                if values.count():
+                    ranges[name][0] = min(ranges[name][0], float(values.min()))
+                    ranges[name][1] = max(ranges[name][1], float(values.max()))
+    return ranges
+
+def _archive_group(group, paths, complevel, significant_digits, pack, chunk_bytes):
+    """
+    Write the time steps of one kind of output into a group, stacked along the record dimension.
+    """
+    with netCDF4.Dataset(paths[0]) as first:
+        time_dim = _time_dim(first)
+        group.setncatts({key: first.getncattr(key) for key in first.ncattrs()})
+        for name, dim in first.dimensions.items():
+            group.createDimension(name, None if name == time_dim else len(dim))
+
+        stacked = [name for name, var in first.variables.items() if var.dimensions[:1] == (time_dim,)]
+        floats = [name for name in stacked if first[name].dtype.kind == 'f' and first[name].ndim > 1]
+        ranges = _pack_ranges(paths, floats) if pack else {}
+
+        for name, var in first.variables.items():
+            attrs = {key: var.getncattr(key) for key in var.ncattrs() if key != '_FillValue'}
+            kwargs = {'zlib': True, 'complevel': complevel}
+            if '_FillValue' in var.ncattrs():
+                kwargs['fill_value'] = var.getncattr('_FillValue')
+            dtype = var.dtype
+            if name in floats:
+                # values are read unpacked, repacked below
+                for key in ('scale_factor', 'add_offset', 'missing_value'):
+                    attrs.pop(key, None)
+                shape = [len(first.dimensions[dim]) for dim in var.dimensions[1:]]
+                step_bytes = 4 * int(np.prod(shape))
+                kwargs['chunksizes'] = [max(1, min(len(paths), chunk_bytes // max(1, step_bytes)))] + shape
+                if pack:
+                    low, high = ranges[name]
+                    if not np.isfinite(low):
+                        low, high = 0.0, 0.0
+                    attrs['scale_factor'] = np.float32((high - low) / 65533 if high > low else 1.0)
+                    attrs['add_offset'] = np.float32((high + low) / 2)
+                    dtype, kwargs['fill_value'] = 'i2', PACK_FILL
+                else:
+                    dtype, kwargs['fill_value'] = 'f4', np.float32(np.nan)
+                    if significant_digits is not None:
+                        kwargs['significant_digits'] = significant_digits
+            elif dtype == str or dtype.kind in ('S', 'U'):
+                kwargs = {}
+            out = group.createVariable(name, dtype, var.dimensions, **kwargs)
+            out.setncatts(attrs)
+            if name not in stacked:
+                out[:] = var[:]
+
+    for i, path in enumerate(paths):
+        with netCDF4.Dataset(path) as src:
+            for name in stacked:
+                values = src[name][:]
+                group[name][i:i + 1] = np.ma.masked_invalid(values) if name in floats else values
+
+def archive_outputs(job_dir:str, archive_path:str, kinds:list=None, complevel:int=4, significant_digits:int=3,
+                    pack:bool=False, chunk_bytes:int=1 << 20, attrs:dict=None):
+    """
+    Archive the gridded and channel outputs of a job directory into one compressed netCDF file,
+    one group per kind of output, e.g. /LDASOUT and /CHRTOUT, with the time steps stacked along the record dimension.
+
+    Float fields are stored as float32 with zlib compression, quantized to significant_digits,
+    or packed into int16 with a scale_factor and add_offset covering the range of the member with pack=True.
+    Chunks hold whole time steps, as many as fit into chunk_bytes.
+
+    Parameters
+    ----------
+    job_dir : str
+        The job directory.
+    archive_path : str
+        The archive file, e.g. <result_dir>/archive/<job_id>.nc, written atomically.
+    kinds : list, optional
+        Kinds of output to archive, defaults to ARCHIVE_KINDS.
+    complevel : int, optional, default=4
+        zlib compression level.
+    significant_digits : int, optional, default=3
+        Significant digits kept of float fields, None keeps the full float32 precision.
+    pack : bool, optional, default=False
+        Pack float fields into int16.
+    chunk_bytes : int, optional, default=1 MiB
+        Target size of the chunks of float fields.
+    attrs : dict, optional
+        Global attributes of the archive, e.g. the job ID and the parameters of the member.
+
+    Returns
+    ----------
+    archived : list
+        The archived outputs, see find_archive_outputs.
+    """
+    if netCDF4 is None:
+        raise ImportError("netCDF4 is required to archive model outputs.")
+    if significant_digits is not None and not getattr(netCDF4, '__has_quantization_support__', False):
+        logger.warning("The netCDF library does not support quantization, float fields are archived at full precision.")
+        significant_digits = None
+    outputs = find_archive_outputs(job_dir, kinds)
+    if not outputs:
+        logger.info(f"No outputs to archive in {job_dir}.")
+        return []
+
+    os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+    tmp_path = archive_path + '.tmp'
+    size = 0
+    with netCDF4.Dataset(tmp_path, 'w') as nc:
+        nc.setncatts(attrs or {})
+        for kind in dict.fromkeys(kind for kind, _, _ in outputs):
+            paths = [path for k, _, path in outputs if k == kind]
+            size += sum(os.path.getsize(path) for path in paths)
+            _archive_group(nc.createGroup(kind), paths, complevel, significant_digits, pack, chunk_bytes)
+    os.replace(tmp_path, archive_path)
+    logger.info(f"Archived {len(outputs)} outputs of {job_dir} to {archive_path}, "
+                f"{size} bytes to {os.path.getsize(archive_path)} bytes.")
+    return outputs
+
+class ArchivePool:
+    """
+    A process pool archiving the outputs of completed jobs, see archive_outputs.
+    The archive of a job is <result_dir>/archive/<job_id>.nc unless archive_dir is given.
+
+    Worker processes are started with the 'spawn' method, as the scheduler does netCDF I/O in threads,
+    so scripts using it must guard their entry point with if __name__ == '__main__'.
+
+    Parameters
+    ----------
+    processes : int, optional, default=2
+        Number of worker processes, 0 archives on the calling thread.
+    archive_dir : str, optional
+        Directory of the archives.
+    options : dict, optional
+        Keyword arguments of archive_outputs, e.g. kinds=['LDASOUT'], pack=True.
+    """
+    def __init__(self, processes:int=2, archive_dir:str=None, **options):
+        """
+        Initialize the archive pool, the worker processes are started on the first job.
+        """
+        self.archive_dir = archive_dir
+        self.options = options
+        self.executor = None
+        if processes > 0:
+            self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+    def archive_path(self, runner):
+        """
+        Return the archive file of a ModelRunner object.
+        """
+        archive_dir = self.archive_dir or os.path.join(runner.result_dir, 'archive')
+        return os.path.join(archive_dir, f"{runner.job_id}.nc")
+
+    def archive(self, runner):
+        """
+        Archive the outputs of a job and wait for the result, called from a cleanup thread.
+
+        Returns
+        ----------
+        archived : list
+            The archived outputs, see find_archive_outputs.
+        """
+        attrs = {'job_id': runner.job_id, 'event_no': str(runner.event_no), 'basin': runner.basin,
+                 'set_params': json.dumps(runner.set_params, sort_keys=True, default=str)}
+        args = (runner.job_dir, self.archive_path(runner))
+        if self.executor is None:
+            with NC_FILE_LOCK, NC_LOCK:
+                return archive_outputs(*args, attrs=attrs, **self.options)
+        return self.executor.submit(archive_outputs, *args, attrs=attrs, **self.options).result()
+
+    def shutdown(self):
+        """
+        Wait for the running archives and stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
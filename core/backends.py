@@ -0,0 +1,477 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   backends.py
+@Create  :   2025-05-09 10:36:18
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import re
+import logging
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job states reported by every backend use the PBS codes understood by ModelRunner and collect_job:
+#   'Q' : queued, 'R' : running, 'C' : completed, 'E' : failed (Torque: exiting)
+# Jobs unknown to a backend are missing from its status map, they have left the queue.
+# Jobs reported in a state that cannot be mapped are None, their state is left as it is.
+# Every backend names the directive of its job scripts, '#PBS', '#SBATCH' or None when they are run as plain scripts,
+# and whether it can run job arrays and bundles, see JobScheduler.check_group_mode.
+
+# qstat messages about jobs that have left the queue, PBS Pro and Torque
+QSTAT_GONE = re.compile(r"Unknown Job Id|Job has finished|job has finished")
+
+def _pbs_key(pbs_id:str):
+    """
+    Normalize a PBS job ID to the part qstat always prints in full, e.g. '12345.mgmt01' -> '12345'.
+    """
+    return str(pbs_id).strip().split('.')[0]
+
+def _run_qstat(args:list, pbs_ids:list, keys:dict, status_map:dict, chunk_size:int):
+    """
+    Run qstat on chunks of pbs_ids and add the reported states of the IDs in keys to status_map.
+    """
+    for i in range(0, len(pbs_ids), chunk_size):
+        chunk = pbs_ids[i:i + chunk_size]
+        result = subprocess.run(['qstat'] + args + chunk, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            # qstat still prints the known jobs when some IDs have already left the queue,
+            # any other error means the query failed and the jobs must not be taken as finished
+            errors = [line for line in result.stderr.splitlines()
+                      if line.strip() and not QSTAT_GONE.search(line)]
+            if errors:
+                raise RuntimeError(f"qstat returned {result.returncode}: {' '.join(errors)}")
+            logger.debug(f"qstat returned {result.returncode}: {result.stderr.strip()}")
+        for line in result.stdout.splitlines():
+            fields = line.split()
+            if len(fields) < 6 or not fields[0][0].isdigit():
+                continue
+            pbs_id = keys.get(_pbs_key(fields[0]))
+            if pbs_id is not None:
+                status_map[pbs_id] = fields[4]
+
+def query_pbs_status(pbs_ids:list, chunk_size:int=200):
+    """
+    Query the status of many PBS jobs with a single qstat call per chunk of IDs.
+    Sub-jobs of job arrays, e.g. '1234[0].server', are queried through their parent array with qstat -t.
+
+    Parameters
+    ----------
+    pbs_ids : list
+        List of PBS job IDs as returned by qsub.
+    chunk_size : int, optional, default=200
+        Maximum number of IDs passed to one qstat call, to stay below the command line limit.
+
+    Returns
+    ----------
+    status_map : dict
+        Format --> {pbs_id : state}, jobs unknown to qstat are missing from the map.
+    """
+    pbs_ids = [pbs_id for pbs_id in dict.fromkeys(pbs_ids) if pbs_id is not None]
+    keys = {_pbs_key(pbs_id): pbs_id for pbs_id in pbs_ids}
+    status_map = {}
+
+    single_ids = [pbs_id for pbs_id in pbs_ids if not re.search(r"\[\d+\]", pbs_id)]
+    array_ids = list(dict.fromkeys(re.sub(r"\[\d+\]", "[]", pbs_id) for pbs_id in pbs_ids if re.search(r"\[\d+\]", pbs_id)))
+    if single_ids:
+        _run_qstat([], single_ids, keys, status_map, chunk_size)
+    if array_ids:
+        _run_qstat(['-t'], array_ids, keys, status_map, chunk_size)
+    logger.info(f"qstat reported {len(status_map)} of {len(pbs_ids)} PBS jobs.")
+    return status_map
+
+# qstat -x -f of finished jobs, PBS Pro prints 'Job Id:' blocks of 'key = value' lines, Torque prints XML
+QSTAT_FULL = re.compile(r"Job Id:\s*(?P<id>\S+)|<Job_Id>(?P<xml_id>[^<]+)</Job_Id>"
+                        r"|job_state\s*=\s*(?P<state>\w)|<job_state>(?P<xml_state>\w)</job_state>"
+                        r"|[Ee]xit_status\s*=\s*(?P<exit>-?\d+)|<exit_status>(?P<xml_exit>-?\d+)</exit_status>")
+
+# job_state of jobs still known to the history query, e.g. a job requeued in between the two queries
+PBS_STATES = {'Q': 'Q', 'H': 'Q', 'W': 'Q', 'T': 'Q', 'R': 'R', 'B': 'R', 'S': 'R', 'E': 'R'}
+
+def query_pbs_history(pbs_ids:list, chunk_size:int=200):
+    """
+    Look up jobs that have left qstat with qstat -x -f, the job history of PBS Pro or the completed jobs of Torque,
+    and map their Exit_status to 'C' (0) or 'E'. A finished job without exit status, e.g. deleted while queued, is 'E'.
+
+    Returns
+    ----------
+    status_map : dict
+        Format --> {pbs_id : state}, jobs unknown to the history are missing from the map.
+    """
+    pbs_ids = [pbs_id for pbs_id in dict.fromkeys(pbs_ids) if pbs_id is not None]
+    keys = {_pbs_key(pbs_id): pbs_id for pbs_id in pbs_ids}
+    status_map = {}
+    for i in range(0, len(pbs_ids), chunk_size):
+        chunk = pbs_ids[i:i + chunk_size]
+        result = subprocess.run(['qstat', '-x', '-f'] + chunk, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if line.strip() and not QSTAT_GONE.search(line)]
+            if errors:
+                raise RuntimeError(f"qstat -x returned {result.returncode}: {' '.join(errors)}")
+        jobs = {}
+        pbs_id = None
+        for match in QSTAT_FULL.finditer(result.stdout):
+            if match.group('id') or match.group('xml_id'):
+                pbs_id = keys.get(_pbs_key(match.group('id') or match.group('xml_id')))
+                if pbs_id is not None:
+                    jobs[pbs_id] = {}
+            elif pbs_id is not None:
+                if match.group('state') or match.group('xml_state'):
+                    jobs[pbs_id]['state'] = match.group('state') or match.group('xml_state')
+                else:
+                    jobs[pbs_id]['exit'] = int(match.group('exit') or match.group('xml_exit'))
+        for pbs_id, job in jobs.items():
+            if 'exit' in job:
+                status_map[pbs_id] = 'C' if job['exit'] == 0 else 'E'
+            else:
+                status_map[pbs_id] = PBS_STATES.get(job.get('state'), 'E')
+    logger.info(f"qstat -x reported {len(status_map)} of {len(pbs_ids)} finished PBS jobs.")
+    return status_map
+
+# walltime requests of job scripts, '#PBS -l walltime=01:30:00' or '#SBATCH --time=1-12:00:00' / '#SBATCH -t 90'
+WALLTIME = re.compile(r"^#PBS\s+-l\s+\S*walltime=(?P<pbs>[\d:]+)|^#SBATCH\s+(?:--time[=\s]|-t\s*)(?P<slurm>[\d:-]+)", re.M)
+
+def parse_walltime(script:str):
+    """
+    Return the walltime requested by the #PBS or #SBATCH directives of a job script in seconds, None without one.
+    PBS takes [[HH:]MM:]SS, Slurm MM, MM:SS, HH:MM:SS, D-HH, D-HH:MM or D-HH:MM:SS.
+    """
+    try:
+        with open(script, 'r', encoding='utf-8') as f:
+            match = WALLTIME.search(f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+    if match is None:
+        return None
+    days = 0
+    if match.group('pbs') is not None:
+        fields = [int(field) for field in match.group('pbs').split(':')]
+    else:
+        value = match.group('slurm')
+        if '-' in value:
+            day, value = value.split('-', 1)
+            days = int(day)
+            fields = [int(field) for field in value.split(':')]
+            fields += [0] * (3 - len(fields))
+        else:
+            fields = [int(field) for field in value.split(':')]
+            # a single number is minutes, MM:SS, else HH:MM:SS
+            fields = [fields[0], 0] if len(fields) == 1 else fields
+    seconds = 0
+    for field in fields:
+        seconds = seconds * 60 + field
+    return days * 86400 + seconds
+
+def _submit_env(cwd:str):
+    """
+    Environment of a submitted script, PBS_O_WORKDIR is set so that 'cd $PBS_O_WORKDIR' works with every backend.
+    """
+    return dict(os.environ, PBS_O_WORKDIR=cwd)
+
+class PBSBackend:
+    """
+    Submit with qsub and query with batched qstat calls, PBS Pro or Torque.
+    Single jobs that left qstat are looked up with qstat -x -f, the members of job arrays and bundles
+    are resolved by the exit status written by their wrapper script, see ModelRunner.update_pbs_job_status.
+
+    Parameters
+    ----------
+    chunk_size : int, optional, default=200
+        Maximum number of IDs passed to one qstat call.
+    """
+    name = 'pbs'
+    directive = '#PBS'
+    supports_arrays = True
+    supports_bundles = True
+
+    def __init__(self, chunk_size:int=200):
+        self.chunk_size = chunk_size
+
+    def submit(self, script:str, cwd:str):
+        """
+        Submit script from cwd and return the PBS ID.
+        """
+        result = subprocess.run(['qsub', script], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Error submitting PBS job: {result.stderr.strip()}")
+        return result.stdout.strip()
+
+    def status(self, job_ids:list):
+        """
+        Return the states of job_ids. Format --> {job_id : state}
+        """
+        status_map = query_pbs_status(job_ids, chunk_size=self.chunk_size)
+        gone = [job_id for job_id in job_ids if job_id is not None and job_id not in status_map
+                and not re.search(r"\[\d+\]", job_id)]
+        if gone:
+            status_map.update(query_pbs_history(gone, chunk_size=self.chunk_size))
+        return status_map
+
+    def cancel(self, job_ids:list):
+        """
+        Delete queued or running jobs with qdel.
+        """
+        job_ids = [job_id for job_id in dict.fromkeys(job_ids) if job_id is not None]
+        if job_ids:
+            result = subprocess.run(['qdel'] + job_ids, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                logger.warning(f"qdel returned {result.returncode}: {result.stderr.strip()}")
+
+    def add_done_callback(self, callback):
+        """
+        Jobs of a PBS server are only seen finished by polling, see LocalBackend.add_done_callback.
+        """
+
+    def remove_done_callback(self, callback):
+        pass
+
+    def shutdown(self):
+        pass
+
+# squeue compact and sacct long states mapped to the PBS codes, only known terminal failures are 'E'.
+# Other states are reported as None rather than guessed.
+SLURM_STATES = {
+    'PD': 'Q', 'CF': 'Q', 'RQ': 'Q', 'RS': 'Q', 'S': 'Q', 'RH': 'Q',
+    'PENDING': 'Q', 'CONFIGURING': 'Q', 'REQUEUED': 'Q', 'REQUEUE_FED': 'Q', 'REQUEUE_HOLD': 'Q',
+    'RESIZING': 'Q', 'SUSPENDED': 'Q', 'RESV_DEL_HOLD': 'Q',
+    'R': 'R', 'CG': 'R', 'SO': 'R', 'SI': 'R', 'RD': 'R', 'ST': 'R', 'RF': 'R',
+    'RUNNING': 'R', 'COMPLETING': 'R', 'STAGE_OUT': 'R', 'SIGNALING': 'R', 'STOPPED': 'R',
+    'CD': 'C', 'COMPLETED': 'C',
+    'F': 'E', 'CA': 'E', 'TO': 'E', 'OOM': 'E', 'NF': 'E', 'BF': 'E', 'DL': 'E', 'PR': 'E',
+    'FAILED': 'E', 'CANCELLED': 'E', 'TIMEOUT': 'E', 'OUT_OF_MEMORY': 'E', 'NODE_FAIL': 'E',
+    'BOOT_FAIL': 'E', 'DEADLINE': 'E', 'PREEMPTED': 'E',
+}
+
+class SlurmBackend:
+    """
+    Submit with sbatch and query with batched squeue calls, jobs that left squeue are looked up with sacct.
+    The #SBATCH directives of the job script apply, #PBS directives are ignored by sbatch.
+
+    Parameters
+    ----------
+    chunk_size : int, optional, default=200
+        Maximum number of IDs passed to one squeue or sacct call.
+    sbatch_args : list, optional
+        Further sbatch options, e.g. ['--partition=short'].
+    """
+    name = 'slurm'
+    directive = '#SBATCH'
+    supports_arrays = False
+    supports_bundles = True
+
+    def __init__(self, chunk_size:int=200, sbatch_args:list=None):
+        self.chunk_size = chunk_size
+        self.sbatch_args = list(sbatch_args or [])
+
+    def submit(self, script:str, cwd:str):
+        """
+        Submit script from cwd and return the Slurm job ID.
+        """
+        result = subprocess.run(['sbatch', '--parsable'] + self.sbatch_args + [script], cwd=cwd, env=_submit_env(cwd),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Error submitting Slurm job: {result.stderr.strip()}")
+        # --parsable prints '<job_id>' or '<job_id>;<cluster>'
+        return result.stdout.strip().split(';')[0]
+
+    def _query(self, command:list, job_ids:list, status_map:dict, strict:bool=False):
+        """
+        Run a squeue or sacct command on chunks of job_ids and add the reported states to status_map.
+        With strict, a failing command raises, so that the jobs are not taken as gone.
+        """
+        wanted = set(job_ids)
+        for i in range(0, len(job_ids), self.chunk_size):
+            chunk = job_ids[i:i + self.chunk_size]
+            result = subprocess.run(command + [','.join(chunk)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                if strict:
+                    raise RuntimeError(f"{command[0]} returned {result.returncode}: {result.stderr.strip()}")
+                logger.warning(f"{command[0]} returned {result.returncode}: {result.stderr.strip()}")
+            for line in result.stdout.splitlines():
+                fields = line.replace('|', ' ').split()
+                if len(fields) < 2 or fields[0] not in wanted:
+                    continue
+                # sacct prints e.g. 'CANCELLED by 123', only the first word is the state
+                state = SLURM_STATES.get(fields[1].rstrip('+'))
+                if state is None:
+                    logger.warning(f"Unknown Slurm state {fields[1]} of job {fields[0]}.")
+                status_map[fields[0]] = state
+
+    def status(self, job_ids:list):
+        """
+        Return the states of job_ids. Format --> {job_id : state}
+        """
+        job_ids = [str(job_id) for job_id in dict.fromkeys(job_ids) if job_id is not None]
+        status_map = {}
+        if job_ids:
+            self._query(['squeue', '-h', '-o', '%i %t', '-j'], job_ids, status_map)
+        gone = [job_id for job_id in job_ids if job_id not in status_map]
+        if gone:
+            self._query(['sacct', '-n', '-P', '-X', '-o', 'JobID,State', '-j'], gone, status_map, strict=True)
+        logger.info(f"Slurm reported {len(status_map)} of {len(job_ids)} jobs.")
+        return status_map
+
+    def cancel(self, job_ids:list):
+        """
+        Cancel queued or running jobs with scancel.
+        """
+        job_ids = [str(job_id) for job_id in dict.fromkeys(job_ids) if job_id is not None]
+        if job_ids:
+            result = subprocess.run(['scancel'] + job_ids, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                logger.warning(f"scancel returned {result.returncode}: {result.stderr.strip()}")
+
+    def add_done_callback(self, callback):
+        """
+        Jobs of a Slurm cluster are only seen finished by polling, see LocalBackend.add_done_callback.
+        """
+
+    def remove_done_callback(self, callback):
+        pass
+
+    def shutdown(self):
+        pass
+
+class LocalBackend:
+    """
+    Run job scripts with bash on the current node, at most max_workers at a time, without any queue.
+    The output of a script is written to <script>.o<n> and <script>.e<n> in its working directory.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Number of scripts running at the same time, defaults to the number of CPUs.
+    shell : str, optional, default='bash'
+    """
+    name = 'local'
+    directive = None
+    supports_arrays = False
+    supports_bundles = False
+
+    def __init__(self, max_workers:int=None, shell:str='bash'):
+        self.shell = shell
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1, thread_name_prefix='local')
+        self.counter = itertools.count(1)
+        self.futures = {}
+        self.processes = {}
+        self.cancelled = set()
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    def _run(self, job_id, script, cwd):
+        """
+        Run one script in a worker thread and return its exit status.
+        """
+        with self._lock:
+            if job_id in self.cancelled:
+                return -1
+        name = os.path.basename(script)
+        number = job_id.split('.')[-1]
+        with open(os.path.join(cwd, f"{name}.o{number}"), 'w') as out, open(os.path.join(cwd, f"{name}.e{number}"), 'w') as err:
+            process = subprocess.Popen([self.shell, script], cwd=cwd, env=_submit_env(cwd), stdout=out, stderr=err)
+            with self._lock:
+                self.processes[job_id] = process
+            try:
+                return process.wait()
+            finally:
+                with self._lock:
+                    self.processes.pop(job_id, None)
+
+    def submit(self, script:str, cwd:str):
+        """
+        Queue script for running in cwd and return its local job ID, e.g. 'local.1'.
+        """
+        job_id = f"local.{next(self.counter)}"
+        with self._lock:
+            # relative scripts are resolved against cwd, never against the working directory of the driver
+            future = self.executor.submit(self._run, job_id, os.path.join(os.path.abspath(cwd), script), cwd)
+            self.futures[job_id] = future
+        # outside the lock, a future that is already done calls back right away
+        future.add_done_callback(lambda future: self._done(job_id))
+        logger.debug(f"Local job {job_id} queued: {script}")
+        return job_id
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(job_id) from the worker thread whenever a script has finished, e.g. JobScheduler.wake.
+        """
+        with self._lock:
+            if callback not in self.callbacks:
+                self.callbacks.append(callback)
+
+    def remove_done_callback(self, callback):
+        with self._lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def _done(self, job_id):
+        with self._lock:
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            try:
+                callback(job_id)
+            except Exception as e:
+                logger.error(f"Error in the done callback of local job {job_id}: {e}")
+
+    def status(self, job_ids:list):
+        """
+        Return the states of job_ids. Format --> {job_id : state}
+        """
+        status_map = {}
+        with self._lock:
+            for job_id in job_ids:
+                future = self.futures.get(job_id)
+                if future is None:
+                    continue
+                if not future.done():
+                    status_map[job_id] = 'R' if job_id in self.processes else 'Q'
+                elif future.cancelled() or future.exception() is not None:
+                    status_map[job_id] = 'E'
+                else:
+                    status_map[job_id] = 'C' if future.result() == 0 else 'E'
+        return status_map
+
+    def cancel(self, job_ids:list):
+        """
+        Cancel queued jobs and terminate running ones.
+        """
+        with self._lock:
+            for job_id in job_ids:
+                future = self.futures.get(job_id)
+                if future is None:
+                    continue
+                self.cancelled.add(job_id)
+                future.cancel()
+                process = self.processes.get(job_id)
+                if process is not None:
+                    process.terminate()
+
+    def shutdown(self):
+        """
+        Wait for the running scripts, the queued ones are cancelled.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+BACKENDS = {
+    'pbs': PBSBackend,
+    'slurm': SlurmBackend,
+    'local': LocalBackend,
+}
+
+def make_backend(backend='pbs', **options):
+    """
+    Return an execution backend by name, 'pbs', 'slurm' or 'local', with the keyword arguments of its class.
+    A backend object is returned as it is.
+    """
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend '{backend}'. Use one of {list(BACKENDS)}.")
+    return BACKENDS[backend](**options)
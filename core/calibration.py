@@ -0,0 +1,407 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   calibration.py
+@Create  :   2025-05-02 14:26:51
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import csv
+import json
+import math
+import logging
+import numpy as np
+from .WRFHydroJob import SimulationInfo, ModelRunner
+from .RunningJobs import JobScheduler
+from .results import read_member
+from .scoring import score
+
+logger = logging.getLogger(__name__)
+
+def param_bounds(params_info:dict, names:list=None):
+    """
+    Return the calibration bounds of the parameters from run_params.yaml.
+
+    Parameters
+    ----------
+    params_info : dict
+        SimulationInfo.params_info.
+    names : list, optional
+        Parameters to calibrate, defaults to all of them.
+
+    Returns
+    ----------
+    names : list
+    lower, upper, initial : np.ndarray
+        minValue, maxValue and iniValue of each parameter, iniValue defaults to the middle of the range.
+    """
+    names = list(params_info.keys()) if names is None else list(names)
+    lower = np.array([float(params_info[name]['minValue']) for name in names])
+    upper = np.array([float(params_info[name]['maxValue']) for name in names])
+    initial = np.array([float(params_info[name].get('iniValue', (params_info[name]['minValue'] + params_info[name]['maxValue']) / 2))
+                        for name in names])
+    return names, lower, upper, initial
+
+class DDS:
+    """
+    Dynamically dimensioned search (Tolson and Shoemaker, 2007) with an ask/tell interface, minimizing the objective.
+
+    Proposals perturb the best point known when they are asked, so several of them can be evaluated
+    at the same time and told in any order.
+
+    Parameters
+    ----------
+    lower, upper : np.ndarray
+        Bounds of the parameters.
+    max_evals : int
+        Planned number of evaluations, it sets how fast the search narrows to fewer dimensions.
+    x0 : np.ndarray, optional
+        Initial point, evaluated first, defaults to a random point.
+    r : float, optional, default=0.2
+        Perturbation size as a fraction of the parameter ranges.
+    seed : int, optional
+    """
+    def __init__(self, lower, upper, max_evals:int, x0=None, r:float=0.2, seed:int=None):
+        """
+        Initialize the search.
+        """
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.max_evals = max_evals
+        self.r = r
+        self.rng = np.random.default_rng(seed)
+        self.x0 = self.rng.uniform(self.lower, self.upper) if x0 is None else np.clip(np.asarray(x0, dtype=float), self.lower, self.upper)
+        self.n_asked = 0
+        self.best_x = self.x0.copy()
+        self.best_f = math.inf
+
+    def ask(self):
+        """
+        Propose the next point.
+        """
+        self.n_asked += 1
+        if self.n_asked == 1:
+            return self.x0.copy()
+        n = len(self.lower)
+        prob = 1 - math.log(min(self.n_asked, self.max_evals)) / math.log(max(self.max_evals, 2))
+        perturb = self.rng.random(n) < prob
+        if not perturb.any():
+            perturb[self.rng.integers(n)] = True
+        x = self.best_x.copy()
+        x[perturb] += self.r * (self.upper - self.lower)[perturb] * self.rng.standard_normal(perturb.sum())
+        # reflect at the bounds, clip if the reflection is still outside
+        x = np.where(x < self.lower, 2 * self.lower - x, x)
+        x = np.where(x > self.upper, 2 * self.upper - x, x)
+        return np.clip(x, self.lower, self.upper)
+
+    def tell(self, x, f:float):
+        """
+        Report the objective value of an evaluated point.
+        """
+        if f <= self.best_f:
+            self.best_x = np.asarray(x, dtype=float).copy()
+            self.best_f = f
+
+class SCEUA:
+    """
+    Shuffled complex evolution (Duan et al., 1992) with an ask/tell interface, minimizing the objective.
+
+    The competitive complex evolution steps run asynchronously: every ask draws a sub-complex from the next complex
+    and proposes the reflection of its worst point, a failed reflection is followed by a contraction and a failed
+    contraction by a random point. The population is shuffled into new complexes after every len(population) tells.
+
+    Parameters
+    ----------
+    lower, upper : np.ndarray
+        Bounds of the parameters.
+    n_complexes : int, optional, default=2
+    x0 : np.ndarray, optional
+        Initial point, added to the initial population.
+    seed : int, optional
+    """
+    def __init__(self, lower, upper, n_complexes:int=2, x0=None, seed:int=None):
+        """
+        Initialize the search with a random population.
+        """
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.rng = np.random.default_rng(seed)
+        n = len(self.lower)
+        self.n_complexes = n_complexes
+        self.complex_size = 2 * n + 1
+        self.sub_size = n + 1
+        size = n_complexes * self.complex_size
+        self.initial = [self.rng.uniform(self.lower, self.upper) for _ in range(size)]
+        if x0 is not None:
+            self.initial[0] = np.clip(np.asarray(x0, dtype=float), self.lower, self.upper)
+        self.population = []
+        self.n_points = 0
+        self.complexes = []
+        # contexts of the asked points, a list per point as identical points can be asked twice
+        self.pending = {}
+        self.retries = []
+        self.next_complex = 0
+        self.n_told = 0
+        self.best_x = self.initial[0].copy()
+        self.best_f = math.inf
+
+    def _shuffle(self):
+        """
+        Sort the population and deal it into complexes, complex k gets the points of rank k, k + n_complexes, ...
+        """
+        self.population.sort(key=lambda point: point['f'])
+        self.complexes = [list(range(k, len(self.population), self.n_complexes)) for k in range(self.n_complexes)]
+
+    def _add(self, x, f):
+        """
+        Add a new point to the population.
+        """
+        self.n_points += 1
+        self.population.append({'x': x.copy(), 'f': f, 'id': self.n_points})
+
+    def _find(self, point_id):
+        """
+        Return the population index of a point, None if it has been replaced.
+        """
+        for i, point in enumerate(self.population):
+            if point['id'] == point_id:
+                return i
+        return None
+
+    def _sub_complex(self, members):
+        """
+        Draw a sub-complex with a trapezoidal probability favouring the better points.
+        """
+        members = sorted(members, key=lambda i: self.population[i]['f'])
+        m = len(members)
+        weights = 2 * (m - np.arange(m)) / (m * (m + 1))
+        chosen = self.rng.choice(m, size=min(self.sub_size, m), replace=False, p=weights)
+        return [members[i] for i in sorted(chosen)]
+
+    def ask(self):
+        """
+        Propose the next point.
+        """
+        if self.initial:
+            x = self.initial.pop(0)
+            self.pending.setdefault(x.tobytes(), []).append({'step': 'initial'})
+            return x.copy()
+        if not self.complexes:
+            # the initial population is still being evaluated
+            x = self.rng.uniform(self.lower, self.upper)
+            self.pending.setdefault(x.tobytes(), []).append({'step': 'initial'})
+            return x
+        if self.retries:
+            context = self.retries.pop(0)
+        else:
+            members = self.complexes[self.next_complex % len(self.complexes)]
+            self.next_complex += 1
+            sub = self._sub_complex(members)
+            points = np.array([self.population[i]['x'] for i in members])
+            context = {'step': 'reflect', 'worst': self.population[sub[-1]]['id'], 'worst_x': self.population[sub[-1]]['x'],
+                       'worst_f': self.population[sub[-1]]['f'],
+                       'centroid': np.mean([self.population[i]['x'] for i in sub[:-1]], axis=0),
+                       'box': (points.min(axis=0), points.max(axis=0))}
+
+        if context['step'] == 'reflect':
+            x = 2 * context['centroid'] - context['worst_x']
+            if np.any(x < self.lower) or np.any(x > self.upper):
+                context['step'] = 'random'
+        elif context['step'] == 'contract':
+            x = (context['centroid'] + context['worst_x']) / 2
+        if context['step'] == 'random':
+            x = self.rng.uniform(*context['box'])
+        self.pending.setdefault(x.tobytes(), []).append(context)
+        return x.copy()
+
+    def tell(self, x, f:float):
+        """
+        Report the objective value of an evaluated point.
+        """
+        x = np.asarray(x, dtype=float)
+        contexts = self.pending.get(x.tobytes())
+        context = contexts.pop(0) if contexts else {'step': 'initial'}
+        if contexts == []:
+            del self.pending[x.tobytes()]
+        if f <= self.best_f:
+            self.best_x, self.best_f = x.copy(), f
+        self.n_told += 1
+
+        if context['step'] == 'initial':
+            self._add(x, f)
+            if self.complexes:
+                # asked before the initial population was complete, it joins the smallest complex
+                min(self.complexes, key=len).append(len(self.population) - 1)
+            elif len(self.population) >= self.n_complexes * self.complex_size:
+                self._shuffle()
+            return
+
+        index = self._find(context['worst'])
+        if index is None:
+            # the worst point has been replaced meanwhile, replace the current worst point if better
+            index = max(range(len(self.population)), key=lambda i: self.population[i]['f'])
+            if f < self.population[index]['f']:
+                self.population[index] = {'x': x.copy(), 'f': f, 'id': self.n_points + 1}
+                self.n_points += 1
+        elif f < context['worst_f'] or context['step'] == 'random':
+            self.population[index] = {'x': x.copy(), 'f': f, 'id': self.n_points + 1}
+            self.n_points += 1
+        elif context['step'] == 'reflect':
+            self.retries.append(dict(context, step='contract'))
+        else:
+            self.retries.append(dict(context, step='random'))
+        if self.n_told % len(self.population) == 0:
+            self._shuffle()
+
+def make_objective(obs, metric:str='nse', gauge:str=None, failed:float=math.inf):
+    """
+    Build an objective function for Calibration from observed discharge, to be minimized.
+
+    Parameters
+    ----------
+    obs : xr.DataArray, pd.DataFrame or pd.Series
+        Observed discharge, see scoring.align.
+    metric : str, optional, default='nse'
+        'nse', 'kge' or 'lognse' are minimized as 1 - metric, 'peak_error' and 'peak_timing' by their absolute value.
+    gauge : str, optional
+        Gauge to score, defaults to the mean over all gauges.
+    failed : float, optional, default=inf
+        Objective value of members that failed or have no result.
+
+    Returns
+    ----------
+    objective : callable
+        objective(runner) --> float, scoring a collected ModelRunner within its period.
+    """
+    def objective(runner:ModelRunner):
+        if runner.job_status != 'C' or runner.result_path is None:
+            return failed
+        q = read_member(runner.result_path, runner.job_id)
+        values = score(q, obs, period=runner.period, metrics=[metric])[metric]
+        value = float(values.sel(gauge=gauge) if gauge is not None else values.mean(skipna=True))
+        if math.isnan(value):
+            return failed
+        return abs(value) if metric in ('peak_error', 'peak_timing') else 1 - value
+    return objective
+
+class Calibration:
+    """
+    An asynchronous calibration loop running the proposals of an optimizer through a JobScheduler.
+
+    Every slot is kept busy: a new proposal is added as soon as any member finishes,
+    instead of waiting for a whole generation.
+
+    Parameters
+    ----------
+    sim_info : SimulationInfo
+    job_template : dict
+        The job information shared by all members, e.g. {'period': {...}, 'event_no': ..., 'basin': ...},
+        set_params of the template are kept fixed.
+    names : list
+        Parameters to calibrate, keys of SimulationInfo.params_info.
+    objective : callable
+        objective(runner) --> float to be minimized, see make_objective.
+    max_evals : int, optional, default=200
+        Number of members to run.
+    method : str, optional, default='dds'
+        'dds' or 'sceua'.
+    max_num : int, optional, default=5
+        Number of members running at the same time.
+    prefix : str, optional, default='cal'
+        Prefix of the job IDs, e.g. 'cal_00001'.
+    seed : int, optional
+    optimizer_options : dict, optional
+        Further keyword arguments of DDS or SCEUA.
+    scheduler_options : dict, optional
+        Further keyword arguments of JobScheduler, e.g. poll_min, stage_ahead.
+    """
+    def __init__(self, sim_info:SimulationInfo, job_template:dict, names:list, objective, max_evals:int=200,
+                 method:str='dds', max_num:int=5, prefix:str='cal', seed:int=None, optimizer_options:dict=None,
+                 scheduler_options:dict=None):
+        """
+        Initialize the optimizer and the scheduler.
+        """
+        self.sim_info = sim_info
+        self.job_template = job_template
+        self.objective = objective
+        self.max_evals = max_evals
+        self.prefix = prefix
+        self.names, lower, upper, initial = param_bounds(sim_info.params_info, names)
+        optimizer_options = optimizer_options or {}
+        if method == 'dds':
+            self.optimizer = DDS(lower, upper, max_evals, x0=initial, seed=seed, **optimizer_options)
+        elif method == 'sceua':
+            self.optimizer = SCEUA(lower, upper, x0=initial, seed=seed, **optimizer_options)
+        else:
+            raise ValueError(f"Invalid calibration method '{method}'. Use 'dds' or 'sceua'.")
+        scheduler_options = dict(scheduler_options or {})
+        scheduler_options.setdefault('state_store', sim_info.state_store)
+        scheduler_options.setdefault('metrics', sim_info.metrics)
+        self.scheduler = JobScheduler({}, max_num=max_num, on_finished=self.on_finished, **scheduler_options)
+        self.proposals = {}
+        self.history = []
+        self.n_proposed = 0
+        self.history_file = os.path.join(sim_info.result_dir, f"{prefix}_calibration.csv")
+
+    def propose(self):
+        """
+        Ask the optimizer for a new point and queue it as a new member.
+        """
+        x = self.optimizer.ask()
+        self.n_proposed += 1
+        job_id = f"{self.prefix}_{self.n_proposed:05d}"
+        set_params = dict(self.job_template.get('set_params', {}))
+        set_params.update({name: float(value) for name, value in zip(self.names, x)})
+        job_info = dict(self.job_template, job_id=job_id, set_params=set_params)
+        self.proposals[job_id] = x
+        self.scheduler.add_job(job_id, ModelRunner(self.sim_info, job_info=job_info))
+
+    def on_finished(self, job_id, runner:ModelRunner):
+        """
+        Score a finished member, report it to the optimizer and propose the next one.
+        """
+        x = self.proposals.pop(job_id, None)
+        if x is None:
+            return
+        try:
+            f = self.objective(runner)
+        except Exception as e:
+            logger.error(f"Error scoring job {job_id}: {e}")
+            f = math.inf
+        self.optimizer.tell(x, f)
+        self.record(job_id, runner.set_params, f)
+        logger.info(f"Job {job_id} objective {f:.6g}, best {self.optimizer.best_f:.6g} after {len(self.history)} members.")
+        if self.n_proposed < self.max_evals:
+            self.propose()
+
+    def record(self, job_id, set_params, f):
+        """
+        Append a member to the history and to the history file <result_dir>/<prefix>_calibration.csv.
+        """
+        self.history.append({'job_id': job_id, 'objective': f, 'set_params': set_params})
+        new_file = not os.path.exists(self.history_file)
+        os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
+        with open(self.history_file, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(['job_id', 'objective', 'set_params'])
+            writer.writerow([job_id, f, json.dumps(set_params, sort_keys=True)])
+
+    def run(self):
+        """
+        Run the calibration until max_evals members have finished.
+
+        Returns
+        ----------
+        best : dict
+            The best parameters and objective value. Format --> {'set_params': dict, 'objective': float}
+        """
+        for _ in range(min(self.scheduler.max_num, self.max_evals)):
+            self.propose()
+        self.scheduler.run()
+        best = dict(zip(self.names, (float(value) for value in self.optimizer.best_x)))
+        logger.info(f"Calibration finished, best objective {self.optimizer.best_f:.6g} with {best}")
+        return {'set_params': best, 'objective': self.optimizer.best_f}
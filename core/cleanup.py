@@ -0,0 +1,197 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   cleanup.py
+@Create  :   2025-05-07 14:21:36
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Model outputs removed from the job directory of a finished job, with the format of their timestamp.
+#   'YYYYMMDDHHMM.LDASOUT_DOMAIN3', 'diag_hydro.00001', 'HYDRO_RST.2012-07-11_00:00_DOMAIN3', 'RESTART.2012071700_DOMAIN3'
+OUTPUT_PATTERNS = {
+    'LDASOUT': (re.compile(r"^(\d{12})\.LDASOUT_DOMAIN\d+$"), '%Y%m%d%H%M'),
+    'diag_hydro': (re.compile(r"^diag_hydro\.\d{5}$"), None),
+    'HYDRO_RST': (re.compile(r"^HYDRO_RST\.(\d{4}-\d{2}-\d{2}_\d{2}:\d{2})_DOMAIN\d+$"), '%Y-%m-%d_%H:%M'),
+    'RESTART': (re.compile(r"^RESTART\.(\d{10})_DOMAIN\d+$"), '%Y%m%d%H'),
+}
+
+RESTART_KINDS = ['HYDRO_RST', 'RESTART']
+
+def _to_datetime(value):
+    """
+    Convert a datetime or a string such as '2019-08-01 00:00' or '2019-08-01_00:00' to a datetime.
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('_', ' '))
+
+def scan_outputs(job_dir:str):
+    """
+    Find the model outputs of a job directory with one os.scandir pass.
+
+    Returns
+    ----------
+    outputs : list
+        Format --> [(kind, timestamp or None, path), ...]
+    """
+    outputs = []
+    with os.scandir(job_dir) as entries:
+        for entry in entries:
+            for kind, (pattern, time_format) in OUTPUT_PATTERNS.items():
+                match = pattern.match(entry.name)
+                if match is None:
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    timestamp = datetime.strptime(match.group(1), time_format) if time_format else None
+                    outputs.append((kind, timestamp, entry.path))
+                break
+    return outputs
+
+def select_outputs(outputs:list, keep_restarts:int=0, keep_times:list=None):
+    """
+    Select the outputs to remove according to a retention policy.
+
+    Parameters
+    ----------
+    outputs : list
+        Outputs found by scan_outputs.
+    keep_restarts : int, optional, default=0
+        Number of the latest restart files kept of each kind, HYDRO_RST and RESTART.
+    keep_times : list, optional
+        Timestamps whose outputs are kept, datetimes or strings such as '2019-08-01 00:00'.
+
+    Returns
+    ----------
+    remove : list
+        Paths of the outputs to remove.
+    """
+    keep_times = {_to_datetime(value) for value in keep_times or []}
+    keep = set()
+    if keep_restarts > 0:
+        for kind in RESTART_KINDS:
+            restarts = sorted((timestamp, path) for k, timestamp, path in outputs if k == kind)
+            keep.update(path for _, path in restarts[-keep_restarts:])
+    return [path for _, timestamp, path in outputs if path not in keep and timestamp not in keep_times]
+
+def prune_outputs(job_dir:str, keep_restarts:int=0, keep_times:list=None, archived:list=None):
+    """
+    Remove the model outputs of a job directory according to a retention policy, see select_outputs,
+    and remove the job directory if nothing is left. Outputs already archived, see archive.archive_outputs,
+    are removed under the same policy.
+
+    Returns
+    ----------
+    removed : int
+        Number of files removed.
+    """
+    outputs = scan_outputs(job_dir)
+    outputs += [output for output in archived or [] if os.path.exists(output[2])]
+    remove = select_outputs(outputs, keep_restarts=keep_restarts, keep_times=keep_times)
+    for path in remove:
+        os.remove(path)
+    logger.info(f"Removed {len(remove)} output files from {job_dir}.")
+    with os.scandir(job_dir) as entries:
+        empty = next(entries, None) is None
+    if empty:
+        shutil.rmtree(job_dir)
+        logger.info(f"Removed job directory: {job_dir}")
+    return len(remove)
+
+class CleanupPool:
+    """
+    A thread pool removing the outputs of finished jobs, so that the scheduler never waits for deletions.
+
+    Parameters
+    ----------
+    workers : int, optional, default=2
+        Number of cleanup threads, 0 cleans up on the calling thread.
+    keep_restarts : int, optional, default=0
+        Number of the latest restart files kept of each kind, see select_outputs.
+    keep_times : list, optional
+        Timestamps whose outputs are kept, see select_outputs.
+    keep_failed : bool, optional, default=True
+        Keep all outputs of failed jobs for inspection, else they are pruned like completed jobs.
+    archive : ArchivePool, optional
+        Archive the outputs of completed jobs before removing them, see archive.ArchivePool.
+        The outputs of a job whose archival failed are kept.
+    """
+    def __init__(self, workers:int=2, keep_restarts:int=0, keep_times:list=None, keep_failed:bool=True, archive=None):
+        """
+        Initialize the cleanup pool.
+        """
+        self.keep_restarts = keep_restarts
+        self.keep_times = keep_times
+        self.keep_failed = keep_failed
+        self.archive = archive
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cleanup') if workers > 0 else None
+        self.futures = {}
+        self._lock = threading.Lock()
+
+    def _cleanup(self, runner):
+        """
+        Clean up one job in a worker thread.
+        """
+        try:
+            archived = None
+            if self.archive is not None and runner.job_status == 'C':
+                try:
+                    start = time.time()
+                    archived = self.archive.archive(runner)
+                    archive_path = self.archive.archive_path(runner)
+                    runner.record_timing('archive', start, files=len(archived),
+                                         bytes=os.path.getsize(archive_path) if archived else 0)
+                except Exception as e:
+                    logger.error(f"Error archiving job {runner.job_id}, outputs kept in {runner.job_dir}: {e}")
+                    return
+            runner.cleanup(keep_restarts=self.keep_restarts, keep_times=self.keep_times, archived=archived)
+        except Exception as e:
+            logger.error(f"Error cleaning up job {runner.job_id}: {e}")
+        finally:
+            with self._lock:
+                self.futures.pop(runner.job_id, None)
+
+    def submit(self, runner):
+        """
+        Clean up the job directory of a finished job according to the retention policy.
+        """
+        if runner.job_status != 'C' and self.keep_failed:
+            logger.info(f"Outputs of failed job {runner.job_id} kept in {runner.job_dir}.")
+            return
+        if self.executor is None:
+            self._cleanup(runner)
+            return
+        with self._lock:
+            self.futures[runner.job_id] = self.executor.submit(self._cleanup, runner)
+
+    def pending(self):
+        """
+        Return the number of jobs waiting for or being cleaned up.
+        """
+        with self._lock:
+            return len(self.futures)
+
+    def shutdown(self, wait:bool=True):
+        """
+        Wait for the pending cleanups, or cancel the ones not yet started with wait=False.
+        """
+        if self.executor is not None:
+            if not wait:
+                with self._lock:
+                    for future in self.futures.values():
+                        future.cancel()
+            self.executor.shutdown(wait=True)
+        if self.archive is not None:
+            self.archive.shutdown()
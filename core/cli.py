@@ -0,0 +1,210 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   cli.py
+@Create  :   2025-05-12 10:21:40
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import json
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# The command line of a campaign described by a YAML file:
+#
+#   sim_info:                     options of SimulationInfo, state_db defaults to 'configs/state.db'
+#     obj: Fuping_Sen
+#     ROOT_DIR: /public/home/Shihuaixuan/Run/Fuping_Run/Fuping_All_params_Sen2
+#   scheduler:                    max_num and the keyword arguments of JobScheduler
+#     max_num: 20
+#     stage_ahead: 4
+#   jobs:                         jobs of 'submit', Format --> {job_id : job_info}
+#     pre_10000: {job_id: pre_10000, period: {start: '2019-07-25', end: '2019-08-17'}, event_no: Fuping_20190804, set_params: {}}
+#
+#   wrfhydro-runner campaign.yaml submit | status | resume | collect | rerun-failed
+#
+# The core subsystems are imported by the commands that need them, 'status' only opens the state store.
+
+DEFAULT_STATE_DB = os.path.join('configs', 'state.db')
+
+def load_campaign(path:str):
+    """
+    Read a campaign YAML file.
+
+    Returns
+    ----------
+    campaign : dict
+        Format --> {'sim_info': dict, 'scheduler': dict, 'jobs': dict}
+    """
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        campaign = yaml.safe_load(f) or {}
+    sim_info = dict(campaign.get('sim_info') or {})
+    sim_info.setdefault('obj', os.path.splitext(os.path.basename(path))[0])
+    sim_info.setdefault('ROOT_DIR', os.path.dirname(os.path.abspath(path)))
+    sim_info.setdefault('state_db', DEFAULT_STATE_DB)
+    return {'sim_info': sim_info, 'scheduler': dict(campaign.get('scheduler') or {}), 'jobs': campaign.get('jobs') or {}}
+
+def _sim_info(campaign:dict):
+    from .WRFHydroJob import SimulationInfo
+    sim_info = SimulationInfo(campaign['sim_info'])
+    sim_info.creat_work_dirs()
+    return sim_info
+
+def _scheduler_options(campaign:dict, args):
+    options = dict(campaign['scheduler'])
+    if args.max_num is not None:
+        options['max_num'] = args.max_num
+    return options
+
+def _report(error_id:list):
+    if error_id:
+        print(f"{len(error_id)} jobs failed before or during submission: {error_id}")
+        return 1
+    return 0
+
+def cmd_submit(campaign:dict, args):
+    """
+    Submit the jobs of the campaign file, or of --jobs, and track them until finished.
+    """
+    from .RunningJobs import batch_instantiate, schedule_and_track_jobs
+    jobs = campaign['jobs']
+    if args.jobs is not None:
+        import yaml
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            jobs = yaml.safe_load(f) or {}
+    if not jobs:
+        print("No jobs to submit.")
+        return 1
+    sim_info = _sim_info(campaign)
+    set_jobs = batch_instantiate(sim_info, jobs=jobs, stage=args.stage)
+    return _report(schedule_and_track_jobs(set_jobs, **_scheduler_options(campaign, args)))
+
+def cmd_status(campaign:dict, args):
+    """
+    Print the number of jobs per status and, with --list, the matching jobs, from the state store only.
+    """
+    from .state_store import StateStore
+    state_db = os.path.join(campaign['sim_info']['ROOT_DIR'], campaign['sim_info']['state_db'])
+    if not os.path.exists(state_db):
+        print(f"No state store at {state_db}.")
+        return 1
+    store = StateStore(state_db)
+    try:
+        counts = store.counts()
+        print(f"{campaign['sim_info']['obj']}: {sum(counts.values())} jobs, "
+              + ', '.join(f"{status} {count}" for status, count in sorted(counts.items(), key=lambda item: str(item[0]))))
+        if args.list or args.status or args.phase or args.event:
+            jobs = store.query(status=args.status, phase=args.phase, event_no=args.event)
+            if args.json:
+                for job in jobs:
+                    print(json.dumps({key: job[key] for key in ('job_id', 'event_no', 'status', 'phase', 'job_status',
+                                                                 'pbs_id', 'job_dir', 'result_path')}))
+            else:
+                print(f"{'job_id':<20s} {'event_no':<20s} {'status':<10s} {'phase':<16s} {'S':<2s} pbs_id")
+                for job in jobs:
+                    print(f"{job['job_id']:<20s} {str(job['event_no']):<20s} {str(job['status']):<10s} "
+                          f"{str(job['phase']):<16s} {str(job['job_status'] or ''):<2s} {job['pbs_id'] or ''}")
+    finally:
+        store.close()
+    return 0
+
+def cmd_resume(campaign:dict, args):
+    """
+    Resume the interrupted campaign from its state store and track it until finished.
+    """
+    from .RunningJobs import resume_and_track_jobs
+    sim_info = _sim_info(campaign)
+    return _report(resume_and_track_jobs(sim_info, **_scheduler_options(campaign, args)))
+
+def cmd_collect(campaign:dict, args):
+    """
+    Collect the submitted jobs that have finished, once, without submitting or waiting.
+    """
+    from .RunningJobs import resume_jobs
+    sim_info = _sim_info(campaign)
+    set_jobs, running_id = resume_jobs(sim_info)
+    counts = sim_info.state_store.counts()
+    print(f"{len(running_id)} jobs still queued or running, {len(set_jobs) - len(running_id)} not submitted, "
+          + ', '.join(f"{status} {count}" for status, count in sorted(counts.items(), key=lambda item: str(item[0]))))
+    return 0
+
+def cmd_rerun_failed(campaign:dict, args):
+    """
+    Submit the failed jobs of the state store again, optionally only those failed in --phase,
+    and track them until finished.
+    """
+    from .RunningJobs import batch_instantiate, schedule_and_track_jobs
+    sim_info = _sim_info(campaign)
+    configs = {job['job_id']: job['config'] for job in sim_info.state_store.failed_jobs(phase=args.phase)
+               if job['config'] is not None}
+    if not configs:
+        print("No failed jobs to rerun.")
+        return 0
+    print(f"Rerunning {len(configs)} failed jobs: {list(configs)}")
+    set_jobs = batch_instantiate(sim_info, configs=configs, stage=args.stage)
+    return _report(schedule_and_track_jobs(set_jobs, **_scheduler_options(campaign, args)))
+
+COMMANDS = {
+    'submit': cmd_submit,
+    'status': cmd_status,
+    'resume': cmd_resume,
+    'collect': cmd_collect,
+    'rerun-failed': cmd_rerun_failed,
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='wrfhydro-runner', description='Run and track WRF-Hydro campaigns.')
+    parser.add_argument('campaign', help='Campaign YAML file with the sections sim_info, scheduler and jobs.')
+    parser.add_argument('--log-level', default='INFO', help='Logging level, default INFO.')
+    parser.add_argument('--log-file', help='Also write the log to this file.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='Submit the jobs and track them until finished.')
+    submit.add_argument('--jobs', help='YAML file of the jobs, instead of the jobs section of the campaign.')
+    resume = commands.add_parser('resume', help='Resume an interrupted campaign and track it until finished.')
+    rerun = commands.add_parser('rerun-failed', help='Submit the failed jobs again and track them until finished.')
+    rerun.add_argument('--phase', help='Only the jobs failed in this phase, e.g. inital_params.')
+    for command in (submit, resume, rerun):
+        command.add_argument('--max-num', type=int, help='Jobs running at the same time, overrides the campaign.')
+    for command in (submit, rerun):
+        command.add_argument('--stage', action='store_true', help='Stage all jobs before submitting, see batch_stage.')
+
+    status = commands.add_parser('status', help='Print the state of the jobs from the state store.')
+    status.add_argument('--list', action='store_true', help='List the jobs.')
+    status.add_argument('--status', help='Only jobs with this status, e.g. failed.')
+    status.add_argument('--phase', help='Only jobs in this phase.')
+    status.add_argument('--event', help='Only jobs of this event.')
+    status.add_argument('--json', action='store_true', help='List the jobs as JSON lines.')
+    commands.add_parser('collect', help='Collect the finished jobs once, without submitting or waiting.')
+    return parser
+
+def main(argv:list=None):
+    """
+    Entry point of the wrfhydro-runner command line, returns the exit status.
+    """
+    args = build_parser().parse_args(argv)
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, mode='a'))
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=handlers,
+    )
+    campaign = load_campaign(args.campaign)
+    try:
+        return COMMANDS[args.command](campaign, args)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, resume the campaign with 'resume'.")
+        return 130
+
+if __name__ == '__main__':
+    sys.exit(main())
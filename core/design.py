@@ -0,0 +1,201 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   design.py
+@Create  :   2025-05-05 10:03:27
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import logging
+import numpy as np
+from .calibration import param_bounds
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+logger = logging.getLogger(__name__)
+
+def latin_hypercube_unit(n:int, d:int, seed:int=None):
+    """
+    Latin hypercube sample of n points in the unit cube [0, 1)^d, one point per stratum and dimension.
+    """
+    rng = np.random.default_rng(seed)
+    strata = rng.permuted(np.tile(np.arange(n), (d, 1)), axis=1).T
+    return (strata + rng.random((n, d))) / n
+
+def sobol_unit(n:int, d:int, seed:int=None):
+    """
+    Scrambled Sobol sequence of n points in the unit cube, n is best a power of 2.
+    Falls back to a Latin hypercube sample without scipy.
+    """
+    if qmc is None:
+        logger.warning("scipy is not installed, using a Latin hypercube instead of a Sobol sequence.")
+        return latin_hypercube_unit(n, d, seed=seed)
+    return qmc.Sobol(d, scramble=True, seed=seed).random(n)
+
+def scale(unit, lower, upper):
+    """
+    Scale points of the unit cube to the parameter bounds.
+    """
+    return np.asarray(lower) + np.asarray(unit) * (np.asarray(upper) - np.asarray(lower))
+
+def latin_hypercube(params_info:dict, names:list, n:int, seed:int=None):
+    """
+    Latin hypercube design of n members within the minValue/maxValue bounds of params_info.
+
+    Returns
+    ----------
+    samples : np.ndarray
+        Parameter values with shape (n, len(names)).
+    """
+    names, lower, upper, _ = param_bounds(params_info, names)
+    return scale(latin_hypercube_unit(n, len(names), seed=seed), lower, upper)
+
+def saltelli(params_info:dict, names:list, n:int, seed:int=None):
+    """
+    Saltelli design for Sobol indices: the base matrices A and B and the d matrices AB_i,
+    i.e. A with column i taken from B, in this order, n * (d + 2) members in total.
+
+    Parameters
+    ----------
+    n : int
+        Number of base samples, best a power of 2.
+
+    Returns
+    ----------
+    samples : np.ndarray
+        Parameter values with shape (n * (d + 2), d), see sobol_indices.
+    """
+    names, lower, upper, _ = param_bounds(params_info, names)
+    d = len(names)
+    base = sobol_unit(n, 2 * d, seed=seed)
+    a, b = base[:, :d], base[:, d:]
+    blocks = [a, b]
+    for i in range(d):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return scale(np.vstack(blocks), lower, upper)
+
+def morris(params_info:dict, names:list, r:int=10, levels:int=4, seed:int=None):
+    """
+    Morris design of r trajectories, each changing one parameter at a time by delta = levels / (2 * (levels - 1))
+    of its range, r * (d + 1) members in total.
+
+    Returns
+    ----------
+    samples : np.ndarray
+        Parameter values with shape (r * (d + 1), d), see morris_indices.
+    """
+    names, lower, upper, _ = param_bounds(params_info, names)
+    d = len(names)
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    trajectories = []
+    for _ in range(r):
+        x = rng.choice(grid, size=d)
+        points = [x.copy()]
+        for i in rng.permutation(d):
+            x[i] = x[i] + delta if x[i] + delta <= 1 else x[i] - delta
+            points.append(x.copy())
+        trajectories.append(np.array(points))
+    return scale(np.vstack(trajectories), lower, upper)
+
+def to_jobs(samples, names:list, job_template:dict, prefix:str='sa', start:int=10001):
+    """
+    Convert a design to job information directly consumable by batch_instantiate.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Parameter values with shape (n, len(names)).
+    names : list
+        Parameters of the columns, keys of SimulationInfo.params_info.
+    job_template : dict
+        The job information shared by all members, e.g. {'period': {...}, 'event_no': ..., 'basin': ...},
+        set_params of the template are kept fixed.
+    prefix : str, optional, default='sa'
+    start : int, optional, default=10001
+        Number of the first job ID, e.g. 'sa_10001'.
+
+    Returns
+    ----------
+    jobs : dict
+        Format --> {'job_id' : job_info}, in design order.
+    """
+    jobs = {}
+    for k, row in enumerate(np.asarray(samples)):
+        job_id = f"{prefix}_{start + k}"
+        set_params = dict(job_template.get('set_params', {}))
+        set_params.update({name: float(value) for name, value in zip(names, row)})
+        jobs[job_id] = dict(job_template, job_id=job_id, set_params=set_params)
+    return jobs
+
+def design_outputs(jobs:dict, values):
+    """
+    Return the model outputs of a design in design order, NaN for members without output.
+
+    Parameters
+    ----------
+    jobs : dict
+        The jobs returned by to_jobs.
+    values : dict or pd.Series
+        Output per job ID, e.g. a column of scoring.score(...).to_dataframe() or rank(scores).
+    """
+    return np.array([float(values[job_id]) if job_id in values else np.nan for job_id in jobs])
+
+def sobol_indices(outputs, d:int):
+    """
+    First-order and total Sobol indices from the outputs of a saltelli design,
+    with the estimators of Saltelli et al. (2010) and Jansen (1999). Members with missing output are skipped.
+
+    Returns
+    ----------
+    indices : dict
+        Format --> {'S1': np.ndarray, 'ST': np.ndarray}, one value per parameter.
+    """
+    y = np.asarray(outputs, dtype=float).reshape(d + 2, -1)
+    f_a, f_b, f_ab = y[0], y[1], y[2:]
+    s1, st = np.full(d, np.nan), np.full(d, np.nan)
+    for i in range(d):
+        valid = np.isfinite(f_a) & np.isfinite(f_b) & np.isfinite(f_ab[i])
+        if valid.sum() < 2:
+            continue
+        variance = np.var(np.concatenate([f_a[valid], f_b[valid]]))
+        if variance == 0:
+            continue
+        s1[i] = np.mean(f_b[valid] * (f_ab[i][valid] - f_a[valid])) / variance
+        st[i] = 0.5 * np.mean((f_a[valid] - f_ab[i][valid]) ** 2) / variance
+    return {'S1': s1, 'ST': st}
+
+def morris_indices(samples, outputs, params_info:dict, names:list):
+    """
+    Morris elementary effects statistics from the outputs of a morris design,
+    in units of the output per full parameter range. Steps with missing output are skipped.
+
+    Returns
+    ----------
+    indices : dict
+        Format --> {'mu': np.ndarray, 'mu_star': np.ndarray, 'sigma': np.ndarray}, one value per parameter.
+    """
+    names, lower, upper, _ = param_bounds(params_info, names)
+    d = len(names)
+    unit = (np.asarray(samples, dtype=float) - lower) / (upper - lower)
+    y = np.asarray(outputs, dtype=float)
+    effects = [[] for _ in range(d)]
+    for start in range(0, len(unit), d + 1):
+        x, f = unit[start:start + d + 1], y[start:start + d + 1]
+        for k in range(d):
+            step = x[k + 1] - x[k]
+            i = int(np.argmax(np.abs(step)))
+            if np.isfinite(f[k]) and np.isfinite(f[k + 1]):
+                effects[i].append((f[k + 1] - f[k]) / step[i])
+    mu = np.array([np.mean(e) if e else np.nan for e in effects])
+    mu_star = np.array([np.mean(np.abs(e)) if e else np.nan for e in effects])
+    sigma = np.array([np.std(e, ddof=1) if len(e) > 1 else np.nan for e in effects])
+    return {'mu': mu, 'mu_star': mu_star, 'sigma': sigma}
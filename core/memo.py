@@ -0,0 +1,204 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   memo.py
+@Create  :   2025-05-06 16:40:12
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size     INTEGER,
+    digest   TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    key        TEXT PRIMARY KEY,
+    job_id     TEXT,
+    path       TEXT,
+    created_at REAL
+);
+"""
+
+def canonical_params(set_params:dict, digits:int=6):
+    """
+    Canonical JSON of set_params with sorted keys and floats rounded to digits significant digits,
+    so that e.g. 0.30000000000000004 and 0.3 give the same member.
+    """
+    canonical = {}
+    for key, value in set_params.items():
+        if isinstance(value, float):
+            value = float(f"{value:.{digits}g}")
+        canonical[str(key)] = value
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+def params_mapping(params_info:dict, set_params:dict):
+    """
+    Canonical JSON of the run_params.yaml entries of the parameters in set_params, only the fields
+    deciding how a value is applied. Format --> {key : {'name': .., 'file': .., 'adjust': ..}}
+    """
+    mapping = {}
+    for key in set_params:
+        info = (params_info or {}).get(key)
+        mapping[str(key)] = None if info is None else {field: info.get(field) for field in ('name', 'file', 'adjust')}
+    return json.dumps(mapping, sort_keys=True, default=str)
+
+def file_digest(path:str, chunk_size:int=1 << 20):
+    """
+    BLAKE2b digest of the content of a file.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    A cache of member results keyed on the content of the member: event_no, basin, the canonical set_params,
+    the run_params.yaml mapping of these parameters and the digests of its run_source inputs,
+    i.e. run_source/<event_no> and <basin>_params.
+
+    File digests are kept in an index validated by mtime and size, so only new or changed files are read,
+    and the digest of each source directory is computed once per ResultCache.
+
+    Parameters
+    ----------
+    db_path : str
+        SQLite database of the digest index and the cached results, e.g. <config_dir>/memo.db.
+    cache_dir : str
+        Directory keeping a copy of the frxst_pts_out.txt of every cached result, e.g. <result_dir>/.memo.
+    digits : int, optional, default=6
+        Significant digits of float parameters in the key.
+    """
+    def __init__(self, db_path:str, cache_dir:str, digits:int=6):
+        """
+        Open the database and create the schema.
+        """
+        self.db_path = db_path
+        self.cache_dir = cache_dir
+        self.digits = digits
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _tree_files(self, path):
+        """
+        Yield (relative path, absolute path, stat) of all files below path, following symlinks.
+        """
+        stack = [(path, '')]
+        while stack:
+            top, rel = stack.pop()
+            with os.scandir(top) as entries:
+                for entry in entries:
+                    rel_path = f"{rel}/{entry.name}" if rel else entry.name
+                    if entry.is_dir():
+                        stack.append((entry.path, rel_path))
+                    elif entry.is_file():
+                        yield rel_path, entry.path, entry.stat()
+
+    def source_digest(self, path:str):
+        """
+        Digest of a source file or directory tree, from the file names and contents.
+        Files whose mtime and size match the index are not read again.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self.digests:
+                return self.digests[path]
+            if not os.path.exists(path):
+                return None
+            files = [(os.path.basename(path), path, os.stat(path))] if os.path.isfile(path) else sorted(self._tree_files(path))
+            known = {row[0]: row[1:] for row in self.conn.execute(
+                "SELECT path, mtime_ns, size, digest FROM sources WHERE path >= ? AND path < ?", (path, path + '\uffff'))}
+            digest = hashlib.blake2b(digest_size=20)
+            updates = []
+            for rel_path, abs_path, stat in files:
+                entry = known.get(abs_path)
+                if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                    file_hash = entry[2]
+                else:
+                    file_hash = file_digest(abs_path)
+                    updates.append((abs_path, stat.st_mtime_ns, stat.st_size, file_hash))
+                digest.update(f"{rel_path}\0{file_hash}\n".encode())
+            if updates:
+                with self.conn:
+                    self.conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", updates)
+                logger.info(f"Hashed {len(updates)} new or changed files below {path}.")
+            self.digests[path] = digest.hexdigest()
+            return self.digests[path]
+
+    def key(self, runner):
+        """
+        Content key of a ModelRunner object, None if a source is missing.
+        """
+        run_digest = self.source_digest(runner.src_run_dir)
+        params_digest = self.source_digest(runner.src_params_dir)
+        if run_digest is None or params_digest is None:
+            return None
+        content = json.dumps({
+            'event_no': str(runner.event_no),
+            'basin': runner.basin,
+            'set_params': canonical_params(runner.set_params, self.digits),
+            'params_info': params_mapping(runner.params_info, runner.set_params),
+            'run_source': run_digest,
+            'params': params_digest,
+        }, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key:str):
+        """
+        Return the cached frxst_pts_out.txt of a key, None on a miss.
+        """
+        if key is None:
+            return None
+        with self._lock:
+            row = self.conn.execute("SELECT path FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key:str, result_file:str, job_id:str):
+        """
+        Cache a copy of the frxst_pts_out.txt of a completed member under key.
+        """
+        if key is None:
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, key + '.txt')
+        shutil.copy(result_file, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, job_id, path, time.time()))
+        logger.debug(f"Result of job {job_id} cached as {path}.")
+        return path
+
+    def refresh(self):
+        """
+        Forget the directory digests computed so far, e.g. after the run_source inputs changed.
+        """
+        with self._lock:
+            self.digests.clear()
@@ -0,0 +1,197 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   metrics.py
+@Create  :   2025-05-11 15:08:22
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Phases of a job in the order they happen, queue and run are observed by polling,
+# their resolution is the polling interval.
+PHASES = ['copy_folder', 'inital_params', 'stage', 'submit', 'queue', 'run', 'collect_frxst', 'memo',
+          'archive', 'cleanup']
+
+PERCENTILES = [50, 90, 95, 99]
+
+def summarize(records:list, percentiles:list=None):
+    """
+    Summarize phase records per phase.
+
+    Parameters
+    ----------
+    records : list
+        Phase records, see Metrics.observe or load_metrics.
+    percentiles : list, optional
+        Percentiles of the durations, defaults to PERCENTILES.
+
+    Returns
+    ----------
+    summary : dict
+        Format --> {phase : {'count': int, 'total': float, 'mean': float, 'p50': float, ..., 'max': float,
+                             'bytes': int, 'files': int}}, phases in the order of PHASES.
+    """
+    import numpy as np
+    percentiles = PERCENTILES if percentiles is None else percentiles
+    durations, counters = {}, {}
+    for record in records:
+        phase = record['phase']
+        durations.setdefault(phase, []).append(record['duration'])
+        counter = counters.setdefault(phase, {'bytes': 0, 'files': 0})
+        for key in counter:
+            counter[key] += record.get(key) or 0
+    order = PHASES + sorted(phase for phase in durations if phase not in PHASES)
+    summary = {}
+    for phase in order:
+        if phase not in durations:
+            continue
+        values = np.asarray(durations[phase], dtype=float)
+        stats = {'count': len(values), 'total': float(values.sum()), 'mean': float(values.mean())}
+        stats.update({f"p{q}": float(v) for q, v in zip(percentiles, np.percentile(values, percentiles))})
+        stats['max'] = float(values.max())
+        stats.update(counters[phase])
+        summary[phase] = stats
+    return summary
+
+def format_summary(summary:dict):
+    """
+    Format a summary as a text table, durations in seconds.
+    """
+    if not summary:
+        return "No phase records."
+    columns = [key for key in next(iter(summary.values())) if key not in ('bytes', 'files')]
+    header = f"{'phase':<14s}" + ''.join(f"{column:>11s}" for column in columns) + f"{'MiB':>11s}{'files':>9s}"
+    lines = [header, '-' * len(header)]
+    for phase, stats in summary.items():
+        cells = ''.join(f"{stats[column]:>11d}" if column == 'count' else f"{stats[column]:>11.3f}" for column in columns)
+        lines.append(f"{phase:<14s}{cells}{stats['bytes'] / 2**20:>11.1f}{stats['files']:>9d}")
+    return '\n'.join(lines)
+
+def load_metrics(path:str, job_ids:list=None):
+    """
+    Read the phase records of a JSON-lines metrics file, optionally only those of job_ids.
+    """
+    records = []
+    job_ids = None if job_ids is None else set(job_ids)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if job_ids is None or record.get('job_id') in job_ids:
+                records.append(record)
+    return records
+
+def _labels(labels:dict):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+class Metrics:
+    """
+    Collect the phase records of the jobs of a campaign, see ModelRunner.record_timing.
+
+    Every record is appended to a JSON-lines file as soon as the phase ends and kept in memory
+    for the Prometheus textfile and the summary report.
+
+    Parameters
+    ----------
+    jsonl_path : str, optional
+        JSON-lines file of the phase records, one record per line.
+        Format --> {'time': float, 'job_id': str, 'event_no': str, 'phase': str, 'start': float, 'duration': float,
+                    'bytes': int, 'files': int}
+    textfile : str, optional
+        Prometheus textfile written by write_prometheus, e.g. for the node_exporter textfile collector.
+    labels : dict, optional
+        Labels of all Prometheus metrics, e.g. {'campaign': 'obj'}.
+    """
+    def __init__(self, jsonl_path:str=None, textfile:str=None, labels:dict=None):
+        """
+        Initialize the metrics, the JSON-lines file is appended to.
+        """
+        self.jsonl_path = jsonl_path
+        self.textfile = textfile
+        self.labels = labels or {}
+        self.records = []
+        self._lock = threading.Lock()
+        for path in (jsonl_path, textfile):
+            if path is not None and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path is not None else None
+
+    def observe(self, phase:str, start:float, duration:float, job_id:str=None, event_no:str=None, **counters):
+        """
+        Record one phase of a job, job_id is None for phases of the scheduler, e.g. 'poll'.
+        """
+        record = {'time': time.time(), 'job_id': job_id, 'event_no': event_no, 'phase': phase,
+                  'start': start, 'duration': duration}
+        record.update(counters)
+        with self._lock:
+            self.records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record) + '\n')
+                self._file.flush()
+
+    def summary(self, percentiles:list=None):
+        """
+        Summarize the records collected so far, see summarize.
+        """
+        with self._lock:
+            records = list(self.records)
+        return summarize(records, percentiles=percentiles)
+
+    def write_prometheus(self, queue:dict=None):
+        """
+        Write the phase summaries and the queue state to the Prometheus textfile, atomically.
+
+        Parameters
+        ----------
+        queue : dict, optional
+            Number of jobs per scheduler state. Format --> {'running': int, 'waiting': int, ...}
+        """
+        if self.textfile is None:
+            return
+        summary = self.summary()
+        base = dict(self.labels)
+        lines = ['# HELP wrfhydro_phase_duration_seconds Wall-clock duration of the job phases.',
+                 '# TYPE wrfhydro_phase_duration_seconds summary']
+        for phase, stats in summary.items():
+            labels = dict(base, phase=phase)
+            for q in PERCENTILES:
+                lines.append(f"wrfhydro_phase_duration_seconds{{{_labels(dict(labels, quantile=q / 100))}}} {stats[f'p{q}']:.6f}")
+            lines.append(f"wrfhydro_phase_duration_seconds_sum{{{_labels(labels)}}} {stats['total']:.6f}")
+            lines.append(f"wrfhydro_phase_duration_seconds_count{{{_labels(labels)}}} {stats['count']}")
+        for key, help_text in (('bytes', 'Bytes copied or written'), ('files', 'Files copied, written or removed')):
+            lines.append(f"# HELP wrfhydro_phase_{key}_total {help_text} by the job phases.")
+            lines.append(f"# TYPE wrfhydro_phase_{key}_total counter")
+            for phase, stats in summary.items():
+                lines.append(f"wrfhydro_phase_{key}_total{{{_labels(dict(base, phase=phase))}}} {stats[key]}")
+        if queue is not None:
+            lines.append('# HELP wrfhydro_jobs Number of jobs per scheduler state.')
+            lines.append('# TYPE wrfhydro_jobs gauge')
+            for state, count in queue.items():
+                lines.append(f"wrfhydro_jobs{{{_labels(dict(base, state=state))}}} {count}")
+        lines.append('# HELP wrfhydro_metrics_updated_seconds Time of the last update.')
+        lines.append('# TYPE wrfhydro_metrics_updated_seconds gauge')
+        lines.append(f"wrfhydro_metrics_updated_seconds{{{_labels(base)}}} {time.time():.3f}")
+        tmp_path = self.textfile + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.textfile)
+
+    def close(self):
+        """
+        Close the JSON-lines file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   nc_cache.py
+@Create  :   2025-04-22 14:05:48
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import logging
+import threading
+from collections import OrderedDict
+import xarray as xr
+
+logger = logging.getLogger(__name__)
+
+# Whole netCDF file operations of threads, e.g. decoding a base file or writing an adjusted one, are serialized
+# with NC_FILE_LOCK. xarray only locks the data reads and writes, not reading the attributes while a file
+# is opened, and HDF5 fails on concurrent calls. It is taken before adjust_params.NC_LOCK, which xarray
+# takes itself for every library call, so NC_LOCK is never held around xarray calls.
+NC_FILE_LOCK = threading.RLock()
+
+class DatasetCache:
+    """
+    An LRU cache of decoded base parameter datasets, e.g. the .nc0 files of a <basin>_params directory.
+
+    Entries are keyed by the absolute file path and validated against the file mtime and size,
+    the cached arrays are read-only and every get() hands out a shallow copy of the dataset.
+
+    Parameters
+    ----------
+    max_bytes : int, optional, default=2 GiB
+        Byte budget of all cached datasets, the least recently used ones are evicted first.
+    """
+    def __init__(self, max_bytes:int=2 * 1024**3):
+        """
+        Initialize an empty cache.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _load(self, path):
+        """
+        Decode the whole dataset into memory and release the file handle.
+        """
+        with NC_FILE_LOCK, xr.open_dataset(path) as ds:
+            ds = ds.load()
+        for var in ds.data_vars.values():
+            var.values.flags.writeable = False
+        return ds
+
+    def _evict(self):
+        """
+        Evict the least recently used datasets until the cache fits into max_bytes.
+        """
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            path, (_, ds) = self.entries.popitem(last=False)
+            self.nbytes -= ds.nbytes
+            logger.info(f"Evicted {path} from the dataset cache.")
+
+    def get(self, path:str):
+        """
+        Return a shallow copy of the dataset in path, decoding the file only if it is not cached or changed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1].copy(deep=False)
+
+            self.misses += 1
+            if entry is not None:
+                self.nbytes -= entry[1].nbytes
+                logger.info(f"File {path} changed, reloading.")
+            ds = self._load(path)
+            self.entries[path] = (key, ds)
+            self.nbytes += ds.nbytes
+            self._evict()
+            logger.debug(f"Dataset cache holds {len(self.entries)} files, {self.nbytes} bytes.")
+            return ds.copy(deep=False)
+
+    def clear(self):
+        """
+        Drop all cached datasets.
+        """
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+# Cache shared by all nc_params calls of the driver process
+BASE_CACHE = DatasetCache()
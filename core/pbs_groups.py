@@ -0,0 +1,196 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   pbs_groups.py
+@Create  :   2025-04-26 10:18:37
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import re
+import logging
+from .backends import make_backend
+
+logger = logging.getLogger(__name__)
+
+# job name and array options of the directives, never copied from a member's script
+SKIP_FLAGS = {'#PBS': ('-N', '-J', '-t'), '#SBATCH': ('-J', '--job-name', '-a', '--array')}
+
+# resource options replaced by the resources of a bundle
+RESOURCE_FLAGS = {'#PBS': ('-l',), '#SBATCH': ('-N', '--nodes', '-n', '--ntasks', '--ntasks-per-node', '-c',
+                                              '--cpus-per-task', '--mem', '--mem-per-cpu', '-t', '--time')}
+
+def _flag(line:str):
+    """
+    Option of a directive line, e.g. '#SBATCH --time=01:00:00' -> '--time', None for other lines.
+    """
+    fields = line.split()
+    return fields[1].split('=')[0] if len(fields) >= 2 else None
+
+def pbs_header(pbs_script:str, name:str, directive:str='#PBS'):
+    """
+    Return the '#PBS' or '#SBATCH' directives of a member's job script, with its job name replaced by name.
+
+    Parameters
+    ----------
+    pbs_script : str
+        Path to the member's job script, e.g. <job_dir>/Hydrojob.pbs.
+    name : str
+        Job name of the group.
+    directive : str, optional, default='#PBS'
+        '#PBS' or '#SBATCH', the directive of the backend submitting the group.
+    """
+    header = []
+    with open(pbs_script, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(directive + ' ') and _flag(line) not in SKIP_FLAGS[directive]:
+                header.append(line.rstrip('\n'))
+    if not header:
+        logger.warning(f"{pbs_script} has no {directive} directives, {name} runs with the defaults of the queue.")
+    header.append(f"#PBS -N {name}" if directive == '#PBS' else f"#SBATCH --job-name={name}")
+    return header
+
+def member_command(job_dir:str, pbs_script:str, exit_file:str):
+    """
+    Shell commands running one member's PBS script in its job directory and recording its exit status.
+    """
+    return (f'(cd "{job_dir}" && PBS_O_WORKDIR="{job_dir}" bash "./{pbs_script}"; '
+            f'echo $? > "{job_dir}/{exit_file}.tmp" && mv "{job_dir}/{exit_file}.tmp" "{job_dir}/{exit_file}")')
+
+def write_array_script(runners:list, group_dir:str, name:str, array_flag:str='-J'):
+    """
+    Write a job array script whose sub-job i runs the i-th member, and the index -> job_dir map next to it.
+
+    Returns
+    ----------
+    script : str
+        Path to the job array script.
+    """
+    map_file = os.path.join(group_dir, name + '.map')
+    with open(map_file, 'w', encoding='utf-8') as f:
+        for runner in runners:
+            f.write(runner.job_dir + '\n')
+
+    first = runners[0]
+    lines = ['#!/bin/bash']
+    lines += pbs_header(os.path.join(first.job_dir, first.pbs_script), name)
+    lines.append(f"#PBS {array_flag} 0-{len(runners) - 1}")
+    lines.append('')
+    # PBS Pro sets PBS_ARRAY_INDEX, Torque PBS_ARRAYID
+    lines.append('INDEX=${PBS_ARRAY_INDEX:-$PBS_ARRAYID}')
+    lines.append(f'JOB_DIR=$(sed -n "$((INDEX + 1))p" "{map_file}")')
+    lines.append(member_command('$JOB_DIR', first.pbs_script, first.exit_file))
+
+    script = os.path.join(group_dir, name + '.pbs')
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return script
+
+def submit_array(runners:list, group_dir:str, array_flag:str='-J', backend=None):
+    """
+    Submit staged members as one PBS job array, qsub -J (PBS Pro) or qsub -t (Torque).
+    Each member gets the PBS ID of its sub-job, e.g. '1234[0].server'.
+
+    Parameters
+    ----------
+    runners : list
+        List of staged ModelRunner objects, all sharing the same PBS resources.
+    group_dir : str
+        Directory for the job array script and the index -> job_dir map.
+    array_flag : str, optional, default='-J'
+    backend : optional
+        Execution backend supporting job arrays, defaults to backends.PBSBackend.
+
+    Returns
+    ----------
+    group_id : str
+        PBS ID of the job array, e.g. '1234[].server'.
+    """
+    if backend is None:
+        backend = make_backend('pbs')
+    os.makedirs(group_dir, exist_ok=True)
+    name = f"array_{runners[0].job_id}_{len(runners)}"
+    script = write_array_script(runners, group_dir, name, array_flag=array_flag)
+    logger.info(f"Submitting job array {script} with {len(runners)} members ...")
+    group_id = backend.submit(script, group_dir)
+
+    match = re.match(r"^([^\[]+)\[\](.*)$", group_id)
+    if match is None:
+        raise RuntimeError(f"Unexpected job array ID from qsub: {group_id}")
+    for index, runner in enumerate(runners):
+        runner.group_id = group_id
+        runner.pbs_id = f"{match.group(1)}[{index}]{match.group(2)}"
+        logger.info(f"Job {runner.job_id} submitted as sub-job {runner.pbs_id}.")
+    return group_id
+
+def write_bundle_script(runners:list, group_dir:str, name:str, parallel:int=None, resources:list=None,
+                        directive:str='#PBS'):
+    """
+    Write a PBS or Slurm script running several members inside one allocation, at most parallel at a time.
+
+    Returns
+    ----------
+    script : str
+        Path to the bundle script.
+    """
+    first = runners[0]
+    header = pbs_header(os.path.join(first.job_dir, first.pbs_script), name, directive=directive)
+    if resources is not None:
+        header = ([line for line in header if _flag(line) not in RESOURCE_FLAGS[directive]]
+                  + [f"{directive} {resource}" for resource in resources])
+    parallel = len(runners) if parallel is None else max(1, parallel)
+
+    lines = ['#!/bin/bash'] + header + ['']
+    lines.append(f"MAX_PARALLEL={parallel}")
+    for runner in runners:
+        lines.append(member_command(runner.job_dir, runner.pbs_script, runner.exit_file) + ' &')
+        lines.append('while [ "$(jobs -rp | wc -l)" -ge "$MAX_PARALLEL" ]; do wait -n; done')
+    lines.append('wait')
+
+    script = os.path.join(group_dir, name + '.pbs')
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return script
+
+def submit_bundle(runners:list, group_dir:str, parallel:int=None, resources:list=None, backend=None):
+    """
+    Submit staged members as one PBS or Slurm job running them concurrently or back-to-back on the allocated cores.
+    All members share the PBS ID of the bundle, each records its own exit status.
+
+    Parameters
+    ----------
+    runners : list
+        List of staged ModelRunner objects.
+    group_dir : str
+        Directory for the bundle script.
+    parallel : int, optional
+        Number of members running at the same time, defaults to all, 1 runs them back-to-back.
+    resources : list, optional
+        Resource requests of the bundle replacing the member's, e.g. ['-l nodes=1:ppn=24'] replacing the '-l'
+        directives for PBS or ['--nodes=1', '--ntasks=24'] replacing the node, task, memory and time options for Slurm.
+    backend : optional
+        Execution backend with job script directives, defaults to backends.PBSBackend.
+
+    Returns
+    ----------
+    group_id : str
+        PBS ID of the bundle.
+    """
+    if backend is None:
+        backend = make_backend('pbs')
+    if backend.directive is None:
+        raise ValueError(f"The {backend.name} backend ignores job script directives, a bundle cannot request "
+                         f"its resources from it.")
+    os.makedirs(group_dir, exist_ok=True)
+    name = f"bundle_{runners[0].job_id}_{len(runners)}"
+    script = write_bundle_script(runners, group_dir, name, parallel=parallel, resources=resources,
+                                 directive=backend.directive)
+    logger.info(f"Submitting bundle {script} with {len(runners)} members ...")
+    group_id = backend.submit(script, group_dir)
+    for runner in runners:
+        runner.group_id = group_id
+        runner.pbs_id = group_id
+        logger.info(f"Job {runner.job_id} submitted in bundle {group_id}.")
+    return group_id
@@ -15,19 +15,6 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-########
-# Configure logging to output to the console (terminal)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.FileHandler('main.log'),
-        logging.StreamHandler()
-    ]
-)
-#################
-
 
 
 def read_yaml(filepath, paramlist):
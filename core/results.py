@@ -0,0 +1,245 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   results.py
+@Create  :   2025-04-29 10:12:45
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import xarray as xr
+from .adjust_params import NC_LOCK, NC_FILE_LOCK
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+logger = logging.getLogger(__name__)
+
+# columns of frxst_pts_out.txt, feature_id is the gauge / station index of the frxst points
+FRXST_COLUMNS = ['seconds', 'time', 'gauge', 'lon', 'lat', 'q_cms', 'q_cfs', 'stage']
+
+TIME_UNITS = 'seconds since 1970-01-01 00:00:00'
+
+_CUBE_LOCK = threading.Lock()
+
+# axes and job_id -> row of every cube written by this process, so that appending a member reads neither
+# the job_id variable nor the axes again. Format --> {realpath : {'inode', 'jobs', 'rows', 'times', 'gauges'}}
+_CUBE_INDEX = {}
+
+def read_frxst(path:str):
+    """
+    Read a frxst_pts_out.txt file with one vectorized CSV parse.
+
+    Parameters
+    ----------
+    path : str
+        Path to frxst_pts_out.txt.
+
+    Returns
+    ----------
+    times : np.ndarray
+        Sorted output times, datetime64[s].
+    gauges : np.ndarray
+        Gauge IDs as strings, in the order of the file.
+    q : np.ndarray
+        Discharge in m3/s, float32 with shape (gauge, time), NaN where a gauge has no output.
+    """
+    df = pd.read_csv(path, header=None, names=FRXST_COLUMNS, usecols=['time', 'gauge', 'q_cms'],
+                     skipinitialspace=True, dtype={'time': str, 'gauge': str, 'q_cms': np.float32})
+    times = pd.to_datetime(df['time'].str.strip(), format='%Y-%m-%d_%H:%M:%S')
+    t_codes, t_values = pd.factorize(times, sort=True)
+    g_codes, g_values = pd.factorize(df['gauge'].str.strip(), sort=False)
+    q = np.full((len(g_values), len(t_values)), np.nan, dtype=np.float32)
+    q[g_codes, t_codes] = df['q_cms'].to_numpy()
+    return np.asarray(t_values, dtype='datetime64[s]'), np.asarray(g_values, dtype=str), q
+
+def _create_cube(path, times, gauges, attrs):
+    """
+    Create an empty result cube with an unlimited job dimension.
+    """
+    nc = netCDF4.Dataset(path, 'w')
+    nc.createDimension('job', None)
+    nc.createDimension('gauge', len(gauges))
+    nc.createDimension('time', len(times))
+    var = nc.createVariable('time', 'i8', ('time',))
+    var.units = TIME_UNITS
+    var[:] = times.astype('datetime64[s]').astype('i8')
+    var = nc.createVariable('gauge', str, ('gauge',))
+    for i, gauge in enumerate(gauges):
+        var[i] = gauge
+    nc.createVariable('job_id', str, ('job',))
+    nc.createVariable('set_params', str, ('job',))
+    var = nc.createVariable('q_cms', 'f4', ('job', 'gauge', 'time'), zlib=True, complevel=1,
+                            chunksizes=(1, len(gauges), len(times)), fill_value=np.float32(np.nan))
+    var.units = 'm3 s-1'
+    var.long_name = 'streamflow at the frxst points'
+    for key, value in attrs.items():
+        setattr(nc, key, value)
+    return nc
+
+def _cube_index(nc, path:str):
+    """
+    Return the index of an open result cube, rebuilt from the file only when it was created anew
+    or its job dimension was changed by another process.
+    """
+    key = os.path.realpath(path)
+    inode = os.stat(path).st_ino
+    jobs = len(nc.dimensions['job'])
+    index = _CUBE_INDEX.get(key)
+    if index is None or index['inode'] != inode or index['jobs'] != jobs:
+        index = {'inode': inode, 'jobs': jobs,
+                 'rows': {job_id: i for i, job_id in enumerate(nc['job_id'][:])} if jobs else {},
+                 'times': nc['time'][:].astype('i8'),
+                 'gauges': {gauge: i for i, gauge in enumerate(nc['gauge'][:])}}
+        _CUBE_INDEX[key] = index
+    return index
+
+def append_cube(path:str, job_id:str, times, gauges, q, set_params:dict=None, attrs:dict=None, overwrite:bool=True):
+    """
+    Append the output of one member to a result cube q_cms(job, gauge, time), creating the cube if needed.
+
+    The time and gauge axes are fixed by the first member, the output of later members is aligned to them:
+    times or gauges missing from a member are NaN, those outside the cube are dropped.
+    A job already in the cube, e.g. a rerun, is overwritten in its row, a job ID never gets a second row.
+    Each parameter of set_params is also stored as a numeric variable param_<name>(job), NaN for members not setting it.
+    The rows and axes of the cube are kept in memory, so an append only writes the row of the member.
+
+    Parameters
+    ----------
+    path : str
+        Path to the result cube, e.g. <result_dir>/<event_no>_frxst.nc.
+    job_id : str
+    times, gauges, q :
+        The output of the member, see read_frxst.
+    set_params : dict, optional
+        The parameters of the member, stored as JSON.
+    attrs : dict, optional
+        Global attributes set when the cube is created, e.g. the event number.
+    overwrite : bool, optional, default=True
+        Overwrite a job already in the cube, False raises a ValueError instead.
+
+    Returns
+    ----------
+    index : int
+        Index of the member along the job dimension.
+    """
+    if netCDF4 is None:
+        raise ImportError("netCDF4 is required to write result cubes.")
+    set_params = set_params or {}
+    with _CUBE_LOCK, NC_FILE_LOCK, NC_LOCK:
+        if os.path.exists(path):
+            nc = netCDF4.Dataset(path, 'a')
+        else:
+            nc = _create_cube(path, times, gauges, attrs or {})
+        try:
+            cube = _cube_index(nc, path)
+            if job_id in cube['rows'] and not overwrite:
+                raise ValueError(f"Job {job_id} is already stored in {path} at index {cube['rows'][job_id]}.")
+            index = cube['rows'].get(job_id, cube['jobs'])
+            cube_times = cube['times']
+            g_map = cube['gauges']
+
+            t_pos = np.searchsorted(cube_times, np.asarray(times, dtype='datetime64[s]').astype('i8'))
+            t_pos = np.minimum(t_pos, len(cube_times) - 1)
+            t_ok = cube_times[t_pos] == np.asarray(times, dtype='datetime64[s]').astype('i8')
+            g_pos = np.array([g_map.get(str(gauge), -1) for gauge in gauges], dtype=int)
+            g_ok = g_pos >= 0
+
+            values = np.full((len(g_map), len(cube_times)), np.nan, dtype=np.float32)
+            values[np.ix_(g_pos[g_ok], t_pos[t_ok])] = np.asarray(q, dtype=np.float32)[np.ix_(g_ok, t_ok)]
+            if not (t_ok.all() and g_ok.all()):
+                logger.warning(f"Output of job {job_id} does not match the axes of {path}, "
+                               f"{(~t_ok).sum()} times and {(~g_ok).sum()} gauges dropped.")
+
+            nc['job_id'][index] = job_id
+            nc['set_params'][index] = json.dumps(set_params, sort_keys=True, default=str)
+            nc['q_cms'][index, :, :] = values
+            for name, value in set_params.items():
+                var_name = f"param_{name}"
+                if var_name not in nc.variables:
+                    nc.createVariable(var_name, 'f8', ('job',), fill_value=np.nan)
+                try:
+                    nc[var_name][index] = float(value)
+                except (TypeError, ValueError):
+                    logger.debug(f"Parameter {name} of job {job_id} is not numeric, only stored as JSON.")
+            cube['rows'][job_id] = index
+            cube['jobs'] = len(nc.dimensions['job'])
+        finally:
+            nc.close()
+    logger.info(f"Output of job {job_id} stored in {path} at index {index}.")
+    return index
+
+def load_cube(path:str, job_ids:list=None, lazy:bool=False, chunks:dict=None):
+    """
+    Load a result cube, or only the members job_ids, into memory.
+
+    Parameters
+    ----------
+    path : str
+    job_ids : list, optional
+        Members to read, defaults to all.
+    lazy : bool, optional, default=False
+        Return the cube still open, q_cms is only read where it is indexed, e.g. ds['q_cms'].sel(gauge='1').
+        Close it with ds.close(), reads of an open cube are not serialized with append_cube.
+    chunks : dict, optional
+        Chunks of xr.open_dataset for dask arrays, e.g. {'job': 100}, implies lazy.
+
+    Returns
+    ----------
+    ds : xr.Dataset
+        q_cms(job, gauge, time) indexed by job ID, gauge ID and time,
+        the numeric parameters as param_<name>(job) and their JSON as set_params(job).
+    """
+    # xarray takes the netCDF/HDF5 locks itself
+    with NC_FILE_LOCK:
+        ds = xr.open_dataset(path, decode_times=False, chunks=chunks)
+        try:
+            ds = ds.assign_coords(time=pd.to_datetime(ds['time'].values, unit='s'), job=ds['job_id'].values)
+            ds = ds.drop_vars('job_id')
+            if job_ids is not None:
+                ds = ds.sel(job=list(job_ids))
+            if lazy or chunks is not None:
+                return ds
+            loaded = ds.load()
+        finally:
+            if not (lazy or chunks is not None):
+                ds.close()
+    return loaded
+
+def cube_params(ds:xr.Dataset):
+    """
+    Return the set_params of every member of a loaded result cube. Format --> {job_id : set_params}
+    """
+    return {job_id: json.loads(params) for job_id, params in zip(ds['job'].values, ds['set_params'].values)}
+
+def read_member(path:str, job_id:str=None):
+    """
+    Read the output of one member from a copied frxst_pts_out.txt or from a result cube.
+
+    Returns
+    ----------
+    q : xr.DataArray
+        Discharge in m3/s with the dimensions (gauge, time).
+    """
+    if not path.endswith('.nc'):
+        times, gauges, q = read_frxst(path)
+        return xr.DataArray(q, coords={'gauge': gauges, 'time': times}, dims=['gauge', 'time'], name='q_cms')
+    if netCDF4 is None:
+        raise ImportError("netCDF4 is required to read result cubes.")
+    # only the row of the member is read, its index is kept by _cube_index
+    with _CUBE_LOCK, NC_FILE_LOCK, NC_LOCK, netCDF4.Dataset(path, 'r') as nc:
+        cube = _cube_index(nc, path)
+        if job_id not in cube['rows']:
+            raise KeyError(f"Job {job_id} is not stored in {path}.")
+        q = np.ma.filled(nc['q_cms'][cube['rows'][job_id], :, :], np.nan).astype(np.float32)
+    return xr.DataArray(q, coords={'gauge': list(cube['gauges']), 'time': pd.to_datetime(cube['times'], unit='s')},
+                        dims=['gauge', 'time'], name='q_cms')
@@ -0,0 +1,253 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   scoring.py
+@Create  :   2025-04-30 09:47:16
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import logging
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+logger = logging.getLogger(__name__)
+
+METRICS = ['nse', 'kge', 'lognse', 'peak_error', 'peak_timing']
+
+def _prepare(sim, obs):
+    """
+    Broadcast sim and obs, mask the time steps where one of them is missing and compute the shared moments.
+    Masked values are set to zero, so that plain sums over the time axis only count the valid steps.
+    """
+    sim, obs = np.broadcast_arrays(np.asarray(sim, dtype=np.float64), np.asarray(obs, dtype=np.float64))
+    valid = np.isfinite(sim) & np.isfinite(obs)
+    sim = np.where(valid, sim, 0.0)
+    obs = np.where(valid, obs, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = valid.sum(axis=-1)
+        mean_s = sim.sum(axis=-1) / n
+        mean_o = obs.sum(axis=-1) / n
+    return {'sim': sim, 'obs': obs, 'valid': valid, 'n': n, 'mean_s': mean_s, 'mean_o': mean_o}
+
+def _dot(a, b):
+    """
+    Sum of a * b along the last axis without a temporary array.
+    """
+    return np.einsum('...t,...t->...', a, b)
+
+def _deviations(p):
+    """
+    Deviations of sim and obs from their means, zero at masked steps, computed once per _prepare.
+    """
+    if 'dev_s' not in p:
+        p['dev_s'] = np.where(p['valid'], p['sim'] - p['mean_s'][..., None], 0.0)
+        p['dev_o'] = np.where(p['valid'], p['obs'] - p['mean_o'][..., None], 0.0)
+    return p['dev_s'], p['dev_o']
+
+def _nse(p):
+    _, dev_o = _deviations(p)
+    error = p['sim'] - p['obs']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 1 - _dot(error, error) / _dot(dev_o, dev_o)
+
+def _kge(p):
+    dev_s, dev_o = _deviations(p)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std_s = np.sqrt(_dot(dev_s, dev_s) / p['n'])
+        std_o = np.sqrt(_dot(dev_o, dev_o) / p['n'])
+        r = _dot(dev_s, dev_o) / p['n'] / (std_s * std_o)
+        return 1 - np.sqrt((r - 1) ** 2 + (std_s / std_o - 1) ** 2 + (p['mean_s'] / p['mean_o'] - 1) ** 2)
+
+def _lognse(p, eps=None):
+    if eps is None:
+        eps = p['mean_o'] / 100
+    eps = np.broadcast_to(eps, p['mean_o'].shape)[..., None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_s = np.where(p['valid'], np.log(np.maximum(p['sim'], 0) + eps), np.nan)
+        log_o = np.where(p['valid'], np.log(np.maximum(p['obs'], 0) + eps), np.nan)
+    return _nse(_prepare(log_s, log_o))
+
+def _peaks(p):
+    """
+    Index and value of the simulated and observed peaks, -1 / NaN where nothing is valid.
+    """
+    if 'peaks' in p:
+        return p['peaks']
+    i_sim = np.argmax(np.where(p['valid'], p['sim'], -np.inf), axis=-1)
+    i_obs = np.argmax(np.where(p['valid'], p['obs'], -np.inf), axis=-1)
+    missing = p['n'] == 0
+    max_s = np.where(missing, np.nan, np.take_along_axis(p['sim'], i_sim[..., None], axis=-1)[..., 0])
+    max_o = np.where(missing, np.nan, np.take_along_axis(p['obs'], i_obs[..., None], axis=-1)[..., 0])
+    p['peaks'] = np.where(missing, -1, i_sim), np.where(missing, -1, i_obs), max_s, max_o, missing
+    return p['peaks']
+
+def _peak_error(p):
+    _, _, max_s, max_o, _ = _peaks(p)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error = (max_s - max_o) / max_o
+    return np.where(np.isfinite(error), error, np.nan)
+
+def _peak_timing(p, times=None):
+    i_sim, i_obs, _, _, missing = _peaks(p)
+    if times is None:
+        error = (i_sim - i_obs).astype(np.float64)
+    else:
+        times = np.asarray(times, dtype='datetime64[s]')
+        hours = (times - times[0]).astype(np.float64) / 3600
+        error = hours[i_sim] - hours[i_obs]
+    return np.where(missing, np.nan, error)
+
+def nse(sim, obs):
+    """
+    Nash-Sutcliffe efficiency along the last (time) axis, time steps missing in sim or obs are ignored.
+    """
+    return _nse(_prepare(sim, obs))
+
+def lognse(sim, obs, eps:float=None):
+    """
+    Nash-Sutcliffe efficiency of log(q + eps) along the last (time) axis,
+    eps defaults to 1 % of the mean observed discharge.
+    """
+    return _lognse(_prepare(sim, obs), eps=eps)
+
+def kge(sim, obs):
+    """
+    Kling-Gupta efficiency (Gupta et al., 2009) along the last (time) axis.
+    """
+    return _kge(_prepare(sim, obs))
+
+def peak_error(sim, obs):
+    """
+    Relative error of the simulated peak discharge, (max(sim) - max(obs)) / max(obs).
+    """
+    return _peak_error(_prepare(sim, obs))
+
+def peak_timing(sim, obs, times=None):
+    """
+    Timing error of the simulated peak, positive if it is late, in hours if times are given, else in time steps.
+    """
+    return _peak_timing(_prepare(sim, obs), times=times)
+
+def _period_slice(period):
+    """
+    Convert a ModelRunner.period dict to a time slice.
+    """
+    if period is None:
+        return slice(None, None)
+    start = period.get('start')
+    end = period.get('end')
+    return slice(None if start is None else pd.Timestamp(start), None if end is None else pd.Timestamp(end))
+
+def align(sim:xr.DataArray, obs, period:dict=None):
+    """
+    Align simulated and observed discharge on their common gauges and times within period.
+
+    Parameters
+    ----------
+    sim : xr.DataArray
+        Simulated discharge with the dimensions (..., gauge, time), e.g. load_cube(path)['q_cms'].
+    obs : xr.DataArray, pd.DataFrame or pd.Series
+        Observed discharge, a DataArray (gauge, time), a DataFrame indexed by time with one column per gauge,
+        or a Series indexed by time for a single gauge matching all simulated gauges.
+    period : dict, optional
+        Scoring period, e.g. ModelRunner.period. Format --> {'start': str or datetime, 'end': str or datetime}
+
+    Returns
+    ----------
+    sim, obs : xr.DataArray
+        The aligned discharge.
+    """
+    if isinstance(obs, pd.Series):
+        obs = xr.DataArray(obs.to_numpy(dtype=np.float64), coords={'time': pd.DatetimeIndex(obs.index)}, dims=['time'])
+    elif isinstance(obs, pd.DataFrame):
+        obs = xr.DataArray(obs.to_numpy(dtype=np.float64).T,
+                           coords={'gauge': [str(col) for col in obs.columns], 'time': pd.DatetimeIndex(obs.index)},
+                           dims=['gauge', 'time'])
+    time_slice = _period_slice(period)
+    sim = sim.sel(time=time_slice)
+    obs = obs.sel(time=time_slice)
+    if 'gauge' in obs.dims:
+        sim, obs = xr.align(sim, obs, join='inner', exclude=[dim for dim in sim.dims if dim not in ('gauge', 'time')])
+    else:
+        sim, obs = xr.align(sim, obs, join='inner', exclude=[dim for dim in sim.dims if dim != 'time'])
+    if sim.sizes['time'] == 0:
+        logger.warning("Simulated and observed discharge have no common time in the scoring period.")
+    return sim, obs
+
+def _score_block(sim, obs, metrics, times):
+    """
+    Compute the metrics of one block of members.
+    """
+    p = _prepare(sim, obs)
+    functions = {
+        'nse': lambda: _nse(p),
+        'kge': lambda: _kge(p),
+        'lognse': lambda: _lognse(p),
+        'peak_error': lambda: _peak_error(p),
+        'peak_timing': lambda: _peak_timing(p, times=times),
+    }
+    return {metric: functions[metric]() for metric in metrics}
+
+def score(sim:xr.DataArray, obs, period:dict=None, metrics:list=None, block_size:int=1 << 20):
+    """
+    Score every member and gauge against the observed discharge in one vectorized pass.
+
+    Parameters
+    ----------
+    sim : xr.DataArray
+        Simulated discharge with the dimensions (..., gauge, time), e.g. load_cube(path)['q_cms'] of one event.
+    obs : xr.DataArray, pd.DataFrame or pd.Series
+        Observed discharge, see align.
+    period : dict, optional
+        Scoring period, e.g. ModelRunner.period.
+    metrics : list, optional
+        Subset of METRICS, defaults to all of them.
+    block_size : int, optional, default=1 << 20
+        Approximate number of values scored at once, members are processed in blocks along the first dimension
+        so that the temporary arrays stay small.
+
+    Returns
+    ----------
+    scores : xr.Dataset
+        One variable per metric with the dimensions (..., gauge), e.g. (job, gauge).
+        peak_timing is in hours, positive if the simulated peak is late.
+    """
+    metrics = METRICS if metrics is None else metrics
+    sim, obs = align(sim, obs, period=period)
+    obs = obs.transpose(*[dim for dim in sim.dims if dim in obs.dims])
+    # obs broadcasts against sim, e.g. (gauge, time) against (job, gauge, time)
+    o = obs.values if obs.dims == sim.dims[-obs.ndim:] else obs.broadcast_like(sim).transpose(*sim.dims).values
+    s = sim.values
+    times = sim['time'].values
+
+    if s.ndim > o.ndim and s.size > 0:
+        step = max(1, block_size // max(1, s[0].size))
+        blocks = [_score_block(s[i:i + step], o, metrics, times) for i in range(0, s.shape[0], step)]
+        values = {metric: np.concatenate([block[metric] for block in blocks]) for metric in metrics}
+    else:
+        values = _score_block(s, o, metrics, times)
+    dims = sim.dims[:-1]
+    coords = {dim: sim[dim].values for dim in dims if dim in sim.coords}
+    scores = xr.Dataset({metric: (dims, values[metric]) for metric in metrics}, coords=coords)
+    scores.attrs['n_times'] = sim.sizes['time']
+    return scores
+
+def rank(scores:xr.Dataset, metric:str='nse', gauge:str=None, ascending:bool=False):
+    """
+    Rank the members by one metric, averaged over all gauges unless gauge is given.
+    peak_error and peak_timing are ranked by their absolute value, smallest first.
+
+    Returns
+    ----------
+    ranking : pd.Series
+        The metric indexed by job ID, best member first.
+    """
+    values = scores[metric]
+    if metric in ('peak_error', 'peak_timing'):
+        values = abs(values)
+        ascending = True
+    values = values.sel(gauge=gauge) if gauge is not None else values.mean('gauge', skipna=True)
+    return values.to_series().sort_values(ascending=ascending, na_position='last')
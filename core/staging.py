@@ -0,0 +1,276 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   staging.py
+@Create  :   2025-04-21 09:32:10
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import shutil
+import logging
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Per-file staging policy used by the 'hardlink' and 'symlink' stage modes, first matching pattern wins.
+# Patterns are matched against the path relative to the event directory.
+#   'skip' : not staged, the file is always written by ModelRunner.inital_params
+#   'copy' : materialised as a real copy, the file may be modified inside the job directory
+#   'link' : read-only input shared with the event directory
+STAGE_POLICY = [
+    ('DOMAIN/Fulldom_hires.nc', 'skip'),
+    ('DOMAIN/hydro2dtbl.nc', 'skip'),
+    ('DOMAIN/soil_properties.nc', 'skip'),
+    ('DOMAIN/GWBUCKPARM.nc', 'skip'),
+    ('CHANPARM.TBL', 'skip'),
+    ('*.pbs', 'copy'),
+    ('namelist.hrldas', 'copy'),
+    ('hydro.namelist', 'copy'),
+    ('frxst_pts_out.txt', 'copy'),
+    ('diag_hydro.*', 'copy'),
+    ('*', 'link'),
+]
+
+STAGE_MODES = ['copy', 'hardlink', 'symlink']
+
+def match_policy(rel_path:str, policy:list):
+    """
+    Return the action of the first pattern in policy matching rel_path, 'copy' if none matches.
+    """
+    for pattern, action in policy:
+        if fnmatch.fnmatchcase(rel_path, pattern):
+            return action
+    return 'copy'
+
+def link_file(src:str, dst:str, mode:str='hardlink'):
+    """
+    Link dst to src with a hardlink or a symlink, falling back to a copy when linking fails,
+    e.g. for a hardlink across filesystems.
+
+    Returns
+    ----------
+    action : str
+        'link' if the file was linked, 'copy' if it was copied.
+    """
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+        elif mode == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+        else:
+            raise ValueError(f"Invalid link mode '{mode}'. Use 'hardlink' or 'symlink'.")
+        return 'link'
+    except OSError as e:
+        logger.debug(f"Failed to {mode} {src} to {dst}: {e}. Copying instead.")
+        shutil.copy2(src, dst)
+        return 'copy'
+
+def place_file(src:str, dst:str, mode:str='copy'):
+    """
+    Place src at dst as a copy or a link, replacing dst if it exists.
+
+    Returns
+    ----------
+    action : str
+        'link' if the file was linked, 'copy' if it was copied.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == 'copy':
+        shutil.copy(src, dst)
+        return 'copy'
+    return link_file(src, dst, mode)
+
+def _stage_dir(src_dir, dst_dir, rel_dir, mode, policy, counts):
+    """
+    Recursively stage the content of src_dir into dst_dir.
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    with os.scandir(src_dir) as entries:
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            dst_path = os.path.join(dst_dir, entry.name)
+            if entry.is_dir():
+                _stage_dir(entry.path, dst_path, rel_path, mode, policy, counts)
+                continue
+            action = match_policy(rel_path, policy)
+            if action == 'skip':
+                counts['skip'] += 1
+            elif action == 'link':
+                counts[link_file(entry.path, dst_path, mode)] += 1
+            else:
+                shutil.copy2(entry.path, dst_path)
+                counts['copy'] += 1
+                counts['bytes'] += entry.stat().st_size
+
+def stage_tree(src:str, dst:str, mode:str='copy', policy:list=None):
+    """
+    Stage an event directory into a job directory.
+
+    Parameters
+    ----------
+    src : str
+        The source event directory, e.g. run_source/<event_no>.
+    dst : str
+        The job directory.
+    mode : str, optional, default='copy'
+        'copy' copies the whole tree, 'hardlink' and 'symlink' link the read-only inputs
+        and only copy the files the job may modify, according to policy.
+    policy : list, optional
+        List of (pattern, action) tuples, defaults to STAGE_POLICY.
+
+    Returns
+    ----------
+    counts : dict
+        Number of files per action and bytes copied. Format --> {'link': int, 'copy': int, 'skip': int, 'bytes': int}
+    """
+    counts = {'link': 0, 'copy': 0, 'skip': 0, 'bytes': 0}
+    if mode == 'copy':
+        def copy_counted(src_path, dst_path):
+            shutil.copy2(src_path, dst_path)
+            counts['copy'] += 1
+            counts['bytes'] += os.path.getsize(dst_path)
+        shutil.copytree(src, dst, copy_function=copy_counted, dirs_exist_ok=True)
+        return counts
+    if mode not in STAGE_MODES:
+        raise ValueError(f"Invalid stage mode '{mode}'. Use one of {STAGE_MODES}.")
+    _stage_dir(src, dst, '', mode, STAGE_POLICY if policy is None else policy, counts)
+    logger.info(f"Staged {src} to {dst}: {counts['link']} linked, {counts['copy']} copied, {counts['skip']} skipped.")
+    return counts
+
+def tree_size(path:str):
+    """
+    Return the total size in bytes of all regular files below path.
+    """
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += tree_size(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+class StagingPool:
+    """
+    A thread pool preparing job directories (copy_folder + inital_params) ahead of submission.
+
+    Parameters
+    ----------
+    set_jobs : dict
+        Dictionary of jobs to be staged.
+        Format --> {'job_id' : ModelRunner object}
+    depth : int, optional, default=2
+        Maximum number of jobs staged ahead, i.e. being staged or staged but not yet submitted.
+    workers : int, optional
+        Number of staging threads, defaults to depth.
+    max_stage_bytes : int, optional
+        Upper bound of the estimated disk usage of all staged but not yet submitted jobs.
+    min_free_bytes : int, optional, default=1 GiB
+        No further job is staged ahead while the free space of the run directory would drop below this value,
+        a job is still staged when nothing else is, so that the campaign never stalls.
+    on_staged : callable, optional
+        Called with the job ID whenever a job has been staged or failed staging.
+    """
+    def __init__(self, set_jobs:dict, depth:int=2, workers:int=None, max_stage_bytes:int=None,
+                 min_free_bytes:int=1024**3, on_staged=None):
+        """
+        Initialize the staging pool.
+        """
+        self.set_jobs = set_jobs
+        self.depth = depth
+        self.max_stage_bytes = max_stage_bytes
+        self.min_free_bytes = min_free_bytes
+        self.on_staged = on_staged
+        self.executor = ThreadPoolExecutor(max_workers=workers or depth, thread_name_prefix='staging')
+        self.futures = {}
+        self.stage_bytes = {}
+        self._src_sizes = {}
+        self._lock = threading.Lock()
+
+    def estimate_bytes(self, job_id):
+        """
+        Estimate the disk usage of a staged job from the size of its source run directory.
+        """
+        src_run_dir = self.set_jobs[job_id].src_run_dir
+        with self._lock:
+            if src_run_dir not in self._src_sizes:
+                self._src_sizes[src_run_dir] = tree_size(src_run_dir) if os.path.isdir(src_run_dir) else 0
+            return self._src_sizes[src_run_dir]
+
+    def _has_room(self, job_id):
+        """
+        Check the look-ahead budget and the free disk space for staging one more job.
+        """
+        est = self.estimate_bytes(job_id)
+        staged = sum(self.stage_bytes.values())
+        if self.max_stage_bytes is not None and self.futures and staged + est > self.max_stage_bytes:
+            logger.debug(f"Staging of {job_id} deferred, {staged} bytes already staged.")
+            return False
+        run_dir = self.set_jobs[job_id].run_dir
+        free = shutil.disk_usage(run_dir).free if os.path.isdir(run_dir) else None
+        if free is not None and free - est < self.min_free_bytes:
+            if self.futures:
+                logger.warning(f"Staging of {job_id} deferred, only {free} bytes free in {run_dir}.")
+                return False
+            logger.warning(f"Only {free} bytes free in {run_dir}, staging {job_id} as the only job.")
+        return True
+
+    def _stage(self, job_id):
+        """
+        Stage one job in a worker thread.
+        """
+        try:
+            self.set_jobs[job_id].stage()
+            logger.info(f"Job {job_id} staged.")
+        finally:
+            if self.on_staged is not None:
+                self.on_staged(job_id)
+
+    def prefetch(self, waiting_id:list):
+        """
+        Start staging the first waiting jobs until the look-ahead depth or the disk budget is reached.
+        """
+        for job_id in waiting_id:
+            if len(self.futures) >= self.depth:
+                break
+            if job_id in self.futures or self.set_jobs[job_id].staged:
+                continue
+            if not self._has_room(job_id):
+                break
+            self.stage_bytes[job_id] = self.estimate_bytes(job_id)
+            self.futures[job_id] = self.executor.submit(self._stage, job_id)
+
+    def next_ready(self, waiting_id:list):
+        """
+        Return the first waiting job whose staging has finished, or None.
+        """
+        for job_id in waiting_id:
+            if self.set_jobs[job_id].staged and job_id not in self.futures:
+                return job_id
+            future = self.futures.get(job_id)
+            if future is not None and future.done():
+                return job_id
+        return None
+
+    def pop(self, job_id):
+        """
+        Hand over a job for submission, re-raising any error raised while staging it.
+        """
+        future = self.futures.pop(job_id, None)
+        self.stage_bytes.pop(job_id, None)
+        if future is not None:
+            future.result()
+
+    def shutdown(self):
+        """
+        Cancel the jobs not yet started and wait for the running staging threads.
+        """
+        for future in self.futures.values():
+            future.cancel()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,209 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   state_store.py
+@Create  :   2025-04-28 15:21:09
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import json
+import time
+import yaml
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# job status derived from the PBS status when a job is recorded without an explicit status
+PBS_STATUS = {'C': 'completed', 'E': 'failed'}
+
+COLUMNS = ['job_id', 'event_no', 'basin', 'set_params', 'phase', 'status', 'pbs_id', 'group_id', 'job_status',
+           'job_dir', 'result_path', 'config', 'timings', 'created_at', 'submitted_at', 'finished_at', 'updated_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    event_no     TEXT,
+    basin        TEXT,
+    set_params   TEXT,
+    phase        TEXT,
+    status       TEXT,
+    pbs_id       TEXT,
+    group_id     TEXT,
+    job_status   TEXT,
+    job_dir      TEXT,
+    result_path  TEXT,
+    config       TEXT,
+    timings      TEXT,
+    created_at   REAL,
+    submitted_at REAL,
+    finished_at  REAL,
+    updated_at   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_phase ON jobs (status, phase);
+CREATE INDEX IF NOT EXISTS idx_jobs_event ON jobs (event_no);
+"""
+
+class StateStore:
+    """
+    A transactional SQLite store of the campaign state, one row per job.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database, created if it does not exist.
+
+    Notes
+    ----------
+    status : 'waiting', 'staged', 'submitted', 'completed' or 'failed'
+    phase : the last phase the job reached, or the phase it failed in,
+        e.g. 'copy_folder', 'inital_params', 'submit_pbs_job', 'collect_frxst', 'clean'
+    """
+    def __init__(self, path:str):
+        """
+        Open the database and create the schema.
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+        logger.info(f"State store opened at {path}")
+
+    def _row(self, runner, phase=None, status=None, **fields):
+        """
+        Build the column values of a job from a ModelRunner object.
+        """
+        now = time.time()
+        status = status or PBS_STATUS.get(runner.job_status)
+        row = {
+            'job_id': runner.job_id,
+            'event_no': runner.event_no,
+            'basin': runner.basin,
+            'set_params': json.dumps(runner.set_params, sort_keys=True, default=str),
+            'phase': phase,
+            'status': status,
+            'pbs_id': runner.pbs_id,
+            'group_id': getattr(runner, 'group_id', None),
+            'job_status': runner.job_status,
+            'job_dir': runner.job_dir,
+            'result_path': getattr(runner, 'result_path', None),
+            'config': json.dumps(runner.config_dict(), default=str),
+            'timings': json.dumps(runner.timings) if getattr(runner, 'timings', None) else None,
+            'created_at': now,
+            'submitted_at': now if status == 'submitted' else None,
+            'finished_at': now if status in ('completed', 'failed') else None,
+            'updated_at': now,
+        }
+        row.update(fields)
+        return row
+
+    def record_many(self, runners:list, phase:str=None, status:str=None, **fields):
+        """
+        Insert or update the rows of several jobs in one transaction.
+        Columns passed as None keep their stored value, created_at is only set on insert.
+        """
+        rows = [self._row(runner, phase=phase, status=status, **fields) for runner in runners]
+        if not rows:
+            return
+        updates = ', '.join(f"{col} = COALESCE(excluded.{col}, jobs.{col})" for col in COLUMNS
+                            if col not in ('job_id', 'created_at'))
+        sql = (f"INSERT INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+               f"ON CONFLICT(job_id) DO UPDATE SET {updates}")
+        with self._lock, self.conn:
+            self.conn.executemany(sql, [[row[col] for col in COLUMNS] for row in rows])
+
+    def record(self, runner, phase:str=None, status:str=None, **fields):
+        """
+        Insert or update the row of one job, see record_many.
+        """
+        self.record_many([runner], phase=phase, status=status, **fields)
+
+    def _decode(self, row):
+        """
+        Convert a database row into a dictionary with the JSON columns decoded.
+        """
+        job = dict(row)
+        for col in ('set_params', 'config', 'timings'):
+            if job[col] is not None:
+                job[col] = json.loads(job[col])
+        return job
+
+    def get(self, job_id:str):
+        """
+        Return the stored state of a job, None if unknown.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return None if row is None else self._decode(row)
+
+    def query(self, status:str=None, phase:str=None, event_no:str=None):
+        """
+        Return the stored states of all jobs matching the given status, phase and event,
+        in the order they were first recorded, i.e. the queue order.
+        """
+        conditions, args = [], []
+        for col, value in (('status', status), ('phase', phase), ('event_no', event_no)):
+            if value is not None:
+                conditions.append(f"{col} = ?")
+                args.append(value)
+        sql = "SELECT * FROM jobs" + (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY rowid"
+        with self._lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def failed_jobs(self, phase:str=None):
+        """
+        Return all failed jobs, optionally only those that failed in the given phase.
+        """
+        return self.query(status='failed', phase=phase)
+
+    def counts(self):
+        """
+        Return the number of jobs per status. Format --> {status : int}
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def export_yaml(self, config_dir:str, job_ids:list=None):
+        """
+        Export jobs to the per-job YAML configs formerly written by ModelRunner.save_config,
+        named <job_id>_<event_no><phase>_config.yaml for failed jobs and <job_id>_<event_no>_config.yaml otherwise.
+
+        Returns
+        ----------
+        paths : list
+            List of the written YAML files.
+        """
+        os.makedirs(config_dir, exist_ok=True)
+        jobs = self.query() if job_ids is None else [self.get(job_id) for job_id in job_ids]
+        paths = []
+        for job in jobs:
+            if job is None or job['config'] is None:
+                continue
+            namemark = job['phase'] if job['status'] == 'failed' and job['phase'] else ''
+            config_file = os.path.join(config_dir, f"{job['job_id']}_{job['event_no']}{namemark}_config.yaml")
+            config_data = dict(job['config'])
+            config_data['config_yaml'] = config_file
+            with open(config_file, 'w', encoding='utf-8') as f:
+                yaml.dump(config_data, f, default_flow_style=False)
+            paths.append(config_file)
+        logger.info(f"Exported {len(paths)} job configs to {config_dir}")
+        return paths
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self.conn.close()
@@ -11,7 +11,7 @@
 import os
 import yaml
 import logging
-from core import SimulationInfo, batch_instantiate, schedule_and_track_jobs
+from core import SimulationInfo, StateStore, batch_instantiate, schedule_and_track_jobs
 
 log_dir = 'logs'
 os.makedirs(log_dir, exist_ok=True)
@@ -38,11 +38,19 @@ if __name__ == "__main__":
     }
     global_info = SimulationInfo(sim_info)
     global_info.creat_work_dirs()
+    # failed jobs from the state store if the campaign used one, else from their YAML configs
+    state_db = os.path.join(global_info.config_dir, 'state.db')
+    failed_configs = {}
+    if os.path.exists(state_db):
+        failed_configs = {job['job_id']: job['config'] for job in StateStore(state_db).failed_jobs(phase='inital_params')}
+    else:
+        for job_id in error_id:
+            config_path = os.path.join(global_info.ROOT_DIR, 'configs', f'{job_id}_Fuping_20190804inital_params_config.yaml')
+            with open(config_path, 'r') as f:
+                failed_configs[job_id] = yaml.safe_load(f)
+
     run_jobs = {}
-    for job_id in error_id:
-        config_path = os.path.join(global_info.ROOT_DIR, 'configs', f'{job_id}_Fuping_20190804inital_params_config.yaml')
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+    for job_id, config in failed_configs.items():
         print(config['set_params'])
         if list(config['set_params'].keys())==['RETDEPRTFAC']:
             val = round(config['set_params']['RETDEPRTFAC'], 4)
@@ -0,0 +1,102 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_adjust_params.py
+@Create  :   2025-05-14 15:40:08
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import shutil
+import netCDF4
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.adjust_params import NC_FILES, nc_params, nc_params_batch
+from core.nc_cache import DatasetCache
+
+FUPING_DIR = os.path.join(REPO_DIR, 'run_source', 'Fuping')
+
+PARAMS = [
+    {'name': ['bexp'], 'file': ['soil_properties.nc'], 'value': 1.3, 'adjust': 'scale'},
+    {'name': ['smcmax'], 'file': ['soil_properties.nc'], 'value': 0.7, 'adjust': 'scale'},
+    {'name': ['OV_ROUGH2D'], 'file': ['hydro2dtbl.nc'], 'value': 0.1, 'adjust': 'replace'},
+]
+
+
+@pytest.fixture
+def indir(tmp_path):
+    """
+    The bundled Fuping parameter files, Fulldom_hires.nc0 is only placed and stood in by a copy of hydro2dtbl.nc0.
+    """
+    indir = tmp_path / 'Fuping'
+    indir.mkdir()
+    for file in NC_FILES:
+        src = os.path.join(FUPING_DIR, file)
+        shutil.copyfile(src if os.path.exists(src) else os.path.join(FUPING_DIR, 'hydro2dtbl.nc0'), indir / file)
+    return str(indir)
+
+
+def read_vars(path, names):
+    with netCDF4.Dataset(path) as nc:
+        return {name: np.ma.filled(nc.variables[name][:], np.nan) for name in names}
+
+
+def test_adjust_paths_are_bit_identical(indir, tmp_path):
+    outdirs = {method: tmp_path / method for method in ('patch', 'xarray', 'batch')}
+    for outdir in outdirs.values():
+        outdir.mkdir()
+    assert nc_params(PARAMS, indir, str(outdirs['patch']), method='patch', verify=True) == 1
+    assert nc_params(PARAMS, indir, str(outdirs['xarray']), cache=DatasetCache()) == 1
+    assert nc_params_batch([PARAMS], indir, [str(outdirs['batch'])], cache=DatasetCache(), processes=0) == [1]
+
+    for file, names in (('soil_properties.nc', ['bexp', 'smcmax']), ('hydro2dtbl.nc', ['OV_ROUGH2D'])):
+        base = read_vars(os.path.join(indir, file + '0'), names)
+        results = {method: read_vars(str(outdir / file), names) for method, outdir in outdirs.items()}
+        for name in names:
+            for method in ('xarray', 'batch'):
+                np.testing.assert_array_equal(results[method][name], results['patch'][name], err_msg=f"{method} {name}")
+            assert results['patch'][name].dtype == base[name].dtype
+
+    # rounded once from the float64 product
+    bexp = read_vars(os.path.join(indir, 'soil_properties.nc0'), ['bexp'])['bexp']
+    expected = (bexp.astype(np.float64) * 1.3).astype(bexp.dtype)
+    np.testing.assert_array_equal(read_vars(str(outdirs['patch'] / 'soil_properties.nc'), ['bexp'])['bexp'], expected)
+
+
+def test_integer_variables_are_rounded_in_every_path(indir, tmp_path):
+    params = [{'name': ['ComID', 'Basin'], 'file': ['GWBUCKPARM.nc', 'GWBUCKPARM.nc'], 'value': 1.37, 'adjust': 'scale'}]
+    outdirs = {method: tmp_path / method for method in ('patch', 'xarray', 'batch')}
+    for outdir in outdirs.values():
+        outdir.mkdir()
+    assert nc_params(params, indir, str(outdirs['patch']), method='patch') == 1
+    assert nc_params(params, indir, str(outdirs['xarray']), cache=DatasetCache()) == 1
+    assert nc_params_batch([params], indir, [str(outdirs['batch'])], cache=DatasetCache(), processes=0) == [1]
+
+    base = read_vars(os.path.join(indir, 'GWBUCKPARM.nc0'), ['ComID', 'Basin'])
+    for name in ('ComID', 'Basin'):
+        # e.g. 2 * 1.37 = 2.74 is written as 3, not truncated to 2
+        expected = np.rint(base[name] * 1.37).astype(base[name].dtype)
+        for method, outdir in outdirs.items():
+            result = read_vars(str(outdir / 'GWBUCKPARM.nc'), [name])[name]
+            assert result.dtype == base[name].dtype
+            np.testing.assert_array_equal(result, expected, err_msg=f"{method} {name}")
+
+
+def test_concurrent_patches(indir, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    outdirs = [tmp_path / f'member_{i}' for i in range(8)]
+    for outdir in outdirs:
+        outdir.mkdir()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        exit_codes = list(executor.map(lambda outdir: nc_params(PARAMS, indir, str(outdir), method='patch'), outdirs))
+    assert exit_codes == [1] * len(outdirs)
+    first = read_vars(str(outdirs[0] / 'soil_properties.nc'), ['bexp', 'smcmax'])
+    for outdir in outdirs[1:]:
+        for name, values in read_vars(str(outdir / 'soil_properties.nc'), ['bexp', 'smcmax']).items():
+            np.testing.assert_array_equal(values, first[name])
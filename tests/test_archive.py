@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_archive.py
+@Create  :   2025-05-15 19:20:33
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import netCDF4
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.archive import archive_outputs
+
+TIMES = ['201908010000', '201908010100', '201908010200']
+
+
+def write_outputs(job_dir):
+    """
+    Three LDASOUT time steps with a gap in SOIL_M and a static field, one CHRTOUT time step.
+    """
+    rng = np.random.default_rng(0)
+    fields = []
+    for i, time in enumerate(TIMES):
+        soil_m = rng.uniform(0.05, 0.45, (1, 4, 5)).astype(np.float32)
+        soil_m[0, 1, 2] = np.nan if i == 1 else soil_m[0, 1, 2]
+        fields.append(soil_m[0])
+        with netCDF4.Dataset(os.path.join(job_dir, f'{time}.LDASOUT_DOMAIN1'), 'w') as nc:
+            nc.createDimension('Time', None)
+            nc.createDimension('south_north', 4)
+            nc.createDimension('west_east', 5)
+            var = nc.createVariable('SOIL_M', 'f4', ('Time', 'south_north', 'west_east'), fill_value=np.float32(-9999))
+            var.units = 'm3 m-3'
+            var[:] = np.ma.masked_invalid(soil_m)
+            nc.createVariable('HGT', 'f4', ('south_north', 'west_east'))[:] = np.arange(20, dtype=np.float32).reshape(4, 5)
+    with netCDF4.Dataset(os.path.join(job_dir, f'{TIMES[0]}.CHRTOUT_DOMAIN1'), 'w') as nc:
+        nc.createDimension('time', None)
+        nc.createDimension('feature_id', 3)
+        nc.createVariable('streamflow', 'f4', ('time', 'feature_id'))[:] = [[1.5, 20.0, 300.25]]
+    return np.stack(fields)
+
+
+def test_int16_packing_round_trip(tmp_path):
+    job_dir = tmp_path / 'j0'
+    job_dir.mkdir()
+    soil_m = write_outputs(str(job_dir))
+    archive = str(tmp_path / 'archive' / 'j0.nc')
+    archived = archive_outputs(str(job_dir), archive, pack=True, attrs={'job_id': 'j0'})
+    assert [kind for kind, _, _ in archived] == ['CHRTOUT', 'LDASOUT', 'LDASOUT', 'LDASOUT']
+    assert not os.path.exists(archive + '.tmp')
+
+    with netCDF4.Dataset(archive) as nc:
+        assert nc.job_id == 'j0'
+        var = nc['LDASOUT']['SOIL_M']
+        assert var.dtype == np.int16 and var.units == 'm3 m-3'
+        values = var[:]
+        # the gap stays missing, every other value is within half a packing step plus the float32 rounding
+        assert values.mask.sum() == 1 and values.mask[1, 1, 2]
+        error = np.abs(values.filled(np.nan) - soil_m)
+        assert np.nanmax(error) <= var.scale_factor / 2 + 4 * np.finfo(np.float32).eps * np.nanmax(soil_m)
+        assert np.nanmax(error) > 0
+        np.testing.assert_allclose([values.min(), values.max()], [np.nanmin(soil_m), np.nanmax(soil_m)],
+                                   atol=var.scale_factor)
+        np.testing.assert_array_equal(nc['LDASOUT']['HGT'][:], np.arange(20).reshape(4, 5))
+        np.testing.assert_allclose(nc['CHRTOUT']['streamflow'][:], [[1.5, 20.0, 300.25]],
+                                   atol=nc['CHRTOUT']['streamflow'].scale_factor / 2 + 4 * np.finfo(np.float32).eps * 300)
+
+
+def test_unpacked_archive_keeps_float32(tmp_path):
+    job_dir = tmp_path / 'j0'
+    job_dir.mkdir()
+    soil_m = write_outputs(str(job_dir))
+    archive = str(tmp_path / 'j0.nc')
+    archive_outputs(str(job_dir), archive, kinds=['LDASOUT'], significant_digits=None)
+    with netCDF4.Dataset(archive) as nc:
+        assert list(nc.groups) == ['LDASOUT']
+        assert nc['LDASOUT']['SOIL_M'].dtype == np.float32
+        np.testing.assert_array_equal(nc['LDASOUT']['SOIL_M'][:].filled(np.nan), soil_m)
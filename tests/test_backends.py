@@ -0,0 +1,128 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_backends.py
+@Create  :   2025-05-15 09:26:51
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import textwrap
+from types import SimpleNamespace
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.backends import PBSBackend, SlurmBackend, query_pbs_status
+from core.RunningJobs import check_and_collect
+from core.WRFHydroJob import ModelRunner
+
+QSTAT_HEADER = ("Job ID                    Name             User            Time Use S Queue\n"
+                "------------------------- ---------------- --------------- -------- - -----\n")
+
+
+def install_qstat(bin_dir, monkeypatch, stdout='', stderr='', code=0, history=''):
+    """
+    A qstat printing canned output and logging its arguments, qstat -x -f prints history.
+    """
+    bin_dir.mkdir(exist_ok=True)
+    (bin_dir / 'out').write_text(stdout)
+    (bin_dir / 'err').write_text(stderr)
+    (bin_dir / 'history').write_text(history)
+    script = bin_dir / 'qstat'
+    script.write_text(textwrap.dedent(f'''\
+        #!/bin/sh
+        echo "$@" >> "{bin_dir}/calls"
+        if [ "$1" = "-x" ]; then cat "{bin_dir}/history"; exit 0; fi
+        cat "{bin_dir}/out"
+        cat "{bin_dir}/err" >&2
+        exit {code}
+        '''))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    return bin_dir / 'calls'
+
+
+def test_array_sub_jobs_are_queried_through_their_parent(tmp_path, monkeypatch):
+    calls = install_qstat(tmp_path / 'bin', monkeypatch, stdout=QSTAT_HEADER +
+                          "1234[0].server            array_j0_3       user            00:00:10 R batch\n"
+                          "1234[1].server            array_j0_3       user            00:00:00 Q batch\n"
+                          "1234[2].server            array_j0_3       user            00:01:00 F batch\n"
+                          "1300.server               Hydrojob         user            00:00:10 R batch\n")
+    status_map = query_pbs_status(['1234[0].server', '1234[1].server', '1234[2].server', '1300.server'])
+    assert status_map == {'1234[0].server': 'R', '1234[1].server': 'Q', '1234[2].server': 'F', '1300.server': 'R'}
+    assert calls.read_text().splitlines() == ['1300.server', '-t 1234[].server']
+
+
+def test_jobs_gone_from_qstat_are_missing(tmp_path, monkeypatch):
+    install_qstat(tmp_path / 'bin', monkeypatch, code=153,
+                  stdout=QSTAT_HEADER + "1300.server               Hydrojob         user            00:00:10 R batch\n",
+                  stderr="qstat: Unknown Job Id 1301.server\nqstat: 1302.server Job has finished, use -x or -H\n")
+    assert query_pbs_status(['1300.server', '1301.server', '1302.server']) == {'1300.server': 'R'}
+
+
+def test_failed_qstat_raises(tmp_path, monkeypatch):
+    install_qstat(tmp_path / 'bin', monkeypatch, code=2, stderr="Connection refused\nqstat: cannot connect to server\n")
+    with pytest.raises(RuntimeError):
+        query_pbs_status(['1300.server'])
+
+
+def test_finished_jobs_are_resolved_from_the_history(tmp_path, monkeypatch):
+    history = ("Job Id: 1301.server\n    Job_Name = Hydrojob\n    job_state = F\n    Exit_status = 0\n\n"
+               "Job Id: 1302.server\n    Job_Name = Hydrojob\n    job_state = F\n    Exit_status = 271\n\n"
+               "<Data><Job><Job_Id>1303.server</Job_Id><job_state>C</job_state>"
+               "<exit_status>-11</exit_status></Job></Data>\n")
+    install_qstat(tmp_path / 'bin', monkeypatch, code=153, history=history,
+                  stderr="".join(f"qstat: Unknown Job Id 130{i}.server\n" for i in range(1, 5)))
+    status_map = PBSBackend().status(['1301.server', '1302.server', '1303.server', '1304.server'])
+    assert status_map == {'1301.server': 'C', '1302.server': 'E', '1303.server': 'E'}
+
+
+def test_check_and_collect_keeps_jobs_when_the_query_fails(tmp_path, monkeypatch):
+    install_qstat(tmp_path / 'bin', monkeypatch, code=2, stderr="qstat: cannot connect to server\n")
+
+    def fail(runner):
+        raise AssertionError(f"job {runner.job_id} must not be updated")
+
+    backend = PBSBackend()
+    set_jobs = {f'j{i}': SimpleNamespace(job_id=f'j{i}', pbs_id=f'{1300 + i}.server', backend=backend,
+                                          update_pbs_job_status=fail) for i in range(3)}
+    running_id, finished = check_and_collect(['j0', 'j1', 'j2'], set_jobs)
+    assert running_id == ['j0', 'j1', 'j2']
+    assert finished == []
+
+
+def install_slurm(bin_dir, monkeypatch, squeue='', sacct='', sacct_code=0):
+    """
+    squeue and sacct printing canned output.
+    """
+    bin_dir.mkdir(exist_ok=True)
+    for command, stdout, code in (('squeue', squeue, 0), ('sacct', sacct, sacct_code)):
+        (bin_dir / f'{command}.out').write_text(stdout)
+        script = bin_dir / command
+        script.write_text(f'#!/bin/sh\ncat "{bin_dir}/{command}.out"\nexit {code}\n')
+        script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+
+def test_slurm_states_are_mapped(tmp_path, monkeypatch):
+    install_slurm(tmp_path / 'bin', monkeypatch, squeue="101 PD\n102 R\n103 CG\n999 R\n",
+                  sacct="104|COMPLETED\n105|CANCELLED by 123\n106|TIMEOUT\n107|OUT_OF_MEMORY+\n108|NEW_STATE\n")
+    status_map = SlurmBackend().status(['101', '102', '103', '104', '105', '106', '107', '108', '109'])
+    # unknown states map to None, jobs known to neither squeue nor sacct are missing
+    assert status_map == {'101': 'Q', '102': 'R', '103': 'R', '104': 'C', '105': 'E', '106': 'E', '107': 'E',
+                          '108': None}
+
+    # a job in an unknown state keeps its status
+    runner = SimpleNamespace(pbs_id='108', group_id=None, job_status='R', job_id='j0')
+    ModelRunner.update_pbs_job_status(runner, status_map)
+    assert runner.job_status == 'R'
+
+
+def test_failed_sacct_raises(tmp_path, monkeypatch):
+    install_slurm(tmp_path / 'bin', monkeypatch, squeue="101 R\n", sacct_code=1)
+    with pytest.raises(RuntimeError):
+        SlurmBackend().status(['101', '102'])
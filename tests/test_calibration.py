@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_calibration.py
+@Create  :   2025-05-15 18:05:47
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import math
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.calibration import DDS, SCEUA
+
+LOWER = np.array([-5.0, -5.0, 0.0])
+UPPER = np.array([5.0, 5.0, 10.0])
+OPTIMUM = np.array([1.0, -2.0, 3.0])
+
+
+def sphere(x):
+    return float(np.sum((x - OPTIMUM) ** 2))
+
+
+def minimize(optimizer, evals, batch):
+    """
+    Ask batch points at a time and tell them in reverse order, like jobs finishing out of order.
+    """
+    asked = []
+    for _ in range(evals // batch):
+        points = [optimizer.ask() for _ in range(batch)]
+        for x in reversed(points):
+            optimizer.tell(x, sphere(x))
+        asked += points
+    return np.array(asked)
+
+
+def test_dds_ask_tell():
+    x0 = np.array([4.0, 4.0, 9.0])
+    dds = DDS(LOWER, UPPER, max_evals=300, x0=x0, seed=1)
+    first = dds.ask()
+    np.testing.assert_array_equal(first, x0)
+    second = dds.ask()
+    # proposals are asked around the best point known, told in any order
+    dds.tell(second, sphere(second))
+    dds.tell(first, sphere(first))
+    assert dds.best_f == min(sphere(first), sphere(second))
+    dds.tell(np.zeros(3), math.inf)
+    assert dds.best_f == min(sphere(first), sphere(second))
+
+    asked = minimize(dds, 300, batch=4)
+    assert ((asked >= LOWER) & (asked <= UPPER)).all()
+    assert dds.n_asked == 302
+    assert dds.best_f == min(sphere(x) for x in np.vstack([asked, [first, second]]))
+    assert dds.best_f < 0.1
+
+
+def test_sceua_ask_tell():
+    sce = SCEUA(LOWER, UPPER, n_complexes=2, seed=1)
+    size = 2 * (2 * 3 + 1)
+    initial = [sce.ask() for _ in range(size)]
+    # asked before the initial population is told, the extra point joins the population as well
+    extra = sce.ask()
+    assert sce.complexes == []
+    for x in initial + [extra]:
+        sce.tell(x, sphere(x))
+    assert len(sce.population) == size + 1
+    assert sorted(i for members in sce.complexes for i in members) == list(range(size + 1))
+    assert sce.pending == {}
+
+    # a failed reflection is followed by a contraction between the centroid and the worst point
+    x = sce.ask()
+    context = sce.pending[x.tobytes()][0]
+    if context['step'] == 'reflect':
+        sce.tell(x, math.inf)
+        contraction = sce.ask()
+        np.testing.assert_allclose(contraction, (context['centroid'] + context['worst_x']) / 2)
+        sce.tell(contraction, sphere(contraction))
+    else:
+        sce.tell(x, sphere(x))
+
+    asked = minimize(sce, 600, batch=4)
+    assert ((asked >= LOWER) & (asked <= UPPER)).all()
+    assert len(sce.population) == size + 1 and sce.pending == {}
+    assert sce.best_f == min(point['f'] for point in sce.population)
+    assert sce.best_f < 0.1
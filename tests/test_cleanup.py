@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_cleanup.py
+@Create  :   2025-05-15 19:02:14
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.cleanup import scan_outputs, select_outputs, prune_outputs
+
+OUTPUTS = ['201908010000.LDASOUT_DOMAIN1', '201908020000.LDASOUT_DOMAIN1', '201908030000.LDASOUT_DOMAIN1',
+           'diag_hydro.00000', 'diag_hydro.00001',
+           'HYDRO_RST.2019-08-01_00:00_DOMAIN1', 'HYDRO_RST.2019-08-02_00:00_DOMAIN1', 'HYDRO_RST.2019-08-03_00:00_DOMAIN1',
+           'RESTART.2019080100_DOMAIN1', 'RESTART.2019080200_DOMAIN1', 'RESTART.2019080300_DOMAIN1']
+
+
+def job_dir(tmp_path):
+    path = tmp_path / 'j0'
+    path.mkdir()
+    for name in OUTPUTS + ['frxst_pts_out.txt', 'namelist.hrldas', '201908040000.LDASOUT_DOMAIN1.bak']:
+        (path / name).write_text(name)
+    # a directory named like an output is not an output
+    (path / '201908040000.LDASOUT_DOMAIN1').mkdir()
+    return path
+
+
+def kept(path, outputs, **policy):
+    remove = set(select_outputs(outputs, **policy))
+    return sorted(os.path.basename(p) for _, _, p in outputs if p not in remove)
+
+
+def test_retention_rules(tmp_path):
+    path = job_dir(tmp_path)
+    outputs = scan_outputs(str(path))
+    assert sorted(os.path.basename(p) for _, _, p in outputs) == sorted(OUTPUTS)
+
+    assert kept(path, outputs) == []
+    # the latest restart of each kind
+    assert kept(path, outputs, keep_restarts=1) == ['HYDRO_RST.2019-08-03_00:00_DOMAIN1', 'RESTART.2019080300_DOMAIN1']
+    assert len(kept(path, outputs, keep_restarts=5)) == 6
+    # every output of a kept time, diag_hydro has none
+    assert kept(path, outputs, keep_times=['2019-08-02 00:00']) == ['201908020000.LDASOUT_DOMAIN1',
+                                                                    'HYDRO_RST.2019-08-02_00:00_DOMAIN1',
+                                                                    'RESTART.2019080200_DOMAIN1']
+    assert kept(path, outputs, keep_restarts=1, keep_times=['2019-08-01_00:00']) == [
+        '201908010000.LDASOUT_DOMAIN1', 'HYDRO_RST.2019-08-01_00:00_DOMAIN1', 'HYDRO_RST.2019-08-03_00:00_DOMAIN1',
+        'RESTART.2019080100_DOMAIN1', 'RESTART.2019080300_DOMAIN1']
+
+
+def test_prune_outputs(tmp_path):
+    path = job_dir(tmp_path)
+    assert prune_outputs(str(path), keep_restarts=1) == len(OUTPUTS) - 2
+    assert sorted(os.listdir(path)) == ['201908040000.LDASOUT_DOMAIN1', '201908040000.LDASOUT_DOMAIN1.bak',
+                                        'HYDRO_RST.2019-08-03_00:00_DOMAIN1', 'RESTART.2019080300_DOMAIN1',
+                                        'frxst_pts_out.txt', 'namelist.hrldas']
+
+    # a job directory left empty is removed
+    empty = tmp_path / 'j1'
+    empty.mkdir()
+    for name in OUTPUTS:
+        (empty / name).write_text(name)
+    assert prune_outputs(str(empty)) == len(OUTPUTS)
+    assert not empty.exists()
@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_design.py
+@Create  :   2025-05-15 18:41:09
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.design import saltelli, morris, sobol_indices, morris_indices, to_jobs, design_outputs
+
+PARAMS_INFO = {
+    'BEXP': {'minValue': 0.0, 'maxValue': 1.0},
+    'DKSAT': {'minValue': 0.0, 'maxValue': 1.0},
+    'REFKDT': {'minValue': 0.5, 'maxValue': 5.0},
+}
+NAMES = list(PARAMS_INFO)
+
+
+def additive(x):
+    # variances 1/12 and 4/12 on the unit range, REFKDT has no effect: S1 = ST = [0.2, 0.8, 0]
+    return x[:, 0] + 2 * x[:, 1]
+
+
+def test_sobol_indices_of_an_additive_function():
+    n = 4096
+    samples = saltelli(PARAMS_INFO, NAMES, n, seed=0)
+    assert samples.shape == (n * 5, 3)
+    # AB_i is A with column i from B
+    a, b, ab = samples[:n], samples[n:2 * n], samples[2 * n:].reshape(3, n, 3)
+    for i in range(3):
+        np.testing.assert_array_equal(ab[i][:, i], b[:, i])
+        np.testing.assert_array_equal(np.delete(ab[i], i, axis=1), np.delete(a, i, axis=1))
+
+    jobs = to_jobs(samples, NAMES, {'event_no': 'Bench_20190804', 'set_params': {'OVROUGHRTFAC': 1.0}})
+    assert jobs['sa_10002']['set_params'] == {'OVROUGHRTFAC': 1.0, **dict(zip(NAMES, samples[1]))}
+    outputs = design_outputs(jobs, {job_id: value for job_id, value in zip(jobs, additive(samples))})
+    outputs[7] = np.nan
+    indices = sobol_indices(outputs, 3)
+    np.testing.assert_allclose(indices['S1'], [0.2, 0.8, 0.0], atol=0.05)
+    np.testing.assert_allclose(indices['ST'], [0.2, 0.8, 0.0], atol=0.05)
+
+
+def test_morris_indices_of_a_linear_and_an_interaction_term():
+    samples = morris(PARAMS_INFO, NAMES, r=20, levels=4, seed=0)
+    assert samples.shape == (20 * 4, 3)
+    # every step changes a single parameter
+    steps = np.diff(samples.reshape(20, 4, 3), axis=1)
+    assert ((steps != 0).sum(axis=2) == 1).all()
+
+    outputs = 3 * samples[:, 0] - samples[:, 2]
+    indices = morris_indices(samples, outputs, PARAMS_INFO, NAMES)
+    # elementary effects per full range: 3 * 1 and -1 * 4.5
+    np.testing.assert_allclose(indices['mu'], [3.0, 0.0, -4.5])
+    np.testing.assert_allclose(indices['mu_star'], [3.0, 0.0, 4.5])
+    np.testing.assert_allclose(indices['sigma'], [0.0, 0.0, 0.0], atol=1e-12)
+
+    # an interaction term spreads the effects of both parameters
+    outputs = samples[:, 0] * samples[:, 1]
+    outputs[5] = np.nan
+    indices = morris_indices(samples, outputs, PARAMS_INFO, NAMES)
+    assert (indices['sigma'][:2] > 0).all() and indices['mu_star'][2] == 0
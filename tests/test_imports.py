@@ -0,0 +1,44 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_imports.py
+@Create  :   2025-05-15 19:48:50
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import core
+
+
+def loaded_after(code):
+    """
+    Run code in a fresh interpreter and return the heavy modules it loaded.
+    """
+    script = (f"import sys\n{code}\n"
+              "import json\nprint(json.dumps([m for m in ('numpy', 'xarray', 'netCDF4', 'pandas') if m in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, stdout=subprocess.PIPE, check=True, text=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_submodules_are_imported_on_first_access():
+    assert loaded_after("import core") == []
+    assert loaded_after("from core import StateStore, make_backend") == []
+    assert 'xarray' in loaded_after("import core\ncore.score")
+
+
+def test_exports_resolve():
+    assert sorted(core.__all__) == sorted(core._MODULES)
+    for name in core.__all__:
+        assert getattr(core, name).__name__ == name
+    assert set(core.__all__) <= set(dir(core))
+    with pytest.raises(AttributeError):
+        core.no_such_name
@@ -0,0 +1,46 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_memo.py
+@Create  :   2025-05-14 16:52:19
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+from types import SimpleNamespace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.memo import ResultCache
+
+PARAMS_INFO = {
+    'BEXP': {'name': 'bexp', 'file': 'soil_properties.nc', 'adjust': 'scale', 'minValue': 0.4, 'maxValue': 1.9},
+    'DKSAT': {'name': 'dksat', 'file': 'soil_properties.nc', 'adjust': 'scale', 'minValue': 0.2, 'maxValue': 10.0},
+}
+
+
+def runner(tmp_path, params_info, set_params):
+    return SimpleNamespace(src_run_dir=str(tmp_path / 'Bench_20190804'), src_params_dir=str(tmp_path / 'Bench_params'),
+                           event_no='Bench_20190804', basin='Bench', set_params=set_params, params_info=params_info)
+
+
+def test_key_follows_run_params_mapping(tmp_path):
+    for name in ('Bench_20190804', 'Bench_params'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'input.txt').write_text(name)
+    cache = ResultCache(str(tmp_path / 'memo.db'), str(tmp_path / '.memo'))
+    key = cache.key(runner(tmp_path, PARAMS_INFO, {'BEXP': 1.3}))
+
+    # a changed mapping of BEXP changes the result, a changed bound or another parameter does not
+    replace = {**PARAMS_INFO, 'BEXP': {**PARAMS_INFO['BEXP'], 'adjust': 'replace'}}
+    renamed = {**PARAMS_INFO, 'BEXP': {**PARAMS_INFO['BEXP'], 'name': ['bexp', 'BEXP1'], 'file': ['soil_properties.nc',
+                                                                                                   'hydro2dtbl.nc']}}
+    bounds = {**PARAMS_INFO, 'BEXP': {**PARAMS_INFO['BEXP'], 'maxValue': 2.5}}
+    other = {**PARAMS_INFO, 'DKSAT': {**PARAMS_INFO['DKSAT'], 'adjust': 'replace'}}
+    assert cache.key(runner(tmp_path, replace, {'BEXP': 1.3})) != key
+    assert cache.key(runner(tmp_path, renamed, {'BEXP': 1.3})) != key
+    assert cache.key(runner(tmp_path, bounds, {'BEXP': 1.3})) == key
+    assert cache.key(runner(tmp_path, other, {'BEXP': 1.3})) == key
@@ -0,0 +1,131 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_pbs_groups.py
+@Create  :   2025-05-15 11:04:37
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import textwrap
+import subprocess
+from types import SimpleNamespace
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.backends import SlurmBackend, LocalBackend
+from core.pbs_groups import submit_array, submit_bundle
+
+SCRIPT = '''#!/bin/bash
+#PBS -N Hydrojob
+#PBS -l nodes=1:ppn=4
+#PBS -l walltime=12:00:00
+#PBS -q batch
+#SBATCH --job-name=Hydrojob
+#SBATCH --nodes=1
+#SBATCH --ntasks=4
+#SBATCH --time=12:00:00
+#SBATCH --partition=short
+cd $PBS_O_WORKDIR
+mpirun ./wrf_hydro.exe
+'''
+
+
+def members(tmp_path, num=3):
+    runners = []
+    for i in range(num):
+        job_dir = tmp_path / f'j{i}'
+        job_dir.mkdir()
+        (job_dir / 'Hydrojob.pbs').write_text(SCRIPT)
+        runners.append(SimpleNamespace(job_id=f'j{i}', job_dir=str(job_dir), pbs_script='Hydrojob.pbs',
+                                       exit_file='.pbs_exit_status', group_id=None, pbs_id=None))
+    return runners
+
+
+def install(bin_dir, monkeypatch, command, output):
+    """
+    A submission command keeping a copy of the submitted script and printing output.
+    """
+    bin_dir.mkdir(exist_ok=True)
+    script = bin_dir / command
+    script.write_text(textwrap.dedent(f'''\
+        #!/bin/sh
+        for arg; do last="$arg"; done
+        cp "$last" "{bin_dir}/submitted"
+        echo {output}
+        '''))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    return bin_dir / 'submitted'
+
+
+def directives(script):
+    return [line for line in script.splitlines() if line.startswith('#PBS') or line.startswith('#SBATCH')]
+
+
+def test_slurm_bundle_requests_its_resources_with_sbatch(tmp_path, monkeypatch):
+    submitted = install(tmp_path / 'bin', monkeypatch, 'sbatch', '4321')
+    runners = members(tmp_path)
+    group_id = submit_bundle(runners, str(tmp_path / 'groups'), parallel=2, resources=['--nodes=1', '--ntasks=12'],
+                             backend=SlurmBackend())
+    assert group_id == '4321'
+    assert all(runner.pbs_id == '4321' for runner in runners)
+    assert directives(submitted.read_text()) == ['#SBATCH --partition=short', '#SBATCH --job-name=bundle_j0_3',
+                                                 '#SBATCH --nodes=1', '#SBATCH --ntasks=12']
+
+
+def test_slurm_bundle_keeps_the_member_resources(tmp_path, monkeypatch):
+    submitted = install(tmp_path / 'bin', monkeypatch, 'sbatch', '4321')
+    submit_bundle(members(tmp_path), str(tmp_path / 'groups'), backend=SlurmBackend())
+    assert directives(submitted.read_text()) == ['#SBATCH --nodes=1', '#SBATCH --ntasks=4', '#SBATCH --time=12:00:00',
+                                                 '#SBATCH --partition=short', '#SBATCH --job-name=bundle_j0_3']
+
+
+def test_pbs_bundle_replaces_the_resource_lists(tmp_path, monkeypatch):
+    submitted = install(tmp_path / 'bin', monkeypatch, 'qsub', '1234.server')
+    runners = members(tmp_path, num=2)
+    assert submit_bundle(runners, str(tmp_path / 'groups'), resources=['-l nodes=1:ppn=24']) == '1234.server'
+    script = submitted.read_text()
+    assert directives(script) == ['#PBS -q batch', '#PBS -N bundle_j0_2', '#PBS -l nodes=1:ppn=24']
+    for runner in runners:
+        assert f'(cd "{runner.job_dir}" && PBS_O_WORKDIR="{runner.job_dir}" bash "./Hydrojob.pbs"' in script
+
+
+def test_local_backend_cannot_run_bundles(tmp_path):
+    backend = LocalBackend(max_workers=1)
+    try:
+        with pytest.raises(ValueError):
+            submit_bundle(members(tmp_path), str(tmp_path / 'groups'), backend=backend)
+    finally:
+        backend.shutdown()
+
+
+@pytest.mark.parametrize('index_var', ['PBS_ARRAY_INDEX', 'PBS_ARRAYID'])
+def test_array_sub_jobs_run_the_member_of_their_index(tmp_path, monkeypatch, index_var):
+    submitted = install(tmp_path / 'bin', monkeypatch, 'qsub', '1234[].server')
+    runners = members(tmp_path)
+    for i, runner in enumerate(runners):
+        with open(os.path.join(runner.job_dir, runner.pbs_script), 'a') as f:
+            f.write(f'echo $PBS_O_WORKDIR > ran\nexit {i}\n')
+    assert submit_array(runners, str(tmp_path / 'groups'), array_flag='-t') == '1234[].server'
+    assert [runner.pbs_id for runner in runners] == ['1234[0].server', '1234[1].server', '1234[2].server']
+    script = submitted.read_text()
+    assert '#PBS -t 0-2' in directives(script)
+
+    # PBS Pro sets PBS_ARRAY_INDEX, Torque PBS_ARRAYID, sub-job 1 runs the second member only
+    env = {key: value for key, value in os.environ.items() if key not in ('PBS_ARRAY_INDEX', 'PBS_ARRAYID')}
+    env[index_var] = '1'
+    env['PATH'] = str(tmp_path / 'bin') + os.pathsep + env['PATH']
+    (tmp_path / 'bin' / 'mpirun').write_text('#!/bin/sh\n')
+    (tmp_path / 'bin' / 'mpirun').chmod(0o755)
+    subprocess.run(['bash', str(submitted)], env=env, cwd=str(tmp_path), check=True)
+    ran = [os.path.exists(os.path.join(runner.job_dir, 'ran')) for runner in runners]
+    assert ran == [False, True, False]
+    with open(os.path.join(runners[1].job_dir, 'ran')) as f:
+        assert f.read().strip() == runners[1].job_dir
+    with open(os.path.join(runners[1].job_dir, runners[1].exit_file)) as f:
+        assert f.read().strip() == '1'
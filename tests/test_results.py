@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_results.py
+@Create  :   2025-05-15 14:21:36
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core import results
+from core.results import append_cube, load_cube, cube_params, read_member
+
+TIMES = np.arange('2019-08-04T00', '2019-08-04T06', dtype='datetime64[h]').astype('datetime64[s]')
+GAUGES = np.array(['101', '102'])
+
+
+def member(i):
+    return np.arange(len(GAUGES) * len(TIMES), dtype=np.float32).reshape(len(GAUGES), len(TIMES)) + 100 * i
+
+
+def test_append_load_round_trip(tmp_path):
+    path = str(tmp_path / 'Bench_20190804_frxst.nc')
+    for i in range(4):
+        assert append_cube(path, f'j{i}', TIMES, GAUGES, member(i), set_params={'BEXP': 1 + i / 10},
+                           attrs={'event_no': 'Bench_20190804'}) == i
+    # a member missing a gauge and an hour is aligned to the axes of the cube
+    assert append_cube(path, 'j4', TIMES[1:], GAUGES[1:], member(4)[1:, 1:]) == 4
+
+    ds = load_cube(path)
+    assert list(ds['job'].values) == ['j0', 'j1', 'j2', 'j3', 'j4']
+    assert list(ds['gauge'].values) == list(GAUGES)
+    np.testing.assert_array_equal(ds['time'].values, TIMES.astype('datetime64[ns]'))
+    for i in range(4):
+        np.testing.assert_array_equal(ds['q_cms'].sel(job=f'j{i}').values, member(i))
+    np.testing.assert_array_equal(ds['q_cms'].sel(job='j4', gauge='102').values[1:], member(4)[1, 1:])
+    assert np.isnan(ds['q_cms'].sel(job='j4', gauge='101').values).all()
+    np.testing.assert_allclose(ds['param_BEXP'].values[:4], [1.0, 1.1, 1.2, 1.3])
+    assert cube_params(ds)['j2'] == {'BEXP': 1.2}
+    assert ds.attrs['event_no'] == 'Bench_20190804'
+
+    subset = load_cube(path, job_ids=['j3', 'j1'])
+    np.testing.assert_array_equal(subset['q_cms'].values, np.stack([member(3), member(1)]))
+    lazy = load_cube(path, lazy=True)
+    try:
+        np.testing.assert_array_equal(lazy['q_cms'].sel(job='j2', gauge='102').values, member(2)[1])
+    finally:
+        lazy.close()
+    np.testing.assert_array_equal(read_member(path, 'j1').values, member(1))
+    with pytest.raises(KeyError):
+        read_member(path, 'j9')
+
+
+def test_duplicate_job_id(tmp_path):
+    path = str(tmp_path / 'Bench_20190804_frxst.nc')
+    append_cube(path, 'j0', TIMES, GAUGES, member(0))
+    append_cube(path, 'j1', TIMES, GAUGES, member(1))
+    with pytest.raises(ValueError):
+        append_cube(path, 'j0', TIMES, GAUGES, member(5), overwrite=False)
+    # a rerun overwrites its row instead of adding a second one
+    assert append_cube(path, 'j0', TIMES, GAUGES, member(7)) == 0
+    ds = load_cube(path)
+    assert list(ds['job'].values) == ['j0', 'j1']
+    np.testing.assert_array_equal(ds['q_cms'].sel(job='j0').values, member(7))
+
+
+def test_index_is_rebuilt_for_a_new_cube(tmp_path):
+    path = str(tmp_path / 'Bench_20190804_frxst.nc')
+    append_cube(path, 'j0', TIMES, GAUGES, member(0))
+    append_cube(path, 'j1', TIMES, GAUGES, member(1))
+    os.remove(path)
+    # the cached rows of the removed cube are not reused
+    assert append_cube(path, 'j1', TIMES, GAUGES, member(1)) == 0
+    assert results._CUBE_INDEX[os.path.realpath(path)]['rows'] == {'j1': 0}
+    assert list(load_cube(path)['job'].values) == ['j1']
@@ -0,0 +1,257 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_scheduler.py
+@Create  :   2025-05-14 10:12:31
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import threading
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+from core import SimulationInfo, ModelRunner, JobScheduler
+from core.RunningJobs import check_and_collect
+from bench_scheduler import make_root
+import fake_pbs
+
+
+@pytest.fixture
+def campaign(tmp_path, monkeypatch):
+    """
+    A synthetic campaign of three members and a fake PBS server dropping finished jobs from qstat at once,
+    like PBS Pro without -x.
+    """
+    bin_dir = fake_pbs.install(str(tmp_path / 'bin'))
+    monkeypatch.setenv('PATH', bin_dir + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_PBS_DIR', str(tmp_path / 'pbs'))
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '0.3')
+    monkeypatch.setenv('FAKE_PBS_KEEP', '0')
+    root_dir = str(tmp_path / 'root')
+    make_root(root_dir, input_mb=0.01)
+    sim_info = SimulationInfo({'obj': 'test', 'ROOT_DIR': root_dir, 'yaml_configs': False})
+    sim_info.creat_work_dirs()
+    set_jobs = {}
+    for i in range(3):
+        job_info = {'job_id': f'j{i}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        set_jobs[job_info['job_id']] = ModelRunner(sim_info, job_info=job_info)
+    return sim_info, set_jobs
+
+
+def test_jobs_leaving_qstat_are_collected(campaign):
+    sim_info, set_jobs = campaign
+    scheduler = JobScheduler(set_jobs, max_num=3, poll_min=0.2, poll_max=0.5)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+    assert sorted(scheduler.finished_id) == ['j0', 'j1', 'j2']
+    assert scheduler.error_id == []
+    assert all(runner.job_status == 'C' for runner in set_jobs.values())
+    assert sorted(os.listdir(sim_info.result_dir)) == [f'j{i}_Bench_20190804.txt' for i in range(3)]
+
+
+def test_failed_query_keeps_jobs(campaign):
+    sim_info, set_jobs = campaign
+    for runner in set_jobs.values():
+        runner.run()
+        runner.job_status = 'R'
+
+    def fail(job_ids):
+        raise RuntimeError('qstat: cannot connect to server')
+
+    for runner in set_jobs.values():
+        runner.backend.status = fail
+    running_id, finished = check_and_collect(list(set_jobs), set_jobs)
+    assert running_id == ['j0', 'j1', 'j2']
+    assert finished == []
+    assert all(runner.job_status == 'R' for runner in set_jobs.values())
+
+
+def test_low_disk_space_does_not_stall_staging(campaign, monkeypatch):
+    sim_info, set_jobs = campaign
+    import shutil
+    from collections import namedtuple
+    usage = namedtuple('usage', 'total used free')
+    monkeypatch.setattr(shutil, 'disk_usage', lambda path: usage(2**40, 2**40 - 512 * 2**20, 512 * 2**20))
+    scheduler = JobScheduler(set_jobs, max_num=3, poll_min=0.2, poll_max=0.5, stage_ahead=2)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), f"waiting: {scheduler.waiting_id}, running: {scheduler.running_id}"
+    assert sorted(scheduler.finished_id) == ['j0', 'j1', 'j2']
+    assert scheduler.error_id == []
+
+
+def test_scheduler_started_empty_records_added_jobs(campaign):
+    _, set_jobs = campaign
+    root_dir = set_jobs['j0'].ROOT_DIR
+    sim_info = SimulationInfo({'obj': 'test', 'ROOT_DIR': root_dir, 'run_dir': 'run_store', 'state_db': 'configs/state.db',
+                               'metrics_textfile': 'result/metrics.prom'})
+    sim_info.creat_work_dirs()
+    scheduler = JobScheduler({}, max_num=3, poll_min=0.2, poll_max=0.5)
+    for job_id in set_jobs:
+        job_info = {'job_id': job_id, 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        scheduler.add_job(job_id, ModelRunner(sim_info, job_info=job_info))
+    assert scheduler.state_store is sim_info.state_store
+    assert scheduler.metrics is sim_info.metrics
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+    assert sim_info.state_store.counts() == {'completed': 3}
+    assert os.path.exists(os.path.join(root_dir, 'result', 'metrics.prom'))
+
+
+def test_failed_job_leaving_qstat_with_partial_output(campaign, monkeypatch):
+    sim_info, set_jobs = campaign
+    monkeypatch.setenv('FAKE_PBS_FAIL', '1')
+    scheduler = JobScheduler(set_jobs, max_num=3, poll_min=0.2, poll_max=0.5)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+    for runner in set_jobs.values():
+        assert runner.job_status == 'E'
+        assert os.path.getsize(os.path.join(runner.job_dir, runner.wrfhydrofrxst)) > 0
+
+
+def test_job_left_queue_without_exit_status_is_failed(campaign):
+    _, set_jobs = campaign
+    runner = set_jobs['j0']
+    runner.run()
+    with open(os.path.join(runner.job_dir, runner.wrfhydrofrxst), 'w') as f:
+        f.write('      3600,2019-07-25_01:00:00,         1, 114.0, 38.0,      10.000,     353.147,   0.0\n')
+    runner.backend.status = lambda job_ids: {}
+    runner.check_pbs_job_status()
+    assert runner.job_status == 'E'
+
+    with open(os.path.join(runner.job_dir, runner.exit_file), 'w') as f:
+        f.write('0\n')
+    runner.check_pbs_job_status()
+    assert runner.job_status == 'C'
+
+
+def test_local_jobs_wake_the_scheduler(campaign):
+    sim_info, _ = campaign
+    event_dir = os.path.join(sim_info.ROOT_DIR, 'run_source', 'Bench_20190804')
+    with open(os.path.join(event_dir, 'Hydrojob.pbs'), 'w') as f:
+        f.write('#!/bin/bash\ncase "$PWD" in *j0*) sleep 0.3;; *j1*) sleep 1;; *) sleep 1.5;; esac\n'
+                'echo "      3600,2019-07-25_01:00:00,         1, 114.0, 38.0,      10.000,     353.147,   0.0"'
+                ' > frxst_pts_out.txt\n')
+    local = SimulationInfo({'obj': 'test', 'ROOT_DIR': sim_info.ROOT_DIR, 'run_dir': 'run_local', 'yaml_configs': False,
+                            'backend': 'local', 'backend_options': {'max_workers': 3}})
+    local.creat_work_dirs()
+    set_jobs = {}
+    for i in range(3):
+        job_info = {'job_id': f'j{i}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        set_jobs[job_info['job_id']] = ModelRunner(local, job_info=job_info)
+    # without waking up, the first poll finding nothing stretches the interval to a minute
+    scheduler = JobScheduler(set_jobs, max_num=3, poll_min=0.1, poll_max=60, poll_backoff=1000)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=15)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+    assert all(runner.job_status == 'C' for runner in set_jobs.values())
+    assert local.backend.callbacks == []
+
+
+def test_polling_is_capped_by_the_walltime(campaign, monkeypatch):
+    sim_info, set_jobs = campaign
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '1')
+    script = os.path.join(sim_info.ROOT_DIR, 'run_source', 'Bench_20190804', 'Hydrojob.pbs')
+    with open(script) as f:
+        text = f.read()
+    with open(script, 'w') as f:
+        f.write(text.replace('#PBS -q batch\n', '#PBS -q batch\n#PBS -l walltime=00:00:02\n'))
+    scheduler = JobScheduler(set_jobs, max_num=3, poll_min=0.2, poll_max=60, poll_backoff=1000)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=15)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+    assert sorted(scheduler.finished_id) == ['j0', 'j1', 'j2']
+
+
+def test_groups_are_not_submitted_to_backends_without_support(campaign):
+    sim_info, _ = campaign
+    local = SimulationInfo({'obj': 'test', 'ROOT_DIR': sim_info.ROOT_DIR, 'run_dir': 'run_local', 'yaml_configs': False,
+                            'backend': 'local'})
+    local.creat_work_dirs()
+    runners = {}
+    for i in range(3):
+        job_info = {'job_id': f'j{i}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        runners[job_info['job_id']] = ModelRunner(local, job_info=job_info)
+    with pytest.raises(ValueError):
+        JobScheduler(dict(runners), group_mode='bundle')
+
+    # jobs added later are checked when their group is submitted
+    scheduler = JobScheduler({}, max_num=3, poll_min=0.1, group_mode='bundle')
+    for job_id, runner in runners.items():
+        scheduler.add_job(job_id, runner)
+    assert sorted(scheduler.run()) == ['j0', 'j1', 'j2']
+    assert not os.path.exists(os.path.join(local.run_dir, 'pbs_groups'))
+    local.backend.shutdown()
+
+
+def test_batch_stage_removes_failed_job_dirs(campaign):
+    from core.RunningJobs import batch_stage
+    sim_info, set_jobs = campaign
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('bad parameter')
+
+    set_jobs['j1'].parse_params = fail
+    set_jobs['j2'].inital_params = fail
+    assert batch_stage(set_jobs, processes=0) == ['j1', 'j2']
+    assert sorted(os.listdir(set_jobs['j0'].run_dir)) == ['j0']
+    assert set_jobs['j0'].staged and 'stage' in set_jobs['j0'].timings
+    for job_id in ('j1', 'j2'):
+        assert not set_jobs[job_id].staged and set_jobs[job_id].job_dir is None
+    # a retry stages into a fresh directory of the same name
+    del set_jobs['j1'].parse_params
+    assert batch_stage(set_jobs, job_ids=['j1'], processes=0) == []
+    assert set_jobs['j1'].job_dir == os.path.join(set_jobs['j1'].run_dir, 'j1')
+
+
+def test_resume_from_the_state_store(campaign, monkeypatch):
+    from core.RunningJobs import resume_jobs
+    _, set_jobs = campaign
+    root_dir = set_jobs['j0'].ROOT_DIR
+    options = {'obj': 'test', 'ROOT_DIR': root_dir, 'run_dir': 'run_store', 'state_db': 'configs/state.db'}
+    sim_info = SimulationInfo(options)
+    sim_info.creat_work_dirs()
+    runners = {}
+    for i in range(5):
+        job_info = {'job_id': f'r{i}', 'period': {'start': '2019-07-25', 'end': '2019-08-17'},
+                    'event_no': 'Bench_20190804', 'basin': 'Bench', 'set_params': {}}
+        runners[f'r{i}'] = ModelRunner(sim_info, job_info=job_info)
+        runners[f'r{i}'].record_state(phase='created', status='waiting')
+    # r0 still running, r1 finished while the driver was down, r2 staged, r3 waiting, r4 failed before
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '3600')
+    runners['r0'].run()
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '0')
+    runners['r1'].run()
+    runners['r2'].stage()
+    runners['r4'].save_config(namemark='copy_folder')
+    sim_info.state_store.close()
+
+    sim_info = SimulationInfo(options)
+    resumed, running_id = resume_jobs(sim_info)
+    assert list(resumed) == ['r0', 'r2', 'r3']
+    assert running_id == ['r0']
+    assert resumed['r0'].pbs_id == runners['r0'].pbs_id and resumed['r0'].job_status in ('Q', 'R')
+    assert resumed['r2'].staged and resumed['r2'].job_dir == runners['r2'].job_dir
+    assert not resumed['r3'].staged and resumed['r3'].job_dir is None
+    assert sim_info.state_store.get('r1')['status'] == 'completed'
+    assert os.path.exists(os.path.join(sim_info.result_dir, 'r1_Bench_20190804.txt'))
+    assert sim_info.state_store.get('r4')['status'] == 'failed'
@@ -0,0 +1,64 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_scoring.py
+@Create  :   2025-05-15 17:40:22
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import numpy as np
+import pandas as pd
+import xarray as xr
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.scoring import nse, kge, lognse, peak_error, peak_timing, score
+
+OBS = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+SIM = np.array([2.0, 2.0, 3.0, 4.0, 4.0])
+
+
+def test_metrics_against_hand_computed_values():
+    # SSE = 2, sum of squared deviations of obs = 10
+    assert nse(SIM, OBS) == pytest.approx(0.8)
+    # r = 1.2 / sqrt(0.8 * 2), alpha = sqrt(0.8 / 2), beta = 3 / 3
+    assert kge(SIM, OBS) == pytest.approx(1 - np.sqrt((3 / np.sqrt(10) - 1) ** 2 + (2 / np.sqrt(10) - 1) ** 2))
+    # log obs = [0, 1, 2], log sim = [1, 1, 2]: SSE = 1, sum of squared deviations = 2
+    assert lognse(np.exp([1.0, 1.0, 2.0]), np.exp([0.0, 1.0, 2.0]), eps=0) == pytest.approx(0.5)
+    eps = OBS.mean() / 100
+    assert lognse(SIM, OBS) == pytest.approx(nse(np.log(SIM + eps), np.log(OBS + eps)))
+    assert peak_error(SIM, OBS) == pytest.approx(-0.2)
+    # the first simulated maximum, at step 3, is one step before the observed one
+    assert peak_timing(SIM, OBS) == -1
+
+
+def test_masked_gaps_are_ignored():
+    obs = np.array([1.0, 2.0, np.nan, 3.0, 4.0, 5.0, 6.0])
+    sim = np.array([2.0, 2.0, 9.0, 3.0, 4.0, 4.0, np.nan])
+    for metric in (nse, kge, lognse, peak_error):
+        assert metric(sim, obs) == pytest.approx(metric(SIM, OBS)), metric.__name__
+    # no valid step at all
+    assert np.isnan(nse([np.nan, 1.0], [1.0, np.nan]))
+    assert np.isnan(peak_timing([np.nan, 1.0], [1.0, np.nan]))
+
+
+def test_score_members_in_blocks():
+    times = pd.date_range('2019-08-04', periods=5, freq='3h')
+    sim = xr.DataArray(np.stack([np.stack([SIM, OBS]), np.stack([OBS, SIM])]),
+                       coords={'job': ['j0', 'j1'], 'gauge': ['101', '102'], 'time': times},
+                       dims=['job', 'gauge', 'time'])
+    obs = pd.DataFrame({'101': OBS, '102': OBS}, index=times)
+    scores = score(sim, obs, block_size=1)
+    np.testing.assert_allclose(scores['nse'].values, [[0.8, 1.0], [1.0, 0.8]])
+    # the simulated peak of j0 at gauge 101 is one step, 3 hours, early
+    np.testing.assert_allclose(scores['peak_timing'].values, [[-3.0, 0.0], [0.0, -3.0]])
+    assert scores.attrs['n_times'] == 5
+    # the scoring period drops the first step
+    period = {'start': '2019-08-04 03:00', 'end': None}
+    np.testing.assert_allclose(score(sim, obs, period=period, metrics=['nse'])['nse'].values[0],
+                               [nse(SIM[1:], OBS[1:]), 1.0])
@@ -0,0 +1,64 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_state_store.py
+@Create  :   2025-05-15 17:12:05
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import yaml
+from types import SimpleNamespace
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from core.state_store import StateStore
+
+
+def runner(job_id, **state):
+    job = SimpleNamespace(job_id=job_id, event_no='Bench_20190804', basin='Bench', set_params={'BEXP': 1.3},
+                          pbs_id=None, group_id=None, job_status=None, job_dir=None, result_path=None, timings={})
+    job.__dict__.update(state)
+    job.config_dict = lambda: {'job_id': job.job_id, 'event_no': job.event_no, 'pbs_id': job.pbs_id}
+    return job
+
+
+def test_upsert_keeps_stored_columns(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    j0, j1 = runner('j0'), runner('j1')
+    store.record_many([j1, j0], phase='created', status='waiting')
+    created_at = store.get('j0')['created_at']
+
+    j0.pbs_id, j0.job_dir = '1300.server', '/run/j0'
+    store.record(j0, phase='submit_pbs_job', status='submitted')
+    # a record without phase and status derives the status from the PBS status, None columns keep their values
+    j0.job_status, j0.result_path = 'C', '/result/j0.txt'
+    j0.job_dir = None
+    store.record(j0)
+    job = store.get('j0')
+    assert job['status'] == 'completed' and job['phase'] == 'submit_pbs_job'
+    assert job['pbs_id'] == '1300.server' and job['job_dir'] == '/run/j0' and job['result_path'] == '/result/j0.txt'
+    assert job['created_at'] == created_at and job['submitted_at'] is not None and job['finished_at'] is not None
+    assert job['set_params'] == {'BEXP': 1.3} and job['config']['pbs_id'] == '1300.server'
+
+    # one row per job, in the order first recorded
+    store.record(runner('j2', job_status='E'), phase='collect_frxst')
+    assert [job['job_id'] for job in store.query()] == ['j1', 'j0', 'j2']
+    assert [job['job_id'] for job in store.failed_jobs(phase='collect_frxst')] == ['j2']
+    assert store.counts() == {'waiting': 1, 'completed': 1, 'failed': 1}
+    assert store.get('j9') is None
+    store.close()
+
+    # the store persists across connections
+    store = StateStore(str(tmp_path / 'state.db'))
+    assert store.get('j0')['status'] == 'completed'
+    paths = store.export_yaml(str(tmp_path / 'configs'))
+    assert sorted(os.path.basename(path) for path in paths) == ['j0_Bench_20190804_config.yaml',
+                                                                'j1_Bench_20190804_config.yaml',
+                                                                'j2_Bench_20190804collect_frxst_config.yaml']
+    with open(os.path.join(tmp_path, 'configs', 'j0_Bench_20190804_config.yaml')) as f:
+        assert yaml.safe_load(f)['pbs_id'] == '1300.server'
+    store.close()
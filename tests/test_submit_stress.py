@@ -0,0 +1,71 @@
+# -*- encoding: utf-8 -*-
+'''
+@File    :   test_submit_stress.py
+@Create  :   2025-05-15 16:02:48
+@Author  :   shihx2003
+@Version :   1.0
+@Contact :   shihx2003@outlook.com
+'''
+
+# here put the import lib
+import os
+import sys
+import threading
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+from core import SimulationInfo, JobScheduler
+from bench_scheduler import make_root
+from bench_submit_stress import make_jobs, check_submissions, run_concurrently, submitted_dirs
+import fake_pbs
+
+NUM = 40
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """
+    A synthetic campaign root and a fake PBS server with a short qsub/qstat round trip.
+    """
+    bin_dir = fake_pbs.install(str(tmp_path / 'bin'))
+    monkeypatch.setenv('PATH', bin_dir + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_PBS_DIR', str(tmp_path / 'pbs'))
+    monkeypatch.setenv('FAKE_PBS_LATENCY', '0.01')
+    monkeypatch.setenv('FAKE_PBS_SEED', '0')
+    root_dir = str(tmp_path / 'root')
+    make_root(root_dir, input_mb=0.01)
+    return root_dir
+
+
+def test_concurrent_stage_and_submit(root, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '3600')
+    sim_info = SimulationInfo({'obj': 'test', 'ROOT_DIR': root, 'yaml_configs': False})
+    sim_info.creat_work_dirs()
+    # the first job IDs are used twice, so that their job directories are claimed concurrently
+    runners = make_jobs(sim_info, NUM, 5, 'threads')
+    errors, _ = run_concurrently(runners, 16)
+    assert check_submissions(runners, errors, str(tmp_path / 'pbs'), os.getcwd()) == []
+    # every member submitted exactly once
+    assert len(submitted_dirs(str(tmp_path / 'pbs'))) == len(runners)
+
+
+def test_scheduler_submits_every_job_once(root, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_PBS_RUNTIME', '0.2')
+    sim_info = SimulationInfo({'obj': 'test', 'ROOT_DIR': root, 'yaml_configs': False})
+    sim_info.creat_work_dirs()
+    set_jobs = {runner.job_id: runner for runner in make_jobs(sim_info, NUM, 0, 'scheduler')}
+    scheduler = JobScheduler(set_jobs, max_num=NUM, poll_min=0.2, poll_max=0.5, submit_workers=8)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), f"scheduler still running: {scheduler.running_id}"
+
+    # no job lost, none submitted twice, all in a terminal state
+    assert check_submissions(list(set_jobs.values()), [None] * NUM, str(tmp_path / 'pbs'), os.getcwd()) == []
+    assert len(submitted_dirs(str(tmp_path / 'pbs'))) == NUM
+    assert sorted(scheduler.finished_id) == sorted(set_jobs)
+    assert scheduler.error_id == [] and scheduler.waiting_id == [] and scheduler.running_id == []
+    assert all(runner.job_status == 'C' for runner in set_jobs.values())
+    assert len(os.listdir(sim_info.result_dir)) == NUM